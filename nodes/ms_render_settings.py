@@ -82,6 +82,49 @@ def ms_renderSettings_nodeInitializer():
     ms_renderSettings.overwrite_existing_geometry = overwrite_existing_geometry_nAttr.create("overwrite_existing_geometry", "overwrite_geo", OpenMaya.MFnNumericData.kBoolean, True)
     ms_renderSettings.addAttribute(ms_renderSettings.overwrite_existing_geometry)
 
+    # geometry format
+    geometry_format_enumAttr = OpenMaya.MFnEnumAttribute()
+    ms_renderSettings.geometry_format = geometry_format_enumAttr.create("geometry_format", "geo_format")
+    geometry_format_enumAttr.addField("OBJ", 0)
+    geometry_format_enumAttr.addField("Binary mesh", 1)
+    ms_renderSettings.addAttribute(ms_renderSettings.geometry_format)
+
+    # compress geometry
+    compress_geometry_nAttr = OpenMaya.MFnNumericAttribute()
+    ms_renderSettings.compress_geometry = compress_geometry_nAttr.create("compress_geometry", "compress_geo", OpenMaya.MFnNumericData.kBoolean, True)
+    ms_renderSettings.addAttribute(ms_renderSettings.compress_geometry)
+
+    # export threads
+    export_threads_AttrInt = OpenMaya.MFnNumericAttribute()
+    ms_renderSettings.export_threads = export_threads_AttrInt.create("export_threads", "export_threads", OpenMaya.MFnNumericData.kInt, 0)
+    export_threads_AttrInt.setMin(0)
+    export_threads_AttrInt.setHidden(False)
+    export_threads_AttrInt.setKeyable(False)
+    ms_renderSettings.addAttribute(ms_renderSettings.export_threads)
+
+    # texture conversion processes
+    texture_conversion_processes_AttrInt = OpenMaya.MFnNumericAttribute()
+    ms_renderSettings.texture_conversion_processes = texture_conversion_processes_AttrInt.create("texture_conversion_processes", "tex_conv_procs", OpenMaya.MFnNumericData.kInt, 0)
+    texture_conversion_processes_AttrInt.setMin(0)
+    texture_conversion_processes_AttrInt.setHidden(False)
+    texture_conversion_processes_AttrInt.setKeyable(False)
+    ms_renderSettings.addAttribute(ms_renderSettings.texture_conversion_processes)
+
+    # hash texture contents
+    hash_texture_contents_nAttr = OpenMaya.MFnNumericAttribute()
+    ms_renderSettings.hash_texture_contents = hash_texture_contents_nAttr.create("hash_texture_contents", "hash_tex", OpenMaya.MFnNumericData.kBoolean, False)
+    ms_renderSettings.addAttribute(ms_renderSettings.hash_texture_contents)
+
+    # compact xml
+    compact_xml_nAttr = OpenMaya.MFnNumericAttribute()
+    ms_renderSettings.compact_xml = compact_xml_nAttr.create("compact_xml", "compact_xml", OpenMaya.MFnNumericData.kBoolean, False)
+    ms_renderSettings.addAttribute(ms_renderSettings.compact_xml)
+
+    # compress xml
+    compress_xml_nAttr = OpenMaya.MFnNumericAttribute()
+    ms_renderSettings.compress_xml = compress_xml_nAttr.create("compress_xml", "compress_xml", OpenMaya.MFnNumericData.kBoolean, False)
+    ms_renderSettings.addAttribute(ms_renderSettings.compress_xml)
+
     # export camera blur
     export_camera_blur_nAttr = OpenMaya.MFnNumericAttribute()
     ms_renderSettings.export_camera_blur = export_camera_blur_nAttr.create("export_camera_blur", "camera_blur", OpenMaya.MFnNumericData.kBoolean, False)
@@ -302,6 +345,22 @@ def ms_renderSettings_nodeInitializer():
     ms_renderSettings.profile_export = profile_export_nAttr.create("profile_export", "profile_export", OpenMaya.MFnNumericData.kBoolean, False)
     ms_renderSettings.addAttribute(ms_renderSettings.profile_export)
 
+    # export workers
+    export_workers_AttrInt = OpenMaya.MFnNumericAttribute()
+    ms_renderSettings.export_workers = export_workers_AttrInt.create("export_workers", "export_workers", OpenMaya.MFnNumericData.kInt, 1)
+    export_workers_AttrInt.setMin(1)
+    export_workers_AttrInt.setHidden(False)
+    export_workers_AttrInt.setKeyable(False)
+    ms_renderSettings.addAttribute(ms_renderSettings.export_workers)
+
+    # frame chunk size
+    frame_chunk_size_AttrInt = OpenMaya.MFnNumericAttribute()
+    ms_renderSettings.frame_chunk_size = frame_chunk_size_AttrInt.create("frame_chunk_size", "frame_chunk_size", OpenMaya.MFnNumericData.kInt, 0)
+    frame_chunk_size_AttrInt.setMin(0)
+    frame_chunk_size_AttrInt.setHidden(False)
+    frame_chunk_size_AttrInt.setKeyable(False)
+    ms_renderSettings.addAttribute(ms_renderSettings.frame_chunk_size)
+
     # autodetect alpha
     autodetect_alpha_nAttr = OpenMaya.MFnNumericAttribute()
     ms_renderSettings.autodetect_alpha = autodetect_alpha_nAttr.create("autodetect_alpha", "autodetect_alpha", OpenMaya.MFnNumericData.kBoolean, False)
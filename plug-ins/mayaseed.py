@@ -63,12 +63,14 @@ def initializePlugin(obj):
     import ms_appleseed_scene
     ms_appleseed_scene.initializePlugin(obj)
     
-    ms_menu.createMenu()
-    ms_menu.buildMenu()
+    # there is no UI to add to when the plugin is loaded by an export worker
+    if not cmds.about(batch=True):
+        ms_menu.createMenu()
+        ms_menu.buildMenu()
 
-    ms_shelf.create_if_absent()
+        ms_shelf.create_if_absent()
 
-    import AEms_renderSettingsTemplate
+        import AEms_renderSettingsTemplate
 
     appleseed_version_notice = 'This version of mayaseed is designed to work with {0}. Other versions of appleseed may work but have not been tested.'.format(ms_commands.RECCOMENDED_APPLESEED_VERSION)
 
@@ -95,4 +97,5 @@ def uninitializePlugin(obj):
     import ms_appleseed_scene
     ms_appleseed_scene.uninitializePlugin(obj)
 
-    ms_menu.deleteMenu()
+    if not cmds.about(batch=True):
+        ms_menu.deleteMenu()
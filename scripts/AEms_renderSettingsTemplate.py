@@ -42,10 +42,18 @@ class AEms_renderSettingsTemplate(pm.uitypes.AETemplate):
                 self.addControl('convert_shading_nodes_to_textures', label='Bake shading networks')
                 self.addSeparator()
                 self.addControl('convert_textures_to_exr', label='Convert Textures to OpenEXR')
+                self.addControl('texture_conversion_processes', label='Texture Converter Processes (0 = All Cores)')
+                self.addControl('hash_texture_contents', label='Detect Texture Changes by Content')
                 self.addSeparator()
                 self.addControl('overwrite_existing_textures', label='Overwrite Existing Textures Files')
                 self.addSeparator()
                 self.addControl('overwrite_existing_geometry', label='Overwrite Existing Geometry Files')
+                self.addControl('geometry_format')
+                self.addControl('compress_geometry', label='Compress Binary Mesh Files')
+                self.addControl('export_threads', label='Geometry Writer Threads (0 = All Cores)')
+                self.addSeparator()
+                self.addControl('compact_xml', label='Write Unindented Project Files')
+                self.addControl('compress_xml', label='Compress Project Files (gzip)')
                 self.addSeparator()
                 self.addControl('export_camera_blur', label='Export Camera Transformation Motion Blur')
                 self.addSeparator()
@@ -114,6 +122,9 @@ class AEms_renderSettingsTemplate(pm.uitypes.AETemplate):
                 self.beginLayout('Advanced settings')
                 self.addControl('profile_export')
                 self.addSeparator()
+                self.addControl('export_workers', label='Export worker processes')
+                self.addControl('frame_chunk_size', label='Frames per chunk (0 = all at once)')
+                self.addSeparator()
                 self.addControl('autodetect_alpha')
                 self.addSeparator()
                 self.addControl('force_linear_texture_interpretation')
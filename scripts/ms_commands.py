@@ -23,18 +23,37 @@
 
 import maya.cmds as cmds
 import maya.mel as mel
+import maya.OpenMaya as OpenMaya
 import maya.utils as mu
 import os
+import errno
 import sys
+import time
+import collections
+import json
+import hashlib
+import uuid
 import inspect
 import subprocess
 from xml.dom.minidom import parseString
+import xml.etree.cElementTree as ElementTree
+from xml.sax.saxutils import unescape
 import ms_export_obj
 import random
 import math
 import shutil
 import re
 import copy
+import threading
+import multiprocessing
+import Queue
+import array
+
+try:
+    import numpy
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
 
 
 #--------------------------------------------------------------------------------------------------
@@ -127,7 +146,12 @@ class ms_info_dial():
 
 def create_dir(path):
     if not os.path.exists(path):
-        os.makedirs(path)
+        try:
+            os.makedirs(path)
+        except OSError:
+            # another export process may have created the directory in the meantime
+            if not os.path.isdir(path):
+                raise
 
     return path
 
@@ -160,7 +184,91 @@ def normalizeRGB(color):
 # Convert shader connection to image.
 #--------------------------------------------------------------------------------------------------
 
-def convert_connection_to_image(shader, attribute, dest_file, overwrite, resolution=1024, pass_through=False):
+BAKE_RESOLUTION = 1024
+
+
+# node types that make a shading network change over time without any of its settable attributes changing
+TIME_DEPENDENT_NODE_TYPES = ['animCurve', 'time', 'expression']
+
+
+def get_bake_target(shader):
+
+    """ Returns the object convertSolidTx bakes a shader onto, the first object the shader is assigned to, the selection is left unchanged """
+
+    selection = cmds.ls(sl=True)
+    cmds.hyperShade(objects=shader)
+    bake_targets = cmds.ls(sl=True)
+
+    if selection:
+        cmds.select(selection, replace=True)
+    else:
+        cmds.select(clear=True)
+
+    if bake_targets:
+        return bake_targets[0]
+
+    return None
+
+
+def get_shading_network_hash(shader, attribute, time=None, resolution=BAKE_RESOLUTION):
+
+    """ Returns a hash of everything that affects baking a plug, the node types, attribute values and connections of the upstream shading network, the bake target and the bake resolution """
+
+    digest = hashlib.sha1()
+    digest.update('resolution:{0}\n'.format(resolution))
+
+    plug_name = shader + '.' + attribute
+    if not cmds.objExists(plug_name):
+        return digest.hexdigest()
+
+    history = cmds.listHistory(plug_name) or []
+
+    # keyed and driven attributes are not settable so their values are not part of the hash, a network with
+    # animation curves or expressions is assumed to change on every sample and hashes the sample time instead
+    time_dependent = False
+
+    for node in sorted(set(history)):
+        digest.update('node:{0}:{1}\n'.format(node, cmds.nodeType(node)))
+
+        for node_type in cmds.nodeType(node, inherited=True) or []:
+            if node_type in TIME_DEPENDENT_NODE_TYPES:
+                time_dependent = True
+
+        for attribute_name in sorted(cmds.listAttr(node, settable=True, scalar=True, multi=True) or []):
+            try:
+                value = cmds.getAttr('{0}.{1}'.format(node, attribute_name))
+            except (RuntimeError, ValueError):
+                continue
+            digest.update('attr:{0}={1!r}\n'.format(attribute_name, value))
+
+        connections = cmds.listConnections(node, source=True, destination=False, connections=True, plugs=True) or []
+        for connection in sorted(zip(connections[1::2], connections[0::2])):
+            digest.update('connection:{0}->{1}\n'.format(*connection))
+
+        # the contents of file textures used by the network are part of the bake too
+        if cmds.nodeType(node) == 'file':
+            texture_path = cmds.getAttr(node + '.fileTextureName')
+            if texture_path and os.path.exists(texture_path):
+                digest.update('mtime:{0!r}\n'.format(os.path.getmtime(texture_path)))
+
+    if time_dependent:
+        digest.update('time:{0!r}\n'.format(time))
+
+    # the image is baked in the UV space of the object the shader is assigned to, solid textures also depend on its position
+    bake_target = get_bake_target(shader)
+    digest.update('target:{0}\n'.format(bake_target))
+
+    if bake_target is not None:
+        bake_node = bake_target.split('.')[0]
+        digest.update('matrix:{0!r}\n'.format(cmds.getAttr(bake_node + '.worldMatrix[0]')))
+
+        for shape in cmds.listRelatives(bake_node, shapes=True, fullPath=True, type='mesh') or []:
+            digest.update('shape:{0}:{1}\n'.format(shape, ms_export_obj.get_mesh_data(shape).get_hash()))
+
+    return digest.hexdigest()
+
+
+def convert_connection_to_image(shader, attribute, dest_file, overwrite, resolution=BAKE_RESOLUTION, pass_through=False):
 
     if os.path.exists(dest_file) and not overwrite:
         return dest_file
@@ -180,56 +288,504 @@ def convert_connection_to_image(shader, attribute, dest_file, overwrite, resolut
         elif pass_through == True:
             warning('{0}: skipping conversion'.format(plug_name))
         else:
-            cmds.hyperShade(objects=shader)
-            connected_object = cmds.ls(sl=True)[0]
-            cmds.convertSolidTx(connection[0] ,connected_object ,fileImageName=dest_file, antiAlias=True, bm=3, fts=True, sp=True, alpha=True, doubleSided=True, resolutionX=resolution, resolutionY=resolution)
+            connected_object = get_bake_target(shader)
+            if connected_object is None:
+                warning('{0} is not assigned to any object, skipping conversion'.format(shader))
+            else:
+                # bake to a temporary file, other export processes may be baking or reading the same image
+                temporary_file = get_texture_conversion_path(dest_file)
+                cmds.convertSolidTx(connection[0] ,connected_object ,fileImageName=temporary_file, antiAlias=True, bm=3, fts=True, sp=True, alpha=True, doubleSided=True, resolutionX=resolution, resolutionY=resolution)
+                if os.path.exists(temporary_file):
+                    replace_file(temporary_file, dest_file)
 
         return dest_file
 
 
+#--------------------------------------------------------------------------------------------------
+# Replace files atomically.
+#--------------------------------------------------------------------------------------------------
+
+# number of attempts at replacing a file that another process is using on Windows
+REPLACE_FILE_ATTEMPTS = 20
+
+
+def get_temporary_path(file_path):
+
+    """ Returns a new path next to a file, every call returns a different path so concurrent writers never share one """
+
+    return '{0}.{1}.{2}.tmp'.format(file_path, os.getpid(), uuid.uuid4().hex)
+
+
+def replace_file(temporary_path, file_path):
+
+    """ Moves a completely written temporary file over a file, readers see either the old or the new contents, never a partial file """
+
+    # rename replaces the destination atomically on POSIX systems
+    if os.name != 'nt':
+        os.rename(temporary_path, file_path)
+        return
+
+    # on Windows rename fails when the destination exists and a file can't be removed while another process reads
+    # it, retry as other export processes may be replacing or reading the same file
+    for attempt in range(REPLACE_FILE_ATTEMPTS):
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            os.rename(temporary_path, file_path)
+            return
+        except OSError:
+            if attempt == REPLACE_FILE_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05)
+
+
+# a lock file older than this many seconds was left behind by a process that died while holding it
+FILE_LOCK_STALE_TIME = 60.0
+
+
+class FileLock():
+
+    """ Lock shared by processes through the exclusive creation of a lock file, used as a with statement context """
+
+    def __init__(self, file_path):
+        self.lock_path = file_path + '.lock'
+
+    def __enter__(self):
+        while True:
+            try:
+                os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except OSError as e:
+                if e.errno not in (errno.EEXIST, errno.EACCES):
+                    raise
+
+            # break locks abandoned by processes that were killed
+            try:
+                if time.time() - os.path.getmtime(self.lock_path) > FILE_LOCK_STALE_TIME:
+                    os.remove(self.lock_path)
+                    continue
+            except OSError:
+                continue
+
+            time.sleep(0.05)
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
+
+
 #--------------------------------------------------------------------------------------------------
 # Convert textures to OpenEXR format.
 #--------------------------------------------------------------------------------------------------
 
-def convert_texture_to_exr(src, dest, overwrite=True, pass_through=False):
-    
+# -r: make a tiled OpenEXR file
+# -t: set the tile dimensions
+TEXTURE_CONVERSION_ARGS = ["-r", "-t 32"]
+
+TEXTURE_CACHE_MANIFEST = 'texture_cache.json'
+
+
+class TextureConversionCache():
+
+    """ Manifest of the textures converted into a texture directory, a texture is only converted again when its source or the converter settings change """
+
+    def __init__(self, texture_dir, hash_contents=False):
+        self.manifest_path = os.path.join(texture_dir, TEXTURE_CACHE_MANIFEST)
+        self.hash_contents = hash_contents
+        self.entries = self.load()
+        self.changed_entries = dict()
+
+    def load(self):
+        if not os.path.exists(self.manifest_path):
+            return dict()
+
+        try:
+            with open(self.manifest_path, 'r') as manifest_file:
+                return json.load(manifest_file)
+        except (IOError, ValueError):
+            warning('Ignoring unreadable texture cache {0}'.format(self.manifest_path))
+            return dict()
+
+    def get_fingerprint(self, src):
+        stat = os.stat(src)
+        fingerprint = {'source': os.path.normpath(os.path.abspath(src)),
+                       'size': stat.st_size,
+                       'mtime': stat.st_mtime,
+                       'args': TEXTURE_CONVERSION_ARGS}
+
+        if self.hash_contents:
+            digest = hashlib.sha1()
+            with open(src, 'rb') as src_file:
+                for block in iter(lambda: src_file.read(1024 * 1024), ''):
+                    digest.update(block)
+            fingerprint['hash'] = digest.hexdigest()
+
+        return fingerprint
+
+    def is_current(self, src, dest, fingerprint=None):
+
+        """ Returns True if dest was converted from the current version of src, a fingerprint of src already computed by get_fingerprint can be passed in """
+
+        if not os.path.exists(src) or not os.path.exists(dest):
+            return False
+
+        entry = self.entries.get(os.path.basename(dest))
+        if entry is None:
+            return False
+
+        if fingerprint is None:
+            fingerprint = self.get_fingerprint(src)
+
+        # entries written without a content hash can't be compared by hash
+        if 'hash' in fingerprint and 'hash' not in entry:
+            return False
+
+        for key, value in fingerprint.iteritems():
+            if entry.get(key) != value:
+                return False
+
+        return True
+
+    def record(self, src, dest, fingerprint=None):
+        entry = fingerprint
+        if entry is None:
+            entry = self.get_fingerprint(src)
+        self.entries[os.path.basename(dest)] = entry
+        self.changed_entries[os.path.basename(dest)] = entry
+
+    def forget(self, dest):
+        self.entries.pop(os.path.basename(dest), None)
+        self.changed_entries[os.path.basename(dest)] = None
+
+    def save(self):
+
+        """ Merges the changes into the manifest on disk, other exports may be sharing the texture directory """
+
+        if not self.changed_entries:
+            return
+
+        # the manifest is read, merged and replaced under a lock so concurrent saves don't drop each other's entries
+        try:
+            with FileLock(self.manifest_path):
+                entries = self.load()
+                for key, entry in self.changed_entries.iteritems():
+                    if entry is None:
+                        entries.pop(key, None)
+                    else:
+                        entries[key] = entry
+
+                temporary_path = get_temporary_path(self.manifest_path)
+                with open(temporary_path, 'w') as manifest_file:
+                    json.dump(entries, manifest_file, indent=2, sort_keys=True)
+
+                replace_file(temporary_path, self.manifest_path)
+
+        except (IOError, OSError) as e:
+            # the changes are kept and merged again by the next save
+            warning('Failed to save texture cache {0}: {1}'.format(self.manifest_path, e))
+            return
+
+        self.entries = entries
+        self.changed_entries = dict()
+
+
+def start_texture_conversion(src, dest, overwrite=True, pass_through=False, output_path=None):
+
+    """ Starts converting a texture to OpenEXR and returns the converter process, None is returned if there is nothing to convert, the converter writes to output_path if one is given """
+
     info('Converting image: {0}'.format(src))
     if not os.path.exists(src):
         info("# error: {0} does not exist".format(src))
-        return 
+        return None
 
     if pass_through:
         info("# skipping conversion of {0}".format(src))
-        return 
+        return None
 
     if os.path.exists(dest) and not overwrite:
         info("# {0} already exists, skipping conversion".format(dest))
-        return 
+        return None
 
     dest_dir = os.path.split(dest)[0]
     create_dir(dest_dir)
 
-    # -r: make a tiled OpenEXR file
-    # -t: set the tile dimensions
-    args = ['imf_copy', "-r", "-t 32", src, dest]
+    if output_path is None:
+        output_path = dest
+
+    args = ['imf_copy'] + TEXTURE_CONVERSION_ARGS + [src, output_path]
 
     if sys.platform == 'win32':
         # http://stackoverflow.com/questions/2935704/running-shell-commands-without-a-shell-window
-        p = subprocess.Popen(args, creationflags=0x08000000, env=ENV_VARIABLES)
-        p.wait()
-    elif sys.platform == 'darwin':
-        p = subprocess.Popen(args, env=ENV_VARIABLES)
-        p.wait()
+        return subprocess.Popen(args, creationflags=0x08000000, env=ENV_VARIABLES)
+
+    return subprocess.Popen(args, env=ENV_VARIABLES)
+
+
+def get_texture_conversion_path(dest):
+
+    """ Returns a new temporary file for a converter to write dest to, with the extension of dest so the converter picks the same format """
+
+    return get_temporary_path(dest) + os.path.splitext(dest)[1]
+
+
+def finish_texture_conversion(dest, temporary_path, return_code):
+
+    """ Moves a successfully converted texture into place or removes the output of a failed conversion """
+
+    if return_code == 0:
+        replace_file(temporary_path, dest)
+    elif os.path.exists(temporary_path):
+        os.remove(temporary_path)
+
+
+def convert_texture_to_exr(src, dest, overwrite=True, pass_through=False):
+    # other export processes may be converting the same texture or reading the previous version of it, the converter
+    # writes to a temporary file that finish_texture_conversion moves into place
+    temporary_path = get_texture_conversion_path(dest)
+    process = start_texture_conversion(src, dest, overwrite, pass_through, temporary_path)
+    if process is not None:
+        finish_texture_conversion(dest, temporary_path, process.wait())
+
+
+def convert_textures_to_exr(conversions, overwrite=True, process_count=0, progress_callback=None, cache=None):
+
+    """ Converts a list of (source, destination) textures to OpenEXR running up to process_count converters at once, returns the list of sources that failed to convert, if a cache is given only textures whose source changed are converted """
+
+    if process_count < 1:
+        process_count = multiprocessing.cpu_count()
+
+    conversion_start_time = time.time()
+
+    running_conversions = []
+    failed_conversions = []
+    completed_count = 0
+
+    # sources with the same file name in different directories map to the same destination, only the first is converted
+    pending_conversions = collections.deque()
+    sources_by_dest = dict()
+    for src, dest in conversions:
+        if dest in sources_by_dest:
+            if os.path.normpath(src) != os.path.normpath(sources_by_dest[dest]):
+                warning('{0} and {1} are both converted to {2}, only the first is used.'.format(sources_by_dest[dest], src, dest))
+            completed_count += 1
+        else:
+            sources_by_dest[dest] = src
+            pending_conversions.append((src, dest))
+
+    while pending_conversions or running_conversions:
+
+        # start as many converters as allowed
+        while pending_conversions and (len(running_conversions) < process_count):
+            src, dest = pending_conversions.popleft()
+
+            # with a cache the manifest decides whether a texture is converted again, an existing texture converted
+            # from an older version of its source is replaced even when overwriting is off
+            fingerprint = None
+            convert_overwrite = overwrite
+            if (cache is not None) and os.path.exists(src):
+                fingerprint = cache.get_fingerprint(src)
+                convert_overwrite = True
+
+            if (fingerprint is not None) and cache.is_current(src, dest, fingerprint):
+                info('# {0} is up to date, skipping conversion'.format(dest))
+                process = None
+            else:
+                # other export processes may be converting the same texture or reading the previous version of it
+                temporary_path = get_texture_conversion_path(dest)
+                try:
+                    process = start_texture_conversion(src, dest, convert_overwrite, False, temporary_path)
+                except OSError as e:
+                    warning('Failed to start the texture converter for {0}: {1}'.format(src, e))
+                    process = None
+                    failed_conversions.append(src)
+
+            if process is None:
+                completed_count += 1
+                if progress_callback is not None:
+                    progress_callback(completed_count)
+            else:
+                running_conversions.append((process, src, dest, temporary_path, fingerprint, time.time()))
+
+        # collect the converters that have finished
+        still_running_conversions = []
+        for process, src, dest, temporary_path, fingerprint, process_start_time in running_conversions:
+            return_code = process.poll()
+            if return_code is None:
+                still_running_conversions.append((process, src, dest, temporary_path, fingerprint, process_start_time))
+                continue
+
+            try:
+                finish_texture_conversion(dest, temporary_path, return_code)
+            except OSError as e:
+                warning('Failed to move the converted texture {0} into place: {1}'.format(dest, e))
+                return_code = -1
+
+            if return_code != 0:
+                warning('Failed to convert {0}, imf_copy exited with code {1}.'.format(src, return_code))
+                failed_conversions.append(src)
+                if cache is not None:
+                    cache.forget(dest)
+            else:
+                info('Converted {0} in {1:.2f} seconds.'.format(src, time.time() - process_start_time))
+                if cache is not None:
+                    cache.record(src, dest, fingerprint)
+
+            completed_count += 1
+            if progress_callback is not None:
+                progress_callback(completed_count)
+
+        running_conversions = still_running_conversions
+        if running_conversions:
+            time.sleep(0.05)
+
+    info('Converted {0} texture(s) in {1:.2f} seconds, {2} failed.'.format(len(conversions), time.time() - conversion_start_time, len(failed_conversions)))
+
+    return failed_conversions
+
+
+#--------------------------------------------------------------------------------------------------
+# Bulk attribute reads.
+#--------------------------------------------------------------------------------------------------
+
+def get_plug_value(plug):
+
+    """ Returns the value of an MPlug in the same form cmds.getAttr would return it """
+
+    attribute = plug.attribute()
+
+    # compound attributes such as colors are returned as a list containing a tuple, just like getAttr
+    if plug.isCompound():
+        return [tuple(get_plug_value(plug.child(i)) for i in range(plug.numChildren()))]
+
+    if attribute.hasFn(OpenMaya.MFn.kNumericAttribute):
+        unit_type = OpenMaya.MFnNumericAttribute(attribute).unitType()
+        if unit_type == OpenMaya.MFnNumericData.kBoolean:
+            return plug.asBool()
+        elif unit_type == OpenMaya.MFnNumericData.kFloat or unit_type == OpenMaya.MFnNumericData.kDouble:
+            return plug.asDouble()
+        return plug.asInt()
+
+    if attribute.hasFn(OpenMaya.MFn.kEnumAttribute):
+        return plug.asShort()
+
+    # unit attributes are converted to UI units as getAttr does
+    if attribute.hasFn(OpenMaya.MFn.kUnitAttribute):
+        unit_type = OpenMaya.MFnUnitAttribute(attribute).unitType()
+        if unit_type == OpenMaya.MFnUnitAttribute.kAngle:
+            return plug.asMAngle().asUnits(OpenMaya.MAngle.uiUnit())
+        elif unit_type == OpenMaya.MFnUnitAttribute.kDistance:
+            return plug.asMDistance().asUnits(OpenMaya.MDistance.uiUnit())
+        elif unit_type == OpenMaya.MFnUnitAttribute.kTime:
+            return plug.asMTime().asUnits(OpenMaya.MTime.uiUnit())
+
+    if attribute.hasFn(OpenMaya.MFn.kTypedAttribute):
+        if OpenMaya.MFnTypedAttribute(attribute).attrType() == OpenMaya.MFnData.kString:
+            return plug.asString()
+
+    # message attributes have no value
+    if attribute.hasFn(OpenMaya.MFn.kMessageAttribute):
+        return None
+
+    return cmds.getAttr(plug.name())
+
+
+def get_dependency_node(node_name):
+    selection = OpenMaya.MSelectionList()
+    selection.add(node_name)
+    node = OpenMaya.MObject()
+    selection.getDependNode(0, node)
+    return OpenMaya.MFnDependencyNode(node)
+
+
+def get_node_key(node_name):
+
+    """ Returns a key identifying the node itself rather than the dag path leading to it, the paths to an instanced shape share the same key """
+
+    selection = OpenMaya.MSelectionList()
+    selection.add(node_name)
+    node = OpenMaya.MObject()
+    selection.getDependNode(0, node)
+
+    if not node.hasFn(OpenMaya.MFn.kDagNode):
+        return OpenMaya.MFnDependencyNode(node).name()
+
+    # a full path names exactly one node, and the first of all the paths to a node is the same whichever path is given
+    paths = OpenMaya.MDagPathArray()
+    OpenMaya.MDagPath.getAllPathsTo(node, paths)
+    return paths[0].fullPathName()
+
+
+def get_node_attributes(node_name, attribute_names):
+
+    """ Reads the given attributes of a node in one pass through the API and returns them as a dict, attributes that don't exist on the node are left out """
+
+    node = get_dependency_node(node_name)
+
+    values = {}
+    for attribute_name in attribute_names:
+        if node.hasAttribute(attribute_name):
+            values[attribute_name] = get_plug_value(node.findPlug(attribute_name, False))
+
+    return values
+
+
+def get_node_attribute_names(node_name):
+
+    """ Returns the long names of all the attributes of a node """
+
+    node = get_dependency_node(node_name)
+
+    return [OpenMaya.MFnAttribute(node.attribute(i)).name() for i in range(node.attributeCount())]
+
+
+class AttributeSnapshot():
+
+    """ Per export store of node attribute values, each plug is read from Maya once and later requests are served from memory """
+
+    missing = object()
+
+    def __init__(self):
+        self.nodes = dict()
+
+    def read(self, node_name, attribute_names):
+
+        """ Returns a dict of the requested attributes that exist on the node """
+
+        node_attributes = self.nodes.setdefault(node_name, dict())
+
+        unread_attribute_names = [attribute_name for attribute_name in attribute_names if attribute_name not in node_attributes]
+        if unread_attribute_names:
+            values = get_node_attributes(node_name, unread_attribute_names)
+            for attribute_name in unread_attribute_names:
+                node_attributes[attribute_name] = values.get(attribute_name, AttributeSnapshot.missing)
+
+        attributes = dict()
+        for attribute_name in attribute_names:
+            if node_attributes[attribute_name] is not AttributeSnapshot.missing:
+                attributes[attribute_name] = node_attributes[attribute_name]
+
+        return attributes
+
+    def get(self, node_name, attribute_name):
+        return self.read(node_name, [attribute_name]).get(attribute_name)
+
+    def exists(self, node_name, attribute_name):
+        return attribute_name in self.read(node_name, [attribute_name])
 
 
 #--------------------------------------------------------------------------------------------------
 # Check if an object is visible for the current frame.
 #--------------------------------------------------------------------------------------------------
 
-def transform_is_visible(node_name):
+def transform_is_visible(node_name, attribute_snapshot=None):
 
     """ Returns the visibility state of a transform for the current frame, this visibility state may change over time """
 
+    if attribute_snapshot is not None:
+        return bool(attribute_snapshot.get(node_name, 'visibility'))
+
     # check if the node exists
     if not cmds.objExists(node_name):
         return False
@@ -245,10 +801,13 @@ def transform_is_visible(node_name):
     return True
 
 
-def mesh_is_renderable(mesh_name):
+def mesh_is_renderable(mesh_name, attribute_snapshot=None):
 
     """ Returns the renderability state of a mesh, this value will not change over time """
 
+    if attribute_snapshot is not None:
+        return not attribute_snapshot.get(mesh_name, 'intermediateObject')
+
     # check to see if it's an intermediate mesh
     if cmds.attributeQuery('intermediateObject', node=mesh_name, exists=True):
         if cmds.getAttr(mesh_name + '.intermediateObject'):
@@ -261,10 +820,16 @@ def mesh_is_renderable(mesh_name):
 # Check if an object is visible for the current frame.
 #--------------------------------------------------------------------------------------------------
 
-def transform_is_renderable(node_name):
+def transform_is_renderable(node_name, attribute_snapshot=None):
 
     """ Returns the renderability state of a transform, this value will not change over time """
 
+    if attribute_snapshot is not None:
+        attributes = attribute_snapshot.read(node_name, ['overrideEnabled', 'overrideVisibility'])
+        if attributes.get('overrideEnabled') and not attributes.get('overrideVisibility'):
+            return False
+        return True
+
     # check if it is a hidden display layer
     if cmds.attributeQuery('overrideEnabled', node=node_name, exists=True) and cmds.getAttr(node_name + '.overrideEnabled'):
         if not cmds.getAttr(node_name + '.overrideVisibility'):
@@ -273,16 +838,215 @@ def transform_is_renderable(node_name):
     return True
 
 
+#--------------------------------------------------------------------------------------------------
+# Walk the DAG once and cache the parent/child relationships.
+#--------------------------------------------------------------------------------------------------
+
+def get_dag_hierarchy():
+
+    """ Walks the DAG in a single pass and returns a dict mapping each full path to a list of (child full path, child kind, child node type) tuples, root nodes are stored under the None key """
+
+    hierarchy = {None: []}
+
+    dag_it = OpenMaya.MItDag(OpenMaya.MItDag.kDepthFirst, OpenMaya.MFn.kInvalid)
+    dag_path = OpenMaya.MDagPath()
+
+    while not dag_it.isDone():
+        dag_it.getPath(dag_path)
+        full_path = dag_path.fullPathName()
+
+        # skip the world node
+        if full_path:
+            parent_path = full_path.rsplit('|', 1)[0]
+            if not parent_path:
+                parent_path = None
+
+            node = dag_path.node()
+            node_type = OpenMaya.MFnDagNode(node).typeName()
+
+            # the kinds match the type filters the exporter used to pass to listRelatives, they are tested on the node
+            # itself as MDagPath.hasFn also matches a transform through the single shape below it
+            if node.hasFn(OpenMaya.MFn.kMesh):
+                kind = 'mesh'
+            elif node.hasFn(OpenMaya.MFn.kLight):
+                kind = 'light'
+            elif node.hasFn(OpenMaya.MFn.kCamera):
+                kind = 'camera'
+            elif node_type == 'ms_appleseed_scene':
+                kind = 'ms_appleseed_scene'
+            elif node.hasFn(OpenMaya.MFn.kTransform):
+                kind = 'transform'
+            else:
+                kind = None
+
+            hierarchy.setdefault(parent_path, []).append((full_path, kind, node_type))
+
+        dag_it.next()
+
+    return hierarchy
+
+
+#--------------------------------------------------------------------------------------------------
+# Index every connection in the scene.
+#--------------------------------------------------------------------------------------------------
+
+def get_node_name(node):
+
+    """ Returns the shortest unique name of a node, the same form listConnections returns """
+
+    if node.hasFn(OpenMaya.MFn.kDagNode):
+        return OpenMaya.MFnDagNode(node).partialPathName()
+
+    return OpenMaya.MFnDependencyNode(node).name()
+
+
+def get_plug_attribute_names(plug):
+
+    """ Returns the long and short names of a plug's attribute and all of its parent attributes, so a connection to translateX is also found when querying translate """
+
+    attribute_names = []
+
+    while True:
+        if plug.isElement():
+            plug = plug.array()
+
+        attribute = OpenMaya.MFnAttribute(plug.attribute())
+        attribute_names.append(attribute.name())
+        attribute_names.append(attribute.shortName())
+
+        if not plug.isChild():
+            break
+
+        plug = plug.parent()
+
+    return attribute_names
+
+
+class ConnectionIndex():
+
+    """ Per export index of every connection in the scene, built with a single walk of the dependency graph """
+
+    def __init__(self):
+        self.sources = dict()
+        self.destinations = dict()
+        self.node_connections = dict()
+        self.node_types = dict()
+        self.aliases = dict()
+
+        node_it = OpenMaya.MItDependencyNodes()
+
+        while not node_it.isDone():
+            node = node_it.thisNode()
+            if not node.hasFn(OpenMaya.MFn.kWorld):
+                self.add_node(node)
+
+            node_it.next()
+
+    def add_node(self, node):
+        node_name = get_node_name(node)
+        self.node_types[node_name] = OpenMaya.MFnDependencyNode(node).typeName()
+
+        # DAG nodes can be looked up by any of their paths
+        if node.hasFn(OpenMaya.MFn.kDagNode):
+            dag_paths = OpenMaya.MDagPathArray()
+            OpenMaya.MDagPath.getAllPathsTo(node, dag_paths)
+            for i in range(dag_paths.length()):
+                self.aliases[dag_paths[i].fullPathName()] = node_name
+                self.aliases[dag_paths[i].partialPathName()] = node_name
+
+        plugs = OpenMaya.MPlugArray()
+        try:
+            OpenMaya.MFnDependencyNode(node).getConnections(plugs)
+        except RuntimeError:
+            # the node has no connections
+            return
+
+        # every connection is stored once, from its destination side
+        source_plugs = OpenMaya.MPlugArray()
+        for i in range(plugs.length()):
+            plug = plugs[i]
+            plug.connectedTo(source_plugs, True, False)
+
+            if source_plugs.length() == 0:
+                continue
+
+            attribute_names = get_plug_attribute_names(plug)
+
+            for j in range(source_plugs.length()):
+                source_plug = source_plugs[j]
+                source_node_name = get_node_name(source_plug.node())
+
+                for attribute_name in attribute_names:
+                    self.add_entry(self.sources, (node_name, attribute_name), source_node_name)
+
+                for attribute_name in get_plug_attribute_names(source_plug):
+                    self.add_entry(self.destinations, (source_node_name, attribute_name), node_name)
+
+                self.add_entry(self.node_connections, node_name, source_node_name)
+                self.add_entry(self.node_connections, source_node_name, node_name)
+
+    def add_entry(self, table, key, node_name):
+        node_names = table.setdefault(key, [])
+        if node_name not in node_names:
+            node_names.append(node_name)
+
+    def resolve(self, node_name):
+        return self.aliases.get(node_name, node_name)
+
+    def split_plug_name(self, plug_name):
+        node_name, attribute_name = plug_name.split('.', 1)
+        return (self.resolve(node_name), attribute_name)
+
+    def get_node_type(self, node_name):
+        node_type = self.node_types.get(self.resolve(node_name))
+        if node_type is None:
+            return cmds.nodeType(node_name)
+        return node_type
+
+    def filter_by_type(self, node_names, node_type):
+        if node_type is None:
+            return list(node_names)
+        return [node_name for node_name in node_names if self.node_types.get(node_name) == node_type]
+
+    def get_source_nodes(self, plug_name, node_type=None):
+
+        """ Returns the nodes connected to the inputs of a plug, equivalent to listConnections(plug, source=True, destination=False) """
+
+        return self.filter_by_type(self.sources.get(self.split_plug_name(plug_name), []), node_type)
+
+    def get_connected_nodes(self, plug_name, node_type=None):
+
+        """ Returns the nodes connected to a plug in either direction, equivalent to listConnections(plug) """
+
+        key = self.split_plug_name(plug_name)
+        node_names = self.sources.get(key, []) + [node_name for node_name in self.destinations.get(key, []) if node_name not in self.sources.get(key, [])]
+        return self.filter_by_type(node_names, node_type)
+
+    def get_node_connections(self, node_name, node_type=None):
+
+        """ Returns the nodes connected to any attribute of a node, equivalent to listConnections(node) """
+
+        return self.filter_by_type(self.node_connections.get(self.resolve(node_name), []), node_type)
+
+    def has_connections(self, plug_name):
+        key = self.split_plug_name(plug_name)
+        return key in self.sources or key in self.destinations
+
+
 #--------------------------------------------------------------------------------------------------
 # check if a transform or any of its parents are set as visible.
 #--------------------------------------------------------------------------------------------------
 
-def visible_in_hierarchy(parent):
+def visible_in_hierarchy(parent, time=None):
     parents = cmds.listRelatives(parent, ap=True, f=True)
     if parents is not None:
-        if cmds.getAttr(parents[0] + '.visibility') == False:
+        if time is None:
+            visibility = cmds.getAttr(parents[0] + '.visibility')
+        else:
+            visibility = cmds.getAttr(parents[0] + '.visibility', time=time)
+        if visibility == False:
             return False
-        return visible_in_hierarchy(parents)
+        return visible_in_hierarchy(parents, time)
     
     return True
 
@@ -325,65 +1089,143 @@ def has_shader_connected(node_name):
 # Read entity definitions from disk.
 #--------------------------------------------------------------------------------------------------
 
-def get_entity_defs(xml_file_path, list=False):
-    nodes = dict()
+ENTITY_DEFS_CACHE_EXTENSION = '.cache.json'
+
+# parsed entity definitions by file path, each entry is (modification time, size, nodes)
+entity_defs_memo = dict()
+
 
-    class Node():
-        def __init__(self, name, type):
-            self.name = name
-            self.type = type
-            self.attributes = dict()
+class EntityDefNode():
+    def __init__(self, name, type):
+        self.name = name
+        self.type = type
+        self.attributes = dict()
 
-    class Attribute():
-        def __init__(self, name):
-            self.name = name
-            self.label = name
-            self.type = 'entity'
-            self.default_value = ''
-            self.entity_types = []
 
-    file = open(xml_file_path, 'r')
-    data = file.read()
-    file.close()
+class EntityDefAttribute():
+    def __init__(self, name):
+        self.name = name
+        self.label = name
+        self.type = 'entity'
+        self.default_value = ''
+        self.entity_types = []
 
-    dom = parseString(data)
 
-    for entity in dom.getElementsByTagName('entity'):
-        entity_model = entity.getAttribute('model')
+def parse_entity_defs(xml_file_path):
+
+    """ Parses an appleseed entity definitions file into a dict of EntityDefNode objects keyed by model """
+
+    nodes = dict()
+
+    for entity in ElementTree.parse(xml_file_path).getroot().iter('entity'):
+        entity_model = entity.get('model')
 
         # create new dict entry to store the node info
-        nodes[entity_model] = Node(entity_model, entity.getAttribute('type'))
+        nodes[entity_model] = EntityDefNode(entity_model, entity.get('type'))
 
-        for child in entity.childNodes:
-            if child.nodeName != 'parameters':
+        for child in entity:
+            if child.tag != 'parameters':
                 continue
-                
-            # add an attribute and give it a name
-            child_name = child.getAttribute('name')
-            nodes[entity_model].attributes[child_name] = Attribute(child_name)
 
-            for param in child.childNodes:
-                if param.nodeName == '#text':
-                    continue
+            # add an attribute and give it a name
+            child_name = child.get('name')
+            attribute = EntityDefAttribute(child_name)
+            nodes[entity_model].attributes[child_name] = attribute
 
+            for param in child:
                 # node is a parameter with single value
-                if param.nodeName == 'parameter':
-                    name = param.getAttribute('name')
-                    value = param.getAttribute('value')
+                if param.tag == 'parameter':
+                    name = param.get('name')
+                    value = param.get('value')
                     if name == 'type':
-                        nodes[entity_model].attributes[child_name].type = value
+                        attribute.type = value
                     elif name == 'default':
-                        nodes[entity_model].attributes[child_name].default_value = value
+                        attribute.default_value = value
                     elif name == 'label':
-                        nodes[entity_model].attributes[child_name].label = value
+                        attribute.label = value
 
                 # node is a parameter with multiple values
-                elif param.nodeName == 'parameters':
+                elif param.tag == 'parameters':
                     # if the node contains entity types we are interested
-                    if param.getAttribute('name') == 'entity_types':
-                        for node in param.childNodes:
-                            if node.nodeName == 'parameter':
-                                nodes[entity_model].attributes[child_name].entity_types.append(node.getAttribute('name'))
+                    if param.get('name') == 'entity_types':
+                        for node in param:
+                            if node.tag == 'parameter':
+                                attribute.entity_types.append(node.get('name'))
+
+    return nodes
+
+
+def read_entity_defs_cache(cache_file_path, mtime, size):
+
+    """ Returns the entity definitions stored in a cache file, None is returned if the cache is missing or was written for another version of the definitions """
+
+    try:
+        with open(cache_file_path, 'r') as cache_file:
+            cache = json.load(cache_file)
+    except (IOError, ValueError):
+        return None
+
+    if cache.get('mtime') != mtime or cache.get('size') != size:
+        return None
+
+    nodes = dict()
+    for entity_model, entity in cache['entities'].iteritems():
+        nodes[entity_model] = EntityDefNode(entity_model, entity['type'])
+        for attribute_name, attribute_values in entity['attributes'].iteritems():
+            attribute = EntityDefAttribute(attribute_name)
+            attribute.label = attribute_values['label']
+            attribute.type = attribute_values['type']
+            attribute.default_value = attribute_values['default_value']
+            attribute.entity_types = attribute_values['entity_types']
+            nodes[entity_model].attributes[attribute_name] = attribute
+
+    return nodes
+
+
+def write_entity_defs_cache(cache_file_path, mtime, size, nodes):
+
+    """ Stores entity definitions in a cache file, the cache is only an optimization so failing to write it is not an error """
+
+    entities = dict()
+    for entity_model, node in nodes.iteritems():
+        attributes = dict()
+        for attribute_name, attribute in node.attributes.iteritems():
+            attributes[attribute_name] = {'label': attribute.label,
+                                          'type': attribute.type,
+                                          'default_value': attribute.default_value,
+                                          'entity_types': attribute.entity_types}
+        entities[entity_model] = {'type': node.type, 'attributes': attributes}
+
+    temporary_path = '{0}.{1}.tmp'.format(cache_file_path, os.getpid())
+    try:
+        with open(temporary_path, 'w') as cache_file:
+            json.dump({'mtime': mtime, 'size': size, 'entities': entities}, cache_file)
+
+        if os.path.exists(cache_file_path):
+            os.remove(cache_file_path)
+        os.rename(temporary_path, cache_file_path)
+    except (IOError, OSError):
+        pass
+
+
+def get_entity_defs(xml_file_path, list=False):
+
+    """ Returns the entity definitions of an appleseed entity definitions file, parsed definitions are kept in memory and on disk until the file changes """
+
+    file_stat = os.stat(xml_file_path)
+    mtime = file_stat.st_mtime
+    size = file_stat.st_size
+
+    memo_entry = entity_defs_memo.get(xml_file_path)
+    if memo_entry is not None and memo_entry[0] == mtime and memo_entry[1] == size:
+        nodes = memo_entry[2]
+    else:
+        cache_file_path = xml_file_path + ENTITY_DEFS_CACHE_EXTENSION
+        nodes = read_entity_defs_cache(cache_file_path, mtime, size)
+        if nodes is None:
+            nodes = parse_entity_defs(xml_file_path)
+            write_entity_defs_cache(cache_file_path, mtime, size, nodes)
+        entity_defs_memo[xml_file_path] = (mtime, size, nodes)
 
     if list:
         print 'Found the following appleseed nodes:\n'
@@ -545,7 +1387,11 @@ def list_objects_by_shader(shader):
 # Get connected node.
 #--------------------------------------------------------------------------------------------------
 
-def get_connected_node(connection):
+def get_connected_node(connection, connection_index=None):
+    if connection_index is not None:
+        connections = connection_index.get_source_nodes(connection)
+        return connections[0] if connections else None
+
     connections = cmds.listConnections(connection, destination=False, source=True)
     return None if connections is None else connections[0]
 
@@ -721,7 +1567,15 @@ def convert_surface_shader_material(material):
 # Returns the materials connected to a mesh.
 #--------------------------------------------------------------------------------------------------
 
-def get_attached_materials(mesh_name):
+def get_attached_materials(mesh_name, connection_index=None):
+    if connection_index is not None:
+        materials = []
+        for shading_engine in connection_index.get_node_connections(mesh_name, 'shadingEngine'):
+            shading_engine_materials = connection_index.get_connected_nodes(shading_engine + '.surfaceShader')
+            if shading_engine_materials:
+                materials.append(shading_engine_materials[0])
+        return materials
+
     shading_engines = cmds.listConnections(mesh_name, t='shadingEngine')
     materials = []
     if shading_engines is not None:
@@ -746,6 +1600,120 @@ def error(message):
     cmds.error(message)
 
 
+#--------------------------------------------------------------------------------------------------
+# Background file writing.
+#--------------------------------------------------------------------------------------------------
+
+class WriterPool():
+
+    """ Bounded pool of background threads that write export files, jobs must not call Maya commands and any errors are reported when the pool is flushed """
+
+    def __init__(self, thread_count=0):
+        if thread_count < 1:
+            thread_count = multiprocessing.cpu_count()
+
+        # the queue is bounded so the main thread can't hold on to more extracted data than the threads can write
+        self.jobs = Queue.Queue(thread_count * 2)
+        self.errors = []
+        self.errors_lock = threading.Lock()
+
+        self.threads = []
+        for i in range(thread_count):
+            thread = threading.Thread(target=self.run)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+
+                function, args, kwargs = job
+                try:
+                    function(*args, **kwargs)
+                except Exception as e:
+                    with self.errors_lock:
+                        self.errors.append('{0} {1}'.format(args, e))
+            finally:
+                self.jobs.task_done()
+
+    def submit(self, function, *args, **kwargs):
+        self.jobs.put((function, args, kwargs))
+
+    def flush(self):
+
+        """ Waits for all the submitted jobs to be written """
+
+        self.jobs.join()
+
+        with self.errors_lock:
+            errors = self.errors
+            self.errors = []
+
+        if errors:
+            for message in errors:
+                warning('Failed to write {0}'.format(message))
+            error('{0} file(s) could not be written, see the script editor for details.'.format(len(errors)))
+
+    def close(self):
+
+        """ Waits for all the submitted jobs to be written and stops the threads, the threads are stopped even if errors are reported """
+
+        try:
+            self.flush()
+        finally:
+            self.stop_threads()
+
+    def abort(self):
+
+        """ Stops the threads without reporting errors, used when an export is cancelled or fails, jobs that haven't started are dropped """
+
+        try:
+            while True:
+                self.jobs.get_nowait()
+                self.jobs.task_done()
+        except Queue.Empty:
+            pass
+
+        self.stop_threads()
+
+        with self.errors_lock:
+            self.errors = []
+
+    def stop_threads(self):
+        for thread in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+
+#--------------------------------------------------------------------------------------------------
+# UI functions that are safe to call from batch mode.
+#--------------------------------------------------------------------------------------------------
+
+def in_batch_mode():
+    return cmds.about(batch=True)
+
+
+def progress_window(**kwargs):
+
+    """ Wrapper for cmds.progressWindow that does nothing when Maya has no UI, e.g. in an export worker """
+
+    if in_batch_mode():
+        return None
+
+    return cmds.progressWindow(**kwargs)
+
+
+def refresh():
+    if not in_batch_mode():
+        cmds.refresh(cv=True)
+
+
 #--------------------------------------------------------------------------------------------------
 # vector functions.
 #--------------------------------------------------------------------------------------------------
@@ -787,6 +1755,20 @@ def matrix_multiply(transform_matrix, m):
             (m[2] * transform_matrix[12]) + (m[6] * transform_matrix[13]) + (m[10] * transform_matrix[14]) + (m[14] * transform_matrix[15]),
             (m[3] * transform_matrix[12]) + (m[7] * transform_matrix[13]) + (m[11] * transform_matrix[14]) + (m[15] * transform_matrix[15]),]
 
+MATRIX_IDENTITY = [1.0, 0.0, 0.0, 0.0,
+                   0.0, 1.0, 0.0, 0.0,
+                   0.0, 0.0, 1.0, 0.0,
+                   0.0, 0.0, 0.0, 1.0]
+
+def matrix_multiply_batch(transform_matrices, matrices):
+    # multiplies two equally long lists of matrices pair by pair, in a single NumPy operation when it is available
+    if HAS_NUMPY and len(matrices) > 0:
+        a = numpy.array(transform_matrices, dtype=numpy.float64).reshape(-1, 4, 4)
+        b = numpy.array(matrices, dtype=numpy.float64).reshape(-1, 4, 4)
+        return numpy.einsum('nij,njk->nik', a, b).reshape(-1, 16).tolist()
+
+    return [matrix_multiply(transform_matrix, m) for transform_matrix, m in zip(transform_matrices, matrices)]
+
 def matrix_get_scale(m):
     x_scale = vector_get_length([m[0], m[1], m[ 2]])
     y_scale = vector_get_length([m[4], m[5], m[ 6]])
@@ -805,6 +1787,54 @@ def matrix_remove_scale(m):
     return matrix_multiply(m, inverse_scale)
 
 
+#--------------------------------------------------------------------------------------------------
+# MatrixSamples class.
+#--------------------------------------------------------------------------------------------------
+
+class MatrixSamples(object):
+
+    """ List of matrix samples stored contiguously as doubles instead of one Python list of floats per sample """
+
+    __slots__ = ('values',)
+
+    def __init__(self, matrices=()):
+        self.values = array.array('d')
+        for matrix in matrices:
+            self.append(matrix)
+
+    def append(self, matrix):
+        self.values.extend(matrix)
+
+    def __len__(self):
+        return len(self.values) // 16
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('matrix sample index out of range')
+        return self.values[index * 16:index * 16 + 16]
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self.values[i * 16:i * 16 + 16]
+
+
+#--------------------------------------------------------------------------------------------------
+# String interning.
+#--------------------------------------------------------------------------------------------------
+
+interned_strings = dict()
+
+def intern_string(value):
+    # the builtin intern() does not accept unicode, share equal file names through a dict instead
+    if value is None:
+        return None
+    return interned_strings.setdefault(value, value)
+
+
 #--------------------------------------------------------------------------------------------------
 # Normalize a path to the Posix format (using / as directory separator), regardless of the host.
 #--------------------------------------------------------------------------------------------------
@@ -917,49 +1947,118 @@ def selection_remove_material_export_modifier(attr):
 # Repackage referenced appleseed file.
 #--------------------------------------------------------------------------------------------------
 
-def strip_scene_xml(xml_file_path, export_dir):
+# filename parameters as ElementTree writes them to a stripped file
+STRIPPED_FILENAME_PATTERN = re.compile(r'<parameter name="filename" value="([^"]*)"')
+
+
+def strip_scene_xml(xml_file_path, export_dir, cache=None):
+
+    """ Writes the assemblies and assembly instances of an appleseed scene to a file in the export directory and copies the files they reference, the path of the written file is returned """
+
+    # a referenced scene is only repackaged once per export, however many times it is instanced
+    source_mtime = os.path.getmtime(xml_file_path)
+    if cache is not None and (xml_file_path, source_mtime) in cache:
+        return cache[(xml_file_path, source_mtime)]
+
     base_name = os.path.split(xml_file_path)[1]
     file_dir = os.path.split(xml_file_path)[0]
 
-    archive_dir = os.path.join(REFERENCED_SCENES, base_name)
-
-    file = open(xml_file_path, 'r')
-    data = file.read()
-    file.close()
+    # scenes with the same file name in different directories must not share their stripped file or copied files
+    normalized_path = os.path.normcase(os.path.abspath(xml_file_path))
+    if isinstance(normalized_path, unicode):
+        normalized_path = normalized_path.encode('utf-8')
+    path_hash = hashlib.sha1(normalized_path).hexdigest()[:12]
+    unique_name = '{0}_{1}'.format(base_name, path_hash)
 
-    dom = parseString(data)
+    archive_dir = os.path.join(REFERENCED_SCENES, unique_name)
+    stripped_file_path = os.path.join(export_dir, REFERENCED_SCENES, unique_name + '.xml')
+    create_dir(os.path.join(export_dir, REFERENCED_SCENES))
 
     # source and destinations for copied files are stored in a dict with the 
     # source as the key to avoid wasting time copying the file many times
     file_source_dest_pairs = {}
 
-    stripped_xml = ''
+    # a stripped file written after the last change to the scene is up to date, only its copied files are checked
+    if os.path.exists(stripped_file_path) and os.path.getmtime(stripped_file_path) >= source_mtime:
+        with open(stripped_file_path, 'r') as stripped_file:
+            for line in stripped_file:
+                for match in STRIPPED_FILENAME_PATTERN.finditer(line):
+                    dest = unescape(match.group(1), {'&quot;': '"'})
+                    if dest.startswith(archive_dir):
+                        file_source_dest_pairs[os.path.join(file_dir, os.path.relpath(dest, archive_dir))] = os.path.join(export_dir, dest)
+
+        copy_referenced_files(file_source_dest_pairs)
+
+        if cache is not None:
+            cache[(xml_file_path, source_mtime)] = stripped_file_path
+
+        return stripped_file_path
 
-    for scene in dom.getElementsByTagName('scene'):
-        for param in scene.getElementsByTagName('parameter'):
-            if param.getAttribute('name') == 'filename':
-                source = param.getAttribute('value')
+    # the file is written under a temporary name and moved into place once complete, other export processes may be
+    # streaming the previous version into their project files
+    temporary_path = get_temporary_path(stripped_file_path)
 
-                if not os.path.isabs(source):
-                    dest = os.path.join(archive_dir, source)
-                    param.setAttribute('value', dest)
-                    file_source_dest_pairs[os.path.join(file_dir, source)] = os.path.join(export_dir, dest)
+    # the scene is streamed so only the element being written is held in memory
+    element_stack = []
+    with open(temporary_path, 'w') as stripped_file:
+        for event, element in ElementTree.iterparse(xml_file_path, events=('start', 'end')):
+            if event == 'start':
+                element_stack.append(element)
+                continue
+
+            element_stack.pop()
+
+            # elements directly under the project or the scene are released once they have been handled
+            if len(element_stack) == 2 and element_stack[1].tag == 'scene':
+                if element.tag == 'assembly' or element.tag == 'assembly_instance':
+                    for param in element.iter('parameter'):
+                        if param.get('name') == 'filename':
+                            source = param.get('value')
+
+                            if not os.path.isabs(source):
+                                dest = os.path.join(archive_dir, source)
+                                param.set('value', dest)
+                                file_source_dest_pairs[os.path.join(file_dir, source)] = os.path.join(export_dir, dest)
+
+                    element.tail = None
+                    stripped_file.write(ElementTree.tostring(element))
+                    stripped_file.write('\n')
+
+                element_stack[1].remove(element)
 
+            elif len(element_stack) == 1:
+                element_stack[0].remove(element)
 
-        for element in scene.childNodes:
-            if element.__class__.__name__ == 'Element':
-                if element.tagName == 'assembly' or element.tagName == 'assembly_instance':
-                    stripped_xml += element.toxml()
+    # the referenced files are copied before the stripped file is moved into place, so an up to date stripped file
+    # means its files were copied
+    copy_referenced_files(file_source_dest_pairs)
+    replace_file(temporary_path, stripped_file_path)
 
+    if cache is not None:
+        cache[(xml_file_path, source_mtime)] = stripped_file_path
+
+    return stripped_file_path
+
+
+def copy_referenced_files(file_source_dest_pairs):
+
+    """ Copies the files referenced by a stripped scene, files that are already up to date from a previous export are left alone """
 
     for key in file_source_dest_pairs.keys():
         dest = os.path.split(file_source_dest_pairs[key])[0]
-        if not os.path.exists(dest):
-            os.makedirs(dest)
+        create_dir(dest)
 
-        shutil.copy(key, file_source_dest_pairs[key])
+        dest_file_path = file_source_dest_pairs[key]
+        if os.path.exists(dest_file_path):
+            source_stat = os.stat(key)
+            dest_stat = os.stat(dest_file_path)
+            if source_stat.st_size == dest_stat.st_size and source_stat.st_mtime <= dest_stat.st_mtime:
+                continue
 
-    return stripped_xml
+        # copy under a temporary name as well, another export process may be reading the previous copy
+        temporary_path = get_temporary_path(dest_file_path)
+        shutil.copy2(key, temporary_path)
+        replace_file(temporary_path, dest_file_path)
 
 
 def create_ms_appleseed_scene():
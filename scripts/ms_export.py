@@ -30,10 +30,17 @@ import re
 import subprocess
 import sys
 import ms_commands
+import ms_export_obj
+import ms_export_binarymesh
 import time
 import inspect
 import shutil
 import copy
+import gzip
+import functools
+import threading
+import Queue
+import array
 
 global previous_export
 previous_export = None
@@ -44,12 +51,21 @@ previous_export = None
 
 class WriteXml():
     spaces_per_indentation_level = 4
+    buffer_size = 1024 * 1024
 
-    def __init__(self, file_path):
+    def __init__(self, file_path, compact=False, compress=False):
         self.indentation_level = 0
+        self.compact = compact
+        self.indentation_strings = ['']
+        self.recordings = []
+        self.buffer = []
+        self.buffered_size = 0
         self.file_object = None
         try:
-            self.file_object = open(file_path, 'w')
+            if compress:
+                self.file_object = gzip.open(file_path, 'wb')
+            else:
+                self.file_object = open(file_path, 'w')
         except IOError:
             cmds.error("IO error: failed to open {0} for writing.".format(file_path))
 
@@ -65,16 +81,71 @@ class WriteXml():
         self.append_line("<" + str + "/>")
 
     def append_parameter(self, name, value):
-        self.append_line('<parameter name="{0}" value="{1}" />'.format(name, value))
+        self.append_line('<parameter name="%s" value="%s" />' % (name, value))
+
+    def append_entity(self, entity):
+        # immutable entities record their lines relative to the current level the first time they are emitted
+        # and replay that fragment on every later emit instead of serializing themselves again
+        if not getattr(entity, 'immutable', False):
+            entity.emit_xml(self)
+            return
+
+        xml_fragment = getattr(entity, 'xml_fragment', None)
+        if xml_fragment is None:
+            xml_fragment = []
+            self.recordings.append((self.indentation_level, xml_fragment))
+            entity.emit_xml(self)
+            self.recordings.pop()
+            entity.xml_fragment = xml_fragment
+            entity.xml_fragment_text = {}
+        elif len(self.recordings) > 0:
+            base_level = self.indentation_level
+            for relative_level, line in xml_fragment:
+                self.indentation_level = base_level + relative_level
+                self.append_line(line)
+            self.indentation_level = base_level
+        else:
+            # outside of a recording the fragment only needs to be indented once for each level it is written at
+            key = (self.indentation_level, self.compact)
+            text = entity.xml_fragment_text.get(key)
+            if text is None:
+                base_level = self.indentation_level
+                lines = []
+                for relative_level, line in xml_fragment:
+                    self.indentation_level = base_level + relative_level
+                    lines.append(self.indentation_string() + line + "\n")
+                self.indentation_level = base_level
+                text = ''.join(lines)
+                entity.xml_fragment_text[key] = text
+            self.append_text(text)
 
     def append_line(self, str):
-        self.file_object.write(self.indentation_string() + str + "\n")
+        for base_level, xml_fragment in self.recordings:
+            xml_fragment.append((self.indentation_level - base_level, str))
+        self.append_text(self.indentation_string() + str + "\n")
+
+    def append_text(self, text):
+        # text is appended verbatim, it must already be indented and end with a new line
+        self.buffer.append(text)
+        self.buffered_size += len(text)
+        if self.buffered_size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file_object.write(''.join(self.buffer))
+        self.buffer = []
+        self.buffered_size = 0
 
     def close(self):
+        self.flush()
         self.file_object.close()
 
     def indentation_string(self):
-        return (self.indentation_level * self.spaces_per_indentation_level) * " "
+        if self.compact:
+            return ''
+        while self.indentation_level >= len(self.indentation_strings):
+            self.indentation_strings.append((len(self.indentation_strings) * self.spaces_per_indentation_level) * " ")
+        return self.indentation_strings[self.indentation_level]
 
 
 #--------------------------------------------------------------------------------------------------
@@ -82,8 +153,8 @@ class WriteXml():
 #--------------------------------------------------------------------------------------------------
 
 def check_export_cancelled():
-    if cmds.progressWindow(query=True, isCancelled=True):
-        cmds.progressWindow(endProgress=1)
+    if ms_commands.progress_window(query=True, isCancelled=True):
+        ms_commands.progress_window(endProgress=1)
         ms_commands.warning("Export cancelled")
         sys.exit()
         
@@ -99,24 +170,87 @@ def get_maya_params(render_settings_node):
 
     params['entity_defs'] = ms_commands.get_entity_defs(os.path.join(ms_commands.ROOT_DIRECTORY, 'scripts', 'appleseedEntityDefs.xml'))
 
+    # read all the settings in one pass, the snapshot is kept for the rest of the export so other nodes are read the same way
+    params['attribute_snapshot'] = ms_commands.AttributeSnapshot()
+    settings = params['attribute_snapshot'].read(render_settings_node, [
+        'output_directory',
+        'output_file',
+        'convert_shading_nodes_to_textures',
+        'convert_textures_to_exr',
+        'overwrite_existing_textures',
+        'overwrite_existing_geometry',
+        'geometry_format',
+        'compress_geometry',
+        'export_threads',
+        'texture_conversion_processes',
+        'hash_texture_contents',
+        'compact_xml',
+        'frame_chunk_size',
+        'compress_xml',
+        'export_camera_blur',
+        'export_maya_lights',
+        'export_transformation_blur',
+        'export_deformation_blur',
+        'motion_samples',
+        'shutter_open_time',
+        'shutter_close_time',
+        'export_animation',
+        'animation_start_frame',
+        'animation_end_frame',
+        'export_animated_textures',
+        'render_sky',
+        'scene_index_of_refraction',
+        'export_all_cameras_as_thin_lens',
+        'color_space',
+        'frame_width',
+        'frame_height',
+        'export_straight_alpha',
+        'sampler',
+        'uniform_samples',
+        'uniform_decorrelate_pixels',
+        'adaptive_min_samples',
+        'adaptive_max_samples',
+        'adaptive_quality',
+        'pt_ibl',
+        'pt_caustics',
+        'pt_direct_lighting',
+        'pt_next_event_estimation',
+        'pt_max_bounces',
+        'pt_light_samples',
+        'pt_environment_samples',
+        'pt_max_ray_intensity',
+        'enable_importance_sampling',
+        'autodetect_alpha',
+        'force_linear_texture_interpretation',
+        'force_linear_color_interpretation',
+        'tile_width',
+        'tile_height',
+        'use_long_names'
+    ])
+
     # Main settings.
-    params['output_directory'] = cmds.getAttr(render_settings_node + '.output_directory')
-    params['file_name'] = cmds.getAttr(render_settings_node + '.output_file')
-    params['convert_shading_nodes'] = cmds.getAttr(render_settings_node + '.convert_shading_nodes_to_textures')
-    params['convert_textures_to_exr'] = cmds.getAttr(render_settings_node + '.convert_textures_to_exr')
-    params['overwrite_existing_textures'] = cmds.getAttr(render_settings_node + '.overwrite_existing_textures')
-    params['overwrite_existing_geometry'] = cmds.getAttr(render_settings_node + '.overwrite_existing_geometry')
-    params['export_camera_blur'] = cmds.getAttr(render_settings_node + '.export_camera_blur')
-    params['exportMayaLights'] = cmds.getAttr(render_settings_node + '.export_maya_lights')
-    params['export_transformation_blur'] = cmds.getAttr(render_settings_node + '.export_transformation_blur')
-    params['export_deformation_blur'] = cmds.getAttr(render_settings_node + '.export_deformation_blur')
-    params['motion_samples'] = cmds.getAttr(render_settings_node + '.motion_samples')
-    params['shutter_open_time'] = cmds.getAttr(render_settings_node + '.shutter_open_time')
-    params['shutter_close_time'] = cmds.getAttr(render_settings_node + '.shutter_close_time')
-    params['export_animation'] = cmds.getAttr(render_settings_node + '.export_animation')
-    params['animation_start_frame'] = cmds.getAttr(render_settings_node + '.animation_start_frame')
-    params['animation_end_frame'] = cmds.getAttr(render_settings_node + '.animation_end_frame')
-    params['animated_textures'] = cmds.getAttr(render_settings_node + '.export_animated_textures')
+    params['output_directory'] = settings['output_directory']
+    params['file_name'] = settings['output_file']
+    params['convert_shading_nodes'] = settings['convert_shading_nodes_to_textures']
+    params['convert_textures_to_exr'] = settings['convert_textures_to_exr']
+    params['texture_conversion_processes'] = settings['texture_conversion_processes']
+    params['hash_texture_contents'] = settings['hash_texture_contents']
+    params['compact_xml'] = settings['compact_xml']
+    params['frame_chunk_size'] = settings['frame_chunk_size']
+    params['compress_xml'] = settings['compress_xml']
+    params['overwrite_existing_textures'] = settings['overwrite_existing_textures']
+    params['overwrite_existing_geometry'] = settings['overwrite_existing_geometry']
+    params['export_camera_blur'] = settings['export_camera_blur']
+    params['exportMayaLights'] = settings['export_maya_lights']
+    params['export_transformation_blur'] = settings['export_transformation_blur']
+    params['export_deformation_blur'] = settings['export_deformation_blur']
+    params['motion_samples'] = settings['motion_samples']
+    params['shutter_open_time'] = settings['shutter_open_time']
+    params['shutter_close_time'] = settings['shutter_close_time']
+    params['export_animation'] = settings['export_animation']
+    params['animation_start_frame'] = settings['animation_start_frame']
+    params['animation_end_frame'] = settings['animation_end_frame']
+    params['animated_textures'] = settings['export_animated_textures']
     params['scene_scale'] = 1.0
 
     if not (params['export_transformation_blur'] or params['export_deformation_blur'] or params['export_camera_blur'] or params['export_animation']):
@@ -131,12 +265,12 @@ def get_maya_params(render_settings_node):
     else:
         params['environment'] = False
 
-    params['render_sky'] = cmds.getAttr(render_settings_node + '.render_sky')
-    params['scene_ior'] = cmds.getAttr(render_settings_node + '.scene_index_of_refraction')
+    params['render_sky'] = settings['render_sky']
+    params['scene_ior'] = settings['scene_index_of_refraction']
 
     # Cameras.
     # params['sceneCameraExportAllCameras'] = cmds.checkBox('ms_sceneCameraExportAllCameras', query=True, value=True)
-    params['export_all_cameras_as_thin_lens'] = cmds.getAttr(render_settings_node + '.export_all_cameras_as_thin_lens')
+    params['export_all_cameras_as_thin_lens'] = settings['export_all_cameras_as_thin_lens']
 
     # Output.
     if cmds.listConnections(render_settings_node + '.camera'):
@@ -147,53 +281,60 @@ def get_maya_params(render_settings_node):
         params['output_camera'] = '|persp|perspShape'
         ms_commands.warning('No camera connected to {0}, using "{1}".'.format(render_settings_node, params['output_camera']))
 
-    if cmds.getAttr(render_settings_node + '.color_space') == 1:
+    if settings['color_space'] == 1:
         params['output_color_space'] = 'linear_rgb'
-    elif cmds.getAttr(render_settings_node + '.color_space') == 2:
+    elif settings['color_space'] == 2:
         params['output_color_space'] = 'spectral'
-    elif cmds.getAttr(render_settings_node + '.color_space') == 3:
+    elif settings['color_space'] == 3:
         params['output_color_space'] = 'ciexyz'
     else:
         params['output_color_space'] = 'srgb'
 
-    params['output_res_width'] = cmds.getAttr(render_settings_node + '.width')
-    params['output_res_height'] = cmds.getAttr(render_settings_node + '.height')
-    params['export_straight_alpha'] = cmds.getAttr(render_settings_node + '.export_straight_alpha')
+    params['output_res_width'] = settings['frame_width']
+    params['output_res_height'] = settings['frame_height']
+    params['export_straight_alpha'] = settings['export_straight_alpha']
+
+    # render layers, found by listing the attributes of the settings node rather than querying each possible index
+    layer_indices = set()
+    for attribute_name in ms_commands.get_node_attribute_names(render_settings_node):
+        match = re.match(r'^render_layer_(\d+)_name$', attribute_name)
+        if match:
+            layer_indices.add(int(match.group(1)))
 
-    # render layers
     params['render_layers'] = []
-    for i in range(50):
-        i += 1
-        test_layer_name = 'render_layer_{0}_name'.format(i)  
-        if cmds.attributeQuery(test_layer_name, exists=True, node=render_settings_node):
-            layer = {}
-            for attr in ms_commands.RENDER_LAYER_ATTRS:
-                layer[attr[0]] = cmds.getAttr('{0}.render_layer_{1}_{2}'.format(render_settings_node, i, attr[0]))
+    for i in sorted(layer_indices):
+        if i > 50:
+            continue
+        layer_attribute_names = ['render_layer_{0}_{1}'.format(i, attr[0]) for attr in ms_commands.RENDER_LAYER_ATTRS]
+        layer_attributes = params['attribute_snapshot'].read(render_settings_node, layer_attribute_names)
+        layer = {}
+        for attr in ms_commands.RENDER_LAYER_ATTRS:
+            layer[attr[0]] = layer_attributes['render_layer_{0}_{1}'.format(i, attr[0])]
 
-            params['render_layers'].append(layer)
+        params['render_layers'].append(layer)
 
     # configuration settings.
-    params['sampler'] = cmds.getAttr(render_settings_node + '.sampler')
+    params['sampler'] = settings['sampler']
     if params['sampler'] == 0:
         params['sampler'] = 'adaptive'
     else:
         params['sampler'] = 'uniform'
 
-    params['uniform_samples'] = cmds.getAttr(render_settings_node + '.uniform_samples')
-    params['uniform_decorrelate_pixels'] = cmds.getAttr(render_settings_node + '.uniform_decorrelate_pixels')
+    params['uniform_samples'] = settings['uniform_samples']
+    params['uniform_decorrelate_pixels'] = settings['uniform_decorrelate_pixels']
  
-    params['adaptive_min_samples'] = cmds.getAttr(render_settings_node + '.adaptive_min_samples')
-    params['adaptive_max_samples'] = cmds.getAttr(render_settings_node + '.adaptive_max_samples')
-    params['adaptive_quality'] = cmds.getAttr(render_settings_node + '.adaptive_quality')
-    params['pt_ibl'] = cmds.getAttr(render_settings_node + '.pt_ibl')
-    params['pt_caustics'] = cmds.getAttr(render_settings_node + '.pt_caustics')
-    params['pt_direct_lighting'] = cmds.getAttr(render_settings_node + '.pt_direct_lighting')
-    params['pt_next_event_estimation'] = cmds.getAttr(render_settings_node + '.pt_next_event_estimation')
-    params['pt_max_bounces'] = cmds.getAttr(render_settings_node + '.pt_max_bounces')
-    params['pt_light_samples'] = cmds.getAttr(render_settings_node + '.pt_light_samples')
-    params['pt_environment_samples'] = cmds.getAttr(render_settings_node + '.pt_environment_samples')
-    params['pt_max_ray_intensity'] = cmds.getAttr(render_settings_node + '.pt_max_ray_intensity')
-    params['enable_importance_sampling'] = cmds.getAttr(render_settings_node + '.enable_importance_sampling')
+    params['adaptive_min_samples'] = settings['adaptive_min_samples']
+    params['adaptive_max_samples'] = settings['adaptive_max_samples']
+    params['adaptive_quality'] = settings['adaptive_quality']
+    params['pt_ibl'] = settings['pt_ibl']
+    params['pt_caustics'] = settings['pt_caustics']
+    params['pt_direct_lighting'] = settings['pt_direct_lighting']
+    params['pt_next_event_estimation'] = settings['pt_next_event_estimation']
+    params['pt_max_bounces'] = settings['pt_max_bounces']
+    params['pt_light_samples'] = settings['pt_light_samples']
+    params['pt_environment_samples'] = settings['pt_environment_samples']
+    params['pt_max_ray_intensity'] = settings['pt_max_ray_intensity']
+    params['enable_importance_sampling'] = settings['enable_importance_sampling']
 
     # Select obj exporter.
     if cmds.pluginInfo('ms_export_obj_' + str(int(mel.eval('getApplicationVersionAsFloat()'))), query=True, r=True):
@@ -202,12 +343,31 @@ def get_maya_params(render_settings_node):
         ms_commands.warning("No native obj exporter found, exporting using Python obj exporter.")
         params['obj_exporter'] = ms_export_obj.export
 
-    params['autodetect_alpha'] = cmds.getAttr(render_settings_node + '.autodetect_alpha')
-    params['force_linear_texture_interpretation'] = cmds.getAttr(render_settings_node + '.force_linear_texture_interpretation')
-    params['force_linear_color_interpretation'] = cmds.getAttr(render_settings_node + '.force_linear_color_interpretation')
-    params['tile_width'] = cmds.getAttr(render_settings_node + '.tile_width')
-    params['tile_height'] = cmds.getAttr(render_settings_node + '.tile_height')
-    params['use_long_names'] = cmds.getAttr(render_settings_node + '.use_long_names')
+    # Select geometry format.
+    if settings['geometry_format'] == 1:
+        if settings['compress_geometry'] and not ms_export_binarymesh.HAS_LZ4:
+            ms_commands.warning("The lz4 module is not available, binary mesh files will not be compressed.")
+        elif settings['compress_geometry'] and not ms_export_binarymesh.LZ4_OUTPUT_ENABLED:
+            ms_commands.warning("Compressed binary mesh output is disabled, binary mesh files will not be compressed.")
+        params['geometry_extension'] = 'binarymesh'
+        params['geometry_exporter'] = functools.partial(ms_export_binarymesh.export, compress_data=settings['compress_geometry'])
+    else:
+        params['geometry_extension'] = 'obj'
+        params['geometry_exporter'] = params['obj_exporter']
+
+    # the native obj exporter is a Maya command so it has to run on the main thread, the Python
+    # exporters only format data that was already extracted and can write from background threads
+    if params['geometry_exporter'] is ms_commands.export_obj:
+        params['export_threads'] = None
+    else:
+        params['export_threads'] = settings['export_threads']
+
+    params['autodetect_alpha'] = settings['autodetect_alpha']
+    params['force_linear_texture_interpretation'] = settings['force_linear_texture_interpretation']
+    params['force_linear_color_interpretation'] = settings['force_linear_color_interpretation']
+    params['tile_width'] = settings['tile_width']
+    params['tile_height'] = settings['tile_height']
+    params['use_long_names'] = settings['use_long_names']
 
     return params
 
@@ -218,38 +378,34 @@ def get_maya_params(render_settings_node):
 
 def get_maya_scene(params):
 
-    """ Parses the Maya scene and returns a list of root transforms with the relevant children """
+    """ Parses the Maya scene and returns a list of root transforms with the relevant children, samples are added with add_maya_scene_samples """
 
     info_message = "Caching Maya transform data..."
     ms_commands.info(info_message)
-    cmds.progressWindow(e=True, status=info_message, progress=0, max=1)
-    cmds.refresh(cv=True)
-
-    start_time = cmds.currentTime(query=True)
+    ms_commands.progress_window(e=True, status=info_message, progress=0, max=1)
+    ms_commands.refresh()
 
     # the Maya scene is stored as a list of root transforms that contain meshes/geometry/lights as children
     maya_root_transforms = []
 
-    # find all root transforms and create Mtransforms from them
-    for maya_transform in cmds.ls(tr=True, long=True):
-        if not cmds.listRelatives(maya_transform, ap=True, fullPath=True):
-            if ms_commands.transform_is_renderable(maya_transform):
-                maya_root_transforms.append(MTransform(params, maya_transform, None))
+    # walk the DAG once, the MTransform hierarchy is then built from the cached relationships
+    params['dag_hierarchy'] = ms_commands.get_dag_hierarchy()
 
-    cmds.progressWindow(e=True, progress=1)
+    # index all the scene connections so connection lookups don't need to query Maya
+    params['connection_index'] = ms_commands.ConnectionIndex()
 
-    start_frame = int(start_time)
-    end_frame = start_frame
-    sample_increment = 1.0
-    if params['motion_samples'] > 1:
-        sample_increment = 1.0 / (params['motion_samples'] - 1)
+    # materials are read from Maya once and shared by all the meshes they are assigned to
+    params['material_registry'] = dict()
+    params['shading_node_registry'] = dict()
+    params['shading_nodes_in_progress'] = set()
 
-    if params['export_animation']:
-        start_frame = params['animation_start_frame']
-        end_frame = params['animation_end_frame']
+    # find all root transforms and create Mtransforms from them
+    for maya_transform, kind, node_type in params['dag_hierarchy'][None]:
+        if kind == 'transform':
+            if ms_commands.transform_is_renderable(maya_transform, params['attribute_snapshot']):
+                maya_root_transforms.append(MTransform(params, maya_transform, None))
 
-    if params['export_transformation_blur'] or params['export_deformation_blur'] or params['export_camera_blur']:
-        end_frame += 1
+    ms_commands.progress_window(e=True, progress=1)
 
     # compute the base output directory
     scene_filepath = cmds.file(q=True, sceneName=True)
@@ -263,6 +419,12 @@ def get_maya_scene(params):
     ms_commands.create_dir(os.path.join(params['output_directory'], ms_commands.TEXTURE_DIR))
     ms_commands.create_dir(os.path.join(params['output_directory'], ms_commands.GEO_DIR))
 
+    # textures are only converted again when their source has changed since the last export
+    params['texture_cache'] = ms_commands.TextureConversionCache(os.path.join(params['output_directory'], ms_commands.TEXTURE_DIR), params['hash_texture_contents'])
+
+    # referenced appleseed scenes are repackaged once per export
+    params['stripped_scenes'] = dict()
+
     # get environment
     environment = None
     if params['environment']:
@@ -273,49 +435,196 @@ def get_maya_scene(params):
 
         environment.add_environment_sample(params['output_directory'], 0)
 
+    return maya_root_transforms, environment
+
+
+#--------------------------------------------------------------------------------------------------
+# add_maya_scene_samples function.
+#--------------------------------------------------------------------------------------------------
+
+def add_maya_scene_samples(params, maya_root_transforms):
+
+    """ Adds the motion samples of the frame range in params to a cached Maya scene """
+
+    start_time = cmds.currentTime(query=True)
+
+    start_frame = int(start_time)
+    end_frame = start_frame
+    sample_increment = 1.0
+    if params['motion_samples'] > 1:
+        sample_increment = 1.0 / (params['motion_samples'] - 1)
+
+    if params['export_animation']:
+        start_frame = params['animation_start_frame']
+        end_frame = params['animation_end_frame']
+
+    if params['export_transformation_blur'] or params['export_deformation_blur'] or params['export_camera_blur']:
+        end_frame += 1
+
     # add motion samples
     current_frame = start_frame
     frame_sample_number = 1
 
+    # transforms, visibility and cameras are sampled with getAttr(time=...), the scene clock is only moved when
+    # deforming geometry has to be exported or shading networks baked, as both read the evaluated scene
+    scene_time_required = False
+    for transform in maya_root_transforms:
+        if scene_requires_time_change(transform):
+            scene_time_required = True
+            break
 
-    cmds.progressWindow(edit=True, progress=0, status='Adding motion samples', max=end_frame - start_frame + 1)
-    cmds.refresh(cv=True)
+
+    ms_commands.progress_window(edit=True, progress=0, status='Adding motion samples', max=end_frame - start_frame + 1)
+    ms_commands.refresh()
     while current_frame <= end_frame:
 
         info_message = "Adding motion samples, frame {0}...".format(current_frame)
         ms_commands.info(info_message)
 
-        cmds.progressWindow(e=True, status=info_message)
-        cmds.refresh(cv=True)
-
-        cmds.currentTime(current_frame)
+        ms_commands.progress_window(e=True, status=info_message)
+        ms_commands.refresh()
 
         # determine if this is the first sample of a frame
         initial_sample = (frame_sample_number == 1)
 
+        if scene_time_required and initial_sample:
+            cmds.currentTime(current_frame)
+
         for transform in maya_root_transforms:
             add_scene_sample(transform, params['export_transformation_blur'], params['export_deformation_blur'], params['export_camera_blur'], current_frame, start_frame, frame_sample_number, initial_sample, params['output_directory'])
 
+        # shared materials are sampled once rather than once for each mesh they are assigned to
+        if initial_sample:
+            add_material_samples(params['material_registry'], current_frame, params['output_directory'])
+
         frame_sample_number += 1
         if frame_sample_number == params['motion_samples']:
             frame_sample_number = 1
 
         current_frame += sample_increment
 
-        MMesh.export_geo(params['obj_exporter'], current_frame)
+        MMesh.export_geo(params['geometry_exporter'], current_frame, params['writer_pool'])
 
-        MFile.export_images(params['output_directory'], params['overwrite_existing_textures'], current_frame)
+        MFile.export_images(params['output_directory'], params['overwrite_existing_textures'], current_frame, params['texture_conversion_processes'], params['texture_cache'])
 
-        cmds.progressWindow(e=True, progress=current_frame - start_frame)
-        cmds.refresh(cv=True)
+        ms_commands.progress_window(e=True, progress=current_frame - start_frame)
+        ms_commands.refresh()
 
     # return to pre-export time
-    cmds.currentTime(start_time)
+    if scene_time_required:
+        cmds.currentTime(start_time)
 
-    cmds.progressWindow(e=True, progress=end_frame - start_frame)
-    cmds.refresh(cv=True)
+    ms_commands.progress_window(e=True, progress=end_frame - start_frame)
+    ms_commands.refresh()
 
-    return maya_root_transforms, environment
+    compose_assembly_matrices(maya_root_transforms, params['export_transformation_blur'])
+
+    # the scene bounding box of every frame is computed from the cached samples
+    frame_count = 1
+    if params['export_animation']:
+        frame_count = params['animation_end_frame'] - params['animation_start_frame'] + 1
+    # with transformation blur every frame holds motion_samples - 1 matrix samples, visibility and bounds are sampled once per frame
+    matrix_samples_per_frame = 1
+    if params['export_transformation_blur']:
+        matrix_samples_per_frame = max(params['motion_samples'] - 1, 1)
+    params['bounding_boxes'] = [get_scene_bounding_box(maya_root_transforms, sample_number, sample_number * matrix_samples_per_frame) for sample_number in range(frame_count)]
+
+
+#--------------------------------------------------------------------------------------------------
+# compose_assembly_matrices function.
+#--------------------------------------------------------------------------------------------------
+
+def compose_assembly_matrices(maya_root_transforms, transformation_blur):
+
+    """ Composes the matrix samples of every transform with those of its parents up to the nearest assembly so entities get a single matrix, world space matrices are composed as well """
+
+    # the hierarchy is processed one depth level at a time so each level is a single batched multiply
+    # level entries are (transform, parent within the same assembly, parent)
+    level = [(transform, None, None) for transform in maya_root_transforms]
+
+    while len(level) > 0:
+        transform_matrices = []
+        parent_matrices = []
+        for transform, assembly_parent, parent in level:
+            if assembly_parent is None:
+                parent_matrices += [ms_commands.MATRIX_IDENTITY] * len(transform.matrices)
+            else:
+                parent_matrices += assembly_parent.assembly_matrices
+
+            if parent is None:
+                parent_matrices += [ms_commands.MATRIX_IDENTITY] * len(transform.matrices)
+            else:
+                parent_matrices += parent.world_matrices
+
+            transform_matrices += list(transform.matrices) * 2
+
+        composed_matrices = ms_commands.matrix_multiply_batch(transform_matrices, parent_matrices)
+
+        next_level = []
+        offset = 0
+        for transform, assembly_parent, parent in level:
+            sample_count = len(transform.matrices)
+            transform.assembly_matrices = ms_commands.MatrixSamples(composed_matrices[offset:offset + sample_count])
+            transform.world_matrices = ms_commands.MatrixSamples(composed_matrices[offset + sample_count:offset + 2 * sample_count])
+            offset += 2 * sample_count
+
+            # transforms that become their own assembly start a new matrix hierarchy for their children
+            if transform.is_animated and transformation_blur and transform.has_children:
+                child_assembly_parent = None
+            else:
+                child_assembly_parent = transform
+
+            for child_transform in transform.child_transforms:
+                next_level.append((child_transform, child_assembly_parent, transform))
+
+        level = next_level
+
+
+#--------------------------------------------------------------------------------------------------
+# get_scene_bounding_box function.
+#--------------------------------------------------------------------------------------------------
+
+def get_scene_bounding_box(maya_root_transforms, sample_number, matrix_sample_number):
+
+    """ Returns the world space bounding box of the visible meshes of a cached scene at a frame sample and the matching matrix sample as [min x, min y, min z, max x, max y, max z], or None if there are none """
+
+    bounding_box = None
+    transforms = list(maya_root_transforms)
+
+    while len(transforms) > 0:
+        transform = transforms.pop()
+
+        if not transform.visibility_states[sample_number]:
+            continue
+
+        transforms += transform.child_transforms
+        m = transform.world_matrices[matrix_sample_number]
+
+        for mesh in transform.child_meshes:
+            if len(mesh.local_bounds) == 0:
+                continue
+
+            # meshes without deformation only have the sample of the first frame
+            bounds = mesh.local_bounds[min(sample_number, len(mesh.local_bounds) - 1)]
+            if bounds is None:
+                continue
+
+            # transform the corners of the object space box, maya matrices transform row vectors
+            for x in (bounds[0], bounds[3]):
+                for y in (bounds[1], bounds[4]):
+                    for z in (bounds[2], bounds[5]):
+                        point = [x * m[0] + y * m[4] + z * m[8]  + m[12],
+                                 x * m[1] + y * m[5] + z * m[9]  + m[13],
+                                 x * m[2] + y * m[6] + z * m[10] + m[14]]
+
+                        if bounding_box is None:
+                            bounding_box = point + point
+                        else:
+                            for i in range(3):
+                                bounding_box[i] = min(bounding_box[i], point[i])
+                                bounding_box[i + 3] = max(bounding_box[i + 3], point[i])
+
+    return bounding_box
 
 
 #--------------------------------------------------------------------------------------------------
@@ -327,29 +636,17 @@ def add_scene_sample(m_transform, transform_blur, deform_blur, camera_blur, curr
     check_export_cancelled()
 
     if transform_blur or initial_sample:
-        m_transform.add_transform_sample()
+        m_transform.add_transform_sample(current_frame)
         if (frame_sample_number == 1) or initial_sample:
-            m_transform.add_visibility_sample()
+            m_transform.add_visibility_sample(current_frame)
 
     if deform_blur or initial_sample:
         for mesh in m_transform.child_meshes:
-            # Only add a sample if this is the first frame to be exported or if it has some deformation
-            if mesh.has_deformation or (current_frame == start_frame):
+            # Only add a sample if the mesh has not been sampled yet or if it has some deformation
+            if mesh.has_deformation or (len(mesh.mesh_file_names) == 0):
                 if initial_sample:
                     mesh.add_deform_sample(export_root, current_frame)
 
-    for mesh in m_transform.child_meshes:
-        if (frame_sample_number == 1) or initial_sample:
-            for material in mesh.ms_materials:
-                for texture in material.textures:
-                    if texture.is_animated or initial_sample:
-                        texture.add_image_sample(export_root, current_frame)
-                        
-            for material in mesh.generic_materials:
-                for texture in material.textures:
-                    if texture.is_animated or initial_sample:
-                        texture.add_image_sample(export_root, current_frame) 
-
     for light in m_transform.child_lights:
         if light.color.__class__.__name__ == 'MFile':
             if light.color.is_animated or initial_sample:
@@ -357,15 +654,98 @@ def add_scene_sample(m_transform, transform_blur, deform_blur, camera_blur, curr
 
     for camera in m_transform.child_cameras:
         if camera_blur or initial_sample or (frame_sample_number == 1):
-            camera.add_matrix_sample()
+            camera.add_matrix_sample(current_frame)
         if frame_sample_number == 1:
-            camera.add_focal_distance_sample()
-            camera.add_focal_length_sample()
+            camera.add_focal_distance_sample(current_frame)
+            camera.add_focal_length_sample(current_frame)
 
     for transform in m_transform.child_transforms:
         add_scene_sample(transform, transform_blur, deform_blur, camera_blur, current_frame, start_frame, frame_sample_number, initial_sample, export_root)
 
 
+#--------------------------------------------------------------------------------------------------
+# add_material_samples function.
+#--------------------------------------------------------------------------------------------------
+
+def add_material_samples(material_registry, current_frame, export_root):
+
+    """ Adds an image sample to the textures of every registered material, textures shared through a shading network are sampled once """
+
+    sampled_textures = set()
+    for material in material_registry.itervalues():
+        for texture in material.textures:
+            if (texture is not None) and (id(texture) not in sampled_textures):
+                sampled_textures.add(id(texture))
+                texture.add_image_sample(export_root, current_frame)
+
+
+#--------------------------------------------------------------------------------------------------
+# clear_material_samples function.
+#--------------------------------------------------------------------------------------------------
+
+def clear_material_samples(material_registry):
+
+    """ Removes the image samples of the textures of every registered material """
+
+    for material in material_registry.itervalues():
+        for texture in material.textures:
+            if texture is not None:
+                texture.clear_samples()
+
+
+#--------------------------------------------------------------------------------------------------
+# clear_scene_samples function.
+#--------------------------------------------------------------------------------------------------
+
+def clear_scene_samples(m_transform):
+
+    """ Removes the samples of a transform and its descendents so another frame range can be sampled, samples that don't change over time are kept """
+
+    m_transform.clear_samples()
+
+    for mesh in m_transform.child_meshes:
+        mesh.clear_samples()
+
+    for light in m_transform.child_lights:
+        if light.color.__class__.__name__ == 'MFile':
+            light.color.clear_samples()
+
+    for camera in m_transform.child_cameras:
+        camera.clear_samples()
+
+    for transform in m_transform.child_transforms:
+        clear_scene_samples(transform)
+
+
+#--------------------------------------------------------------------------------------------------
+# scene_requires_time_change function.
+#--------------------------------------------------------------------------------------------------
+
+def scene_requires_time_change(m_transform):
+
+    """ Returns True if anything below the transform has to be sampled from the evaluated scene rather than with getAttr(time=...) """
+
+    for mesh in m_transform.child_meshes:
+        if mesh.has_deformation:
+            return True
+
+        for material in mesh.ms_materials + mesh.generic_materials:
+            for texture in material.textures:
+                if (texture is not None) and (texture.node_type != 'file'):
+                    return True
+
+    for light in m_transform.child_lights:
+        if light.color.__class__.__name__ == 'MFile':
+            if light.color.node_type != 'file':
+                return True
+
+    for transform in m_transform.child_transforms:
+        if scene_requires_time_change(transform):
+            return True
+
+    return False
+
+
 #--------------------------------------------------------------------------------------------------
 # m_file_from_color_connection function.
 #--------------------------------------------------------------------------------------------------
@@ -381,14 +761,39 @@ def m_file_from_color_connection(params, m_color_connection):
     return None
 
 
+#--------------------------------------------------------------------------------------------------
+# get_m_material function.
+#--------------------------------------------------------------------------------------------------
+
+def get_m_material(params, material_name):
+
+    """ Returns the MMsMaterial or MGenericMaterial of a Maya material, each material is only read once per export """
+
+    material = params['material_registry'].get(material_name)
+
+    if material is None:
+        if params['connection_index'].get_node_type(material_name) == 'ms_appleseed_material':
+            material = MMsMaterial(params, material_name)
+        else:
+            material = MGenericMaterial(params, material_name)
+        params['material_registry'][material_name] = material
+
+    return material
+
+
 #--------------------------------------------------------------------------------------------------
 # MTransform class.
 #--------------------------------------------------------------------------------------------------
 
-class MTransform():
+class MTransform(object):
 
     """ Lightweight class representing info for a Maya transform node """
 
+    __slots__ = ('assembly_matrices', 'child_cameras', 'child_lights', 'child_meshes',
+                 'child_ms_appleseed_scene_instances', 'child_ms_appleseed_scenes', 'child_transforms',
+                 'has_children', 'is_animated', 'matrices', 'name', 'params', 'parent', 'safe_name',
+                 'visibility_states', 'world_matrices')
+
     def __init__(self, params, maya_transform_name, parent):
         self.params = params
         self.name = maya_transform_name
@@ -406,8 +811,10 @@ class MTransform():
         self.has_children = False
 
         # sample attributes
-        self.matrices = []
-        self.visibility_states = []
+        self.matrices = ms_commands.MatrixSamples()
+        self.assembly_matrices = ms_commands.MatrixSamples()
+        self.world_matrices = ms_commands.MatrixSamples()
+        self.visibility_states = array.array('B')
 
         #check for incoming connections to transform attributes and set the is_animated var
         self.is_animated = False
@@ -416,50 +823,51 @@ class MTransform():
                                          'scale','scaleX','scaleY','scaleZ', 'visibility']
 
         for attribute in maya_transform_attribute_list:
-            if cmds.listConnections(self.name + '.' + attribute) is not None:
+            if params['connection_index'].has_connections(self.name + '.' + attribute):
                 self.is_animated = True
                 break
 
-        # get children
-        mesh_names = cmds.listRelatives(self.name, type='mesh', fullPath=True)
-        if mesh_names is not None:
+        # get children from the DAG hierarchy cached in get_maya_scene
+        children = {'mesh': [], 'light': [], 'camera': [], 'ms_appleseed_scene': [], 'transform': []}
+        for child_name, kind, node_type in params['dag_hierarchy'].get(self.name, []):
+            if kind is not None:
+                children[kind].append((child_name, node_type))
+
+        for mesh_name, node_type in children['mesh']:
             self.has_children = True
-            for mesh_name in mesh_names:
-                if ms_commands.mesh_is_renderable(mesh_name):
-                    self.child_meshes.append(MMesh(params, mesh_name, self))
+            if ms_commands.mesh_is_renderable(mesh_name, params['attribute_snapshot']):
+                self.child_meshes.append(MMesh(params, mesh_name, self))
 
-        light_names = cmds.listRelatives(self.name, type='light', fullPath=True)
-        if light_names is not None:
+        for light_name, node_type in children['light']:
             self.has_children = True
-            for light_name in light_names:
-                if cmds.nodeType(light_name) == 'pointLight' or cmds.nodeType(light_name) == 'spotLight' or cmds.nodeType(light_name) == 'areaLight':
-                    self.child_lights.append(MLight(params, light_name, self))
+            if node_type == 'pointLight' or node_type == 'spotLight' or node_type == 'areaLight':
+                self.child_lights.append(MLight(params, light_name, self))
 
-        camera_names = cmds.listRelatives(self.name, type='camera', fullPath=True)
-        if camera_names is not None:
+        for camera_name, node_type in children['camera']:
             self.has_children = True
-            for camera_name in camera_names:
-                self.child_cameras.append(MCamera(params, camera_name, self))
+            self.child_cameras.append(MCamera(params, camera_name, self))
 
-        ms_appleseed_scene_names = cmds.listRelatives(self.name, type='ms_appleseed_scene', fullPath=True)
-        if ms_appleseed_scene_names is not None:
+        for ms_appleseed_scene_name, node_type in children['ms_appleseed_scene']:
             self.has_children = True
-            for ms_appleseed_scene_name in ms_appleseed_scene_names:
-                self.child_ms_appleseed_scenes.append(MMsAppleseedScene(params, ms_appleseed_scene_name, self))
+            self.child_ms_appleseed_scenes.append(MMsAppleseedScene(params, ms_appleseed_scene_name, self))
 
-        transform_names = cmds.listRelatives(self.name, type='transform', fullPath=True)
-        if transform_names is not None:
+        for transform_name, node_type in children['transform']:
             self.has_children = True
-            for transform_name in transform_names:
-                if ms_commands.transform_is_renderable(transform_name):
-                    if ms_commands.transform_is_visible(transform_name):
-                        self.child_transforms.append(MTransform(params, transform_name, self))
+            if ms_commands.transform_is_renderable(transform_name, params['attribute_snapshot']):
+                if ms_commands.transform_is_visible(transform_name, params['attribute_snapshot']):
+                    self.child_transforms.append(MTransform(params, transform_name, self))
+
+    def add_transform_sample(self, time):
+        self.matrices.append(cmds.getAttr(self.name + '.matrix', time=time))
 
-    def add_transform_sample(self):
-        self.matrices.append(cmds.xform(self.name, query=True, matrix=True))
+    def add_visibility_sample(self, time):
+        self.visibility_states.append(cmds.getAttr(self.name + '.visibility', time=time))
 
-    def add_visibility_sample(self):
-        self.visibility_states.append(cmds.getAttr(self.name + '.visibility'))
+    def clear_samples(self):
+        self.matrices = ms_commands.MatrixSamples()
+        self.assembly_matrices = ms_commands.MatrixSamples()
+        self.world_matrices = ms_commands.MatrixSamples()
+        self.visibility_states = array.array('B')
 
 
 #--------------------------------------------------------------------------------------------------
@@ -483,10 +891,12 @@ def get_ms_appleseed_scene_from_heirarchy(ms_appleseed_scene_name, transform):
 # MTransformChild class.
 #--------------------------------------------------------------------------------------------------
 
-class MTransformChild():
+class MTransformChild(object):
 
     """ Base class for all classes representing Maya scene entities """
 
+    __slots__ = ('export_modifiers', 'id', 'name', 'params', 'safe_name', 'safe_short_name', 'short_name', 'transform')
+
     current_id = 0
 
     def __init__(self, params, maya_entity_name, MTransform_object):
@@ -507,11 +917,7 @@ class MTransformChild():
 
         self.transform = MTransform_object
 
-        self.export_modifiers = {}
-
-        for attribute in ms_commands.LIGHT_EXPORT_MODIFIERS:
-            if cmds.attributeQuery(attribute[0], n=self.name, ex=True):
-                self.export_modifiers[attribute[0]] = cmds.getAttr('{0}.{1}'.format(self.name, attribute[0]))
+        self.export_modifiers = params['attribute_snapshot'].read(self.name, [attribute[0] for attribute in ms_commands.LIGHT_EXPORT_MODIFIERS])
 
 
 #--------------------------------------------------------------------------------------------------
@@ -522,9 +928,15 @@ class MMesh(MTransformChild):
 
     """ Lightweight class representing Maya mesh data """
 
+    __slots__ = ('generic_materials', 'has_deformation', 'local_bounds', 'mesh_file_names', 'ms_materials', 'shape_key')
+
     # because fill path names of geo can be too long for a file name we use the short name plus a counter
     object_counter = 1
     export_queue = []
+    exported_files = set()
+
+    # samples of a shape at a given time, shared by all the dag paths of an instanced shape
+    shape_samples = dict()
 
     def __init__(self, params, maya_mesh_name, MTransform_object):
         MTransformChild.__init__(self, params, maya_mesh_name, MTransform_object)
@@ -534,49 +946,87 @@ class MMesh(MTransformChild):
         MMesh.object_counter += 1
 
         self.mesh_file_names = []
+        self.local_bounds = []
         self.ms_materials = []
         self.generic_materials = []
         self.has_deformation = False
+        self.shape_key = ms_commands.get_node_key(self.name)
 
-        if cmds.listConnections(self.name + '.inMesh') is not None:
+        if params['connection_index'].has_connections(self.name + '.inMesh'):
             ms_commands.info("{0} has deformation.".format(self.name))
             self.has_deformation = True
 
-        attached_material_names = ms_commands.get_attached_materials(self.name)
+        attached_material_names = ms_commands.get_attached_materials(self.name, params['connection_index'])
 
         if attached_material_names is not None:
             for material_name in attached_material_names:
-                if cmds.nodeType(material_name) == 'ms_appleseed_material':
-                    self.ms_materials.append(MMsMaterial(self.params, material_name))
+                material = get_m_material(params, material_name)
+                if material.__class__.__name__ == 'MMsMaterial':
+                    self.ms_materials.append(material)
                 else:
-                    self.generic_materials.append(MGenericMaterial(self.params, material_name))
+                    self.generic_materials.append(material)
 
     def add_deform_sample(self, export_root, time):
         # if the shape current transform is visible, export;
         # otherwise skip export and just append a null
-        if ms_commands.visible_in_hierarchy(self.transform.name):
-            file_name = '%s_%i_%i.obj' % (self.safe_short_name, self.id, time)
-            output_file_path = os.path.join(ms_commands.GEO_DIR, file_name)
+        if ms_commands.visible_in_hierarchy(self.transform.name, time):
+            # an instanced shape is only read from Maya once per time, whichever path reaches it first
+            shape_sample = MMesh.shape_samples.get((self.shape_key, time))
+            if shape_sample is None:
+                shape_sample = self.read_shape_sample(export_root)
+                MMesh.shape_samples[(self.shape_key, time)] = shape_sample
 
             # set file path as relative value
-            self.mesh_file_names.append(output_file_path)
+            self.mesh_file_names.append(shape_sample[0])
 
-            # export mesh using absolute file path
-            absolute_file_path = os.path.join(export_root, output_file_path)
-            if not os.path.exists(absolute_file_path) or self.params['overwrite_existing_geometry']:
-                MMesh.export_queue.append([self.name, absolute_file_path])
+            # object space bounds are kept with each sample so the scene bounding box can be computed without querying Maya
+            self.local_bounds.append(shape_sample[1])
         else:
             self.mesh_file_names.append(None)
+            self.local_bounds.append(None)
+
+    def read_shape_sample(self, export_root):
+        # geometry files are named after a hash of their contents so identical meshes share a file
+        mesh_data = ms_export_obj.get_mesh_data(self.name)
+        file_name = '%s.%s' % (mesh_data.get_hash(), self.params['geometry_extension'])
+        output_file_path = ms_commands.intern_string(os.path.join(ms_commands.GEO_DIR, file_name))
+
+        local_bounds = cmds.getAttr(self.name + '.boundingBoxMin')[0] + cmds.getAttr(self.name + '.boundingBoxMax')[0]
+
+        # export mesh using absolute file path, each file is only written once per export
+        absolute_file_path = os.path.join(export_root, output_file_path)
+        if absolute_file_path not in MMesh.exported_files:
+            MMesh.exported_files.add(absolute_file_path)
+            if not os.path.exists(absolute_file_path) or self.params['overwrite_existing_geometry']:
+                MMesh.export_queue.append([self.name, absolute_file_path, mesh_data])
+
+        return output_file_path, local_bounds
+
+    def clear_samples(self):
+        # meshes without deformation keep the sample of the first frame
+        if self.has_deformation:
+            self.mesh_file_names = []
+            self.local_bounds = []
 
     @classmethod
-    def export_geo(cls_obj, exporter, frame_no):
+    def export_geo(cls_obj, exporter, frame_no, writer_pool=None):
         queue_len = len(cls_obj.export_queue)
         if queue_len > 0:
-            cmds.progressWindow(e=True, status='Exporting geo for frame {0}'.format(frame_no), progress=0, max=queue_len)
-            cmds.refresh(cv=True)
-            for i, geo in enumerate(cls_obj.export_queue):
-                cmds.progressWindow(e=True, progress=i)            
-                exporter(geo[0], geo[1], overwrite=True)
+            ms_commands.progress_window(e=True, status='Exporting geo for frame {0}'.format(frame_no), progress=0, max=queue_len)
+            ms_commands.refresh()
+
+            if writer_pool is None:
+                for i, geo in enumerate(cls_obj.export_queue):
+                    ms_commands.progress_window(e=True, progress=i)            
+                    exporter(geo[0], geo[1], overwrite=True)
+            else:
+                # the mesh data was extracted on the main thread when the sample was added, hand the largest meshes
+                # to the writer threads first so they don't end up being the last files being written
+                export_queue = sorted(cls_obj.export_queue, key=lambda geo: len(geo[2].face_vertices), reverse=True)
+                for i, geo in enumerate(export_queue):
+                    ms_commands.progress_window(e=True, progress=i)
+                    writer_pool.submit(exporter, geo[0], geo[1], overwrite=True, mesh_data=geo[2])
+
             cls_obj.export_queue = []
 
 
@@ -588,17 +1038,20 @@ class MLight(MTransformChild):
 
     """ Lightweight class representing Maya light data """
 
+    __slots__ = ('color', 'decay', 'inner_angle', 'model', 'multiplier', 'outer_angle')
+
     def __init__(self, params, maya_light_name, MTransform_object):
         MTransformChild.__init__(self, params, maya_light_name, MTransform_object)
         self.color = MColorConnection(self.params, self.name + '.color')
         if self.color.connected_node is not None:
             self.color = MFile(self.params, self.color.connected_node)
-        self.multiplier = cmds.getAttr(self.name+'.intensity')
-        self.decay = cmds.getAttr(self.name+'.decayRate')
+        attributes = self.params['attribute_snapshot'].read(self.name, ['intensity', 'decayRate', 'coneAngle', 'penumbraAngle'])
+        self.multiplier = attributes['intensity']
+        self.decay = attributes['decayRate']
         self.model = cmds.nodeType(self.name)
         if self.model == 'spotLight':
-            self.inner_angle = cmds.getAttr(self.name + '.coneAngle')
-            self.outer_angle = cmds.getAttr(self.name + '.coneAngle') +  (2 * cmds.getAttr(self.name + '.penumbraAngle'))
+            self.inner_angle = attributes['coneAngle']
+            self.outer_angle = attributes['coneAngle'] +  (2 * attributes['penumbraAngle'])
 
 
 #--------------------------------------------------------------------------------------------------
@@ -609,6 +1062,9 @@ class MCamera(MTransformChild):
 
     """ Lightweight class representing Maya camera data """
 
+    __slots__ = ('dof', 'f_stop', 'film_height', 'film_width', 'focal_distance_values', 'focal_length_values',
+                 'focus_region_scale', 'world_space_matrices')
+
     def __init__(self, params, maya_camera_name, MTransform_object):
         MTransformChild.__init__(self, params, maya_camera_name, MTransform_object)
 
@@ -616,32 +1072,39 @@ class MCamera(MTransformChild):
         # of the main assembly. For this reason we include the world space matrix as an attribute of the camera's
         # transform even though it's not a 'correct' representation of the Maya scene.
 
-        self.world_space_matrices = []
-        self.dof = cmds.getAttr(self.name + '.depthOfField')
-        self.focal_distance_values = []
-        self.focal_length_values = []
-        self.focus_region_scale = cmds.getAttr(self.name + '.focusRegionScale')
-        self.f_stop = self.focus_region_scale * cmds.getAttr(self.name + '.fStop')
+        attributes = self.params['attribute_snapshot'].read(self.name, ['depthOfField', 'focusRegionScale', 'fStop', 'horizontalFilmAperture', 'verticalFilmAperture'])
+
+        self.world_space_matrices = ms_commands.MatrixSamples()
+        self.dof = attributes['depthOfField']
+        self.focal_distance_values = array.array('d')
+        self.focal_length_values = array.array('d')
+        self.focus_region_scale = attributes['focusRegionScale']
+        self.f_stop = self.focus_region_scale * attributes['fStop']
 
         maya_resolution_aspect = float(self.params['output_res_width']) / float(self.params['output_res_height'])
-        maya_film_aspect = cmds.getAttr(self.name + '.horizontalFilmAperture') / cmds.getAttr(self.name + '.verticalFilmAperture')
+        maya_film_aspect = attributes['horizontalFilmAperture'] / attributes['verticalFilmAperture']
 
         if maya_resolution_aspect > maya_film_aspect:
-            self.film_width = float(cmds.getAttr(self.name + '.horizontalFilmAperture')) * ms_commands.INCH_TO_METER * 100
+            self.film_width = float(attributes['horizontalFilmAperture']) * ms_commands.INCH_TO_METER * 100
             self.film_height = self.film_width / maya_resolution_aspect
         else:
-            self.film_height = float(cmds.getAttr(self.name + '.verticalFilmAperture')) * ms_commands.INCH_TO_METER * 100
+            self.film_height = float(attributes['verticalFilmAperture']) * ms_commands.INCH_TO_METER * 100
             self.film_width = self.film_height * maya_resolution_aspect
 
-    def add_matrix_sample(self):
-        world_space_matrix = cmds.xform(self.transform.name, query=True, matrix=True, ws=True)
+    def add_matrix_sample(self, time):
+        world_space_matrix = cmds.getAttr(self.transform.name + '.worldMatrix[0]', time=time)
         self.world_space_matrices.append(ms_commands.matrix_remove_scale(world_space_matrix))
 
-    def add_focal_distance_sample(self):
-        self.focal_distance_values.append(cmds.getAttr(self.name + '.focusDistance'))
+    def add_focal_distance_sample(self, time):
+        self.focal_distance_values.append(cmds.getAttr(self.name + '.focusDistance', time=time))
 
-    def add_focal_length_sample(self):
-        self.focal_length_values.append(float(cmds.getAttr(self.name + '.focalLength')) / 10)
+    def add_focal_length_sample(self, time):
+        self.focal_length_values.append(float(cmds.getAttr(self.name + '.focalLength', time=time)) / 10)
+
+    def clear_samples(self):
+        self.world_space_matrices = ms_commands.MatrixSamples()
+        self.focal_distance_values = array.array('d')
+        self.focal_length_values = array.array('d')
 
 
 #--------------------------------------------------------------------------------------------------
@@ -652,10 +1115,12 @@ class MMsAppleseedScene(MTransformChild):
 
     """ Lightweight class representing Maya ms_appleseed_scene nodes """
 
+    __slots__ = ('scene_filepath',)
+
     def __init__(self, params, ms_appleseed_scene_node_name, MTransform_object):
         MTransformChild.__init__(self, params, ms_appleseed_scene_node_name, MTransform_object)
 
-        self.scene_filepath = cmds.getAttr(self.name + '.appleseed_file')
+        self.scene_filepath = params['attribute_snapshot'].get(self.name, 'appleseed_file')
 
 
 #--------------------------------------------------------------------------------------------------
@@ -666,6 +1131,8 @@ class MMsAppleseedSceneInstance(MTransformChild):
 
     """ Lightweight class representing an instance of a Maya ms_appleseed_scene node """
 
+    __slots__ = ('original',)
+
     def __init__(self, params, ms_appleseed_scene_node_name, MTransform_object, original):
         MTransformChild.__init__(self, params, ms_appleseed_scene_node_name, MTransform_object)
 
@@ -676,34 +1143,39 @@ class MMsAppleseedSceneInstance(MTransformChild):
 # MFile class.
 #--------------------------------------------------------------------------------------------------
 
-class MFile():
+class MFile(object):
 
     """ Lightweight class representing Maya file nodes """
 
+    __slots__ = ('alpha_is_luminance', 'attribute', 'autodetect_alpha', 'converted_images', 'filtering_mode',
+                 'has_uv_placement', 'image_file_names', 'image_name', 'is_animated', 'name', 'node_type', 'params',
+                 'repeat_u', 'repeat_v', 'safe_name', 'source_node')
+
     export_queue = set()
 
     def __init__(self, params, maya_file_node, source_node=False, attribute=False):
         self.params = params
         self.image_file_names = []
         self.converted_images = set()
-        self.node_type = cmds.nodeType(maya_file_node)
+        self.node_type = params['connection_index'].get_node_type(maya_file_node)
         self.autodetect_alpha = params['autodetect_alpha']        
 
         if self.node_type == 'file':
             self.name = maya_file_node
             self.safe_name = ms_commands.legalize_name(self.name)
-            self.image_name = cmds.getAttr(self.name + '.fileTextureName')
-            self.is_animated = cmds.getAttr(self.name + '.useFrameExtension')
-            self.alpha_is_luminance = cmds.getAttr(self.name + '.alphaIsLuminance')
+            attributes = params['attribute_snapshot'].read(self.name, ['fileTextureName', 'useFrameExtension', 'alphaIsLuminance'])
+            self.image_name = attributes['fileTextureName']
+            self.is_animated = attributes['useFrameExtension']
+            self.alpha_is_luminance = attributes['alphaIsLuminance']
             self.filtering_mode = cmds.getAttr((self.name + '.filterType'), asString=True)
 
             # Off, Mipmap, Box, Quadratic, Quartic, Gaussian 
 
-            texture_placement_node = ms_commands.get_connected_node(self.name + '.uvCoord')
+            texture_placement_node = ms_commands.get_connected_node(self.name + '.uvCoord', params['connection_index'])
             if texture_placement_node is not None:
                 self.has_uv_placement = True
-                self.repeat_u = cmds.getAttr(texture_placement_node + '.repeatU')
-                self.repeat_v = cmds.getAttr(texture_placement_node + '.repeatV')
+                self.repeat_u = params['attribute_snapshot'].get(texture_placement_node, 'repeatU')
+                self.repeat_v = params['attribute_snapshot'].get(texture_placement_node, 'repeatV')
             else:
                 self.has_uv_placement = False
 
@@ -721,29 +1193,45 @@ class MFile():
         if self.node_type == 'file':
             image_name = ms_commands.get_file_texture_name(self.name, time)
         else:
-            image_name = ms_commands.convert_connection_to_image(self.source_node, self.attribute, os.path.join(export_root, ms_commands.TEXTURE_DIR, ('{0}_{1}.iff'.format(self.name, time))), self.params['overwrite_existing_textures'])
+            # baked images are named after a hash of the upstream shading network, an existing image with the same
+            # hash was baked from an identical network so it is reused, any change to the network bakes a new image
+            network_hash = ms_commands.get_shading_network_hash(self.source_node, self.attribute, time)
+            image_name = ms_commands.convert_connection_to_image(self.source_node, self.attribute, os.path.join(export_root, ms_commands.TEXTURE_DIR, ('{0}_{1}.iff'.format(self.name, network_hash))), False)
 
         if self.params['convert_textures_to_exr']:
+            # each image only needs to be queued for conversion once per export
             if image_name not in self.converted_images:
+                self.converted_images.add(image_name)
                 MFile.export_queue.add(image_name)
-                file_name = os.path.join(ms_commands.TEXTURE_DIR, os.path.split(image_name)[1])
-                self.image_file_names.append(os.path.splitext(file_name)[0] + '.exr')
+            file_name = os.path.join(ms_commands.TEXTURE_DIR, os.path.split(image_name)[1])
+            self.image_file_names.append(ms_commands.intern_string(os.path.splitext(file_name)[0] + '.exr'))
         else:
-            self.image_file_names.append(image_name)
+            self.image_file_names.append(ms_commands.intern_string(image_name))
+
+    def clear_samples(self):
+        self.image_file_names = []
 
     @classmethod
-    def export_images(cls_obj, export_root, overwrite, frame_no):
+    def export_images(cls_obj, export_root, overwrite, frame_no, process_count=0, cache=None):
         queue_len = len(cls_obj.export_queue)
         if queue_len > 0:
-            cmds.progressWindow(e=True, status='Exporting textures for frame {0}'.format(frame_no), progress=0, max=queue_len)
-            cmds.refresh(cv=True)
-            for i, tex in enumerate(cls_obj.export_queue):
-                cmds.progressWindow(e=True, progress=i)  
+            ms_commands.progress_window(e=True, status='Exporting textures for frame {0}'.format(frame_no), progress=0, max=queue_len)
+            ms_commands.refresh()
 
+            conversions = []
+            for tex in cls_obj.export_queue:
                 dest = os.path.join(export_root, ms_commands.TEXTURE_DIR, os.path.splitext(os.path.split(tex)[1])[0] + '.exr')
+                conversions.append((tex, dest))
+
+            def update_progress(completed_count):
+                ms_commands.progress_window(e=True, progress=completed_count)
 
-                ms_commands.convert_texture_to_exr(tex, dest , overwrite=overwrite)
+            failed_conversions = ms_commands.convert_textures_to_exr(conversions, overwrite, process_count, update_progress, cache)
+            if failed_conversions:
+                ms_commands.warning('{0} texture(s) could not be converted to OpenEXR.'.format(len(failed_conversions)))
 
+            if cache is not None:
+                cache.save()
 
             cls_obj.export_queue = set()
 
@@ -752,16 +1240,21 @@ class MFile():
 # MMsEnvironment class.
 #--------------------------------------------------------------------------------------------------
 
-class MMsEnvironment():
+class MMsEnvironment(object):
 
     """ Lightweight class representing Maya ms_environment nodes """
 
+    __slots__ = ('constant_exitance', 'exitance_multiplier', 'gradient_horizon_exitance', 'gradient_zenith_exitance',
+                 'latitude_longitude_exitance', 'mirrorball_exitance', 'model', 'name', 'params', 'safe_name')
+
     def __init__(self, params, maya_ms_environment_node):
         self.params = params
         self.name = maya_ms_environment_node
         self.safe_name = ms_commands.legalize_name(self.name)
 
-        self.model = cmds.getAttr(self.name + '.model')
+        attributes = params['attribute_snapshot'].read(self.name, ['model', 'exitance_multiplier'])
+
+        self.model = attributes['model']
 
         # ********** key *************
         # Constant Environment = 0
@@ -785,7 +1278,7 @@ class MMsEnvironment():
         self.latitude_longitude_exitance = self.get_connections(self.name + '.latitude_longitude_exitance')
         self.mirrorball_exitance = self.get_connections(self.name + '.mirror_ball_exitance')
 
-        self.exitance_multiplier = cmds.getAttr(self.name + '.exitance_multiplier')
+        self.exitance_multiplier = attributes['exitance_multiplier']
 
     def get_connections(self, attr_name):
         connection = MColorConnection(self.params, attr_name)
@@ -804,16 +1297,32 @@ class MMsEnvironment():
 # MMsPhysicalEnvironment class.
 #--------------------------------------------------------------------------------------------------
 
-class MMsPhysicalEnvironment():
+class MMsPhysicalEnvironment(object):
 
     """ Lightweight class representing Maya ms_physical_environment nodes """
 
+    __slots__ = ('create_physical_sun', 'ground_albedo', 'horizon_shift', 'luminance_gamma', 'luminance_multiplier',
+                 'model', 'name', 'params', 'physical_sun_multiplier', 'safe_name', 'saturation_multiplier',
+                 'sun_phi', 'sun_theta', 'turbidity', 'turbidity_multiplier')
+
     def __init__(self, params, maya_ms_environment_node):
         self.params = params
         self.name = maya_ms_environment_node
         self.safe_name = ms_commands.legalize_name(self.name)
 
-        self.model = cmds.getAttr(self.name + '.model')
+        attributes = params['attribute_snapshot'].read(self.name, ['model',
+                                                                   'ground_albedo',
+                                                                   'horizon_shift',
+                                                                   'luminance_multiplier',
+                                                                   'saturation_multiplier',
+                                                                   'luminance_gamma',
+                                                                   'sun_phi',
+                                                                   'sun_theta',
+                                                                   'turbidity_multiplier',
+                                                                   'create_physical_sun',
+                                                                   'physical_sun_multiplier'])
+
+        self.model = attributes['model']
 
         # ********** key *************
         # hosek_environment_edf    = 0
@@ -824,17 +1333,17 @@ class MMsPhysicalEnvironment():
         elif self.model == 1:
             self.model = "preetham_environment_edf"
 
-        self.ground_albedo           = cmds.getAttr(self.name + '.ground_albedo')
-        self.horizon_shift           = cmds.getAttr(self.name + '.horizon_shift')
-        self.luminance_multiplier    = cmds.getAttr(self.name + '.luminance_multiplier')
-        self.saturation_multiplier   = cmds.getAttr(self.name + '.saturation_multiplier')
-        self.luminance_gamma         = cmds.getAttr(self.name + '.luminance_gamma')
-        self.sun_phi                 = cmds.getAttr(self.name + '.sun_phi')
-        self.sun_theta               = cmds.getAttr(self.name + '.sun_theta')
+        self.ground_albedo           = attributes['ground_albedo']
+        self.horizon_shift           = attributes['horizon_shift']
+        self.luminance_multiplier    = attributes['luminance_multiplier']
+        self.saturation_multiplier   = attributes['saturation_multiplier']
+        self.luminance_gamma         = attributes['luminance_gamma']
+        self.sun_phi                 = attributes['sun_phi']
+        self.sun_theta               = attributes['sun_theta']
         self.turbidity               = self.get_connections(self.name + '.turbidity')
-        self.turbidity_multiplier    = cmds.getAttr(self.name + '.turbidity_multiplier')
-        self.create_physical_sun     = cmds.getAttr(self.name + '.create_physical_sun') 
-        self.physical_sun_multiplier = cmds.getAttr(self.name + '.physical_sun_multiplier')
+        self.turbidity_multiplier    = attributes['turbidity_multiplier']
+        self.create_physical_sun     = attributes['create_physical_sun']
+        self.physical_sun_multiplier = attributes['physical_sun_multiplier']
 
     def get_connections(self, attr_name):
         connection = MColorConnection(self.params, attr_name)
@@ -853,14 +1362,18 @@ class MMsPhysicalEnvironment():
 # MColorConnection class.
 #--------------------------------------------------------------------------------------------------
 
-class MColorConnection():
+class MColorConnection(object):
 
         """ Lightweight class representing Maya color connections, although these are not Maya nodes we define an M class for ease of use"""
 
+        __slots__ = ('color_value', 'connected_node', 'connected_node_type', 'is_black', 'is_grey', 'multiplier',
+                     'name', 'normalized_color', 'safe_name')
+
         def __init__(self, params, color_connection):
             self.name = color_connection
             self.safe_name = ms_commands.legalize_name(self.name)
-            self.color_value = cmds.getAttr(self.name)
+            node_name, attribute_name = self.name.split('.', 1)
+            self.color_value = params['attribute_snapshot'].get(node_name, attribute_name)
 
             if self.color_value.__class__.__name__ == 'float':
                 self.color_value = (self.color_value, self.color_value, self.color_value)
@@ -871,7 +1384,7 @@ class MColorConnection():
             self.multiplier = ms_commands.normalizeRGB(self.color_value)[3]
 
             self.is_black = self.normalized_color == (0,0,0)
-            self.connected_node = ms_commands.get_connected_node(self.name)
+            self.connected_node = ms_commands.get_connected_node(self.name, params['connection_index'])
 
             if (self.normalized_color[0] == self.normalized_color[1]) and (self.normalized_color[0] == self.normalized_color[2]):
                 self.is_grey = True
@@ -879,17 +1392,22 @@ class MColorConnection():
                 self.is_grey = False
 
             if self.connected_node is not None:
-                self.connected_node_type = cmds.nodeType(self.connected_node)
+                self.connected_node_type = params['connection_index'].get_node_type(self.connected_node)
 
 
 #--------------------------------------------------------------------------------------------------
 # MMsMaterial class.
 #--------------------------------------------------------------------------------------------------
 
-class MMsMaterial():
+class MMsMaterial(object):
 
     """ Lightweight class representing Maya material nodes """
 
+    __slots__ = ('alpha_map', 'bsdf_back', 'bsdf_front', 'bump_amplitude', 'colors', 'displacement_map_back',
+                 'displacement_map_front', 'displacement_mode', 'duplicate_shaders', 'edf_back', 'edf_front',
+                 'enable_back', 'enable_front', 'name', 'normal_map_up', 'params', 'safe_name', 'shading_nodes',
+                 'surface_shader_back', 'surface_shader_front', 'textures')
+
     def __init__(self, params, maya_ms_material_name):
         self.params = params
         self.name = maya_ms_material_name
@@ -899,19 +1417,26 @@ class MMsMaterial():
         self.colors = []
         self.textures = []
 
-        self.duplicate_shaders = cmds.getAttr(self.name + '.duplicate_front_attributes_on_back')
+        attributes = params['attribute_snapshot'].read(self.name, ['duplicate_front_attributes_on_back',
+                                                                   'enable_front_material',
+                                                                   'enable_back_material',
+                                                                   'displacement_mode',
+                                                                   'bump_amplitude',
+                                                                   'normal_map_up'])
+
+        self.duplicate_shaders = attributes['duplicate_front_attributes_on_back']
 
-        self.enable_front = cmds.getAttr(self.name + '.enable_front_material')
-        self.enable_back = cmds.getAttr(self.name + '.enable_back_material')
+        self.enable_front = attributes['enable_front_material']
+        self.enable_back = attributes['enable_back_material']
 
         self.bsdf_front = self.get_connections(self.name + '.BSDF_front_color')
         self.edf_front = self.get_connections(self.name + '.EDF_front_color')
         self.surface_shader_front = self.get_connections(self.name + '.surface_shader_front_color')
         self.displacement_map_front = self.get_connections(self.name + '.displacement_map_front_color')
         self.alpha_map = self.get_connections(self.name + '.alpha_map_color')
-        self.displacement_mode = cmds.getAttr(self.name + '.displacement_mode')
-        self.bump_amplitude = cmds.getAttr(self.name + '.bump_amplitude')
-        self.normal_map_up = cmds.getAttr(self.name + '.normal_map_up')
+        self.displacement_mode = attributes['displacement_mode']
+        self.bump_amplitude = attributes['bump_amplitude']
+        self.normal_map_up = attributes['normal_map_up']
 
         # only use front shaders on back if box is checked
         if not self.duplicate_shaders:
@@ -920,13 +1445,6 @@ class MMsMaterial():
             self.surface_shader_back = self.get_connections(self.name + '.surface_shader_back_color')
             self.displacement_map_back = self.get_connections(self.name + '.displacement_map_back_color')
 
-            self.shading_nodes += [self.bsdf_front,
-                                   self.bsdf_back,
-                                   self.edf_front,
-                                   self.edf_back,
-                                   self.surface_shader_front,
-                                   self.surface_shader_back]
-
             for texture in [self.displacement_map_front, self.displacement_map_back, self.alpha_map]:
                 if texture is not None:
                     self.textures.append(texture)
@@ -935,15 +1453,14 @@ class MMsMaterial():
         else:
             self.bsdf_back, self.edf_back, self.surface_shader_back, self.displacement_map_back = self.bsdf_front, self.edf_front, self.surface_shader_front, self.displacement_map_front
 
-            self.shading_nodes += [self.bsdf_front,
-                                   self.edf_front,
-                                   self.surface_shader_front]
-
             if self.displacement_map_front is not None:
                   self.textures.append(self.displacement_map_front)
             if self.alpha_map is not None:
                 self.textures.append(self.alpha_map)
 
+        # collect the nodes, colors and textures of all the connected shading networks in a single pass
+        self.shading_nodes, self.colors, network_textures = get_shading_network(self.shading_nodes)
+        self.textures += network_textures
 
     def get_connections(self, attr_name):
         connection = MColorConnection(self.params, attr_name)
@@ -952,10 +1469,10 @@ class MMsMaterial():
             return None
 
         if connection.connected_node_type == 'ms_appleseed_shading_node':
-            shading_node = MMsShadingNode(self.params, connection.connected_node)
-            self.shading_nodes = self.shading_nodes + [shading_node] + shading_node.child_shading_nodes
-            self.colors += shading_node.colors
-            self.textures += shading_node.textures
+            shading_node = get_m_shading_node(self.params, connection.connected_node)
+            if shading_node is None:
+                return None
+            self.shading_nodes.append(shading_node)
             return shading_node
 
         elif connection.connected_node_type == 'file':
@@ -968,15 +1485,19 @@ class MMsMaterial():
 # MGenericMaterial class.
 #--------------------------------------------------------------------------------------------------
 
-class MGenericMaterial():
+class MGenericMaterial(object):
 
     """Generic material class representing all non ms_material materials in the maya scene"""
 
+    __slots__ = ('alpha', 'bump_map', 'bump_multiplier', 'color', 'export_modifiers', 'glossiness', 'incandescence',
+                 'name', 'normal_map', 'params', 'reflectivity', 'refractive_index', 'safe_name',
+                 'secondary_surface_shader', 'textures', 'translucence', 'transparency', 'type')
+
     def __init__(self, params, maya_material_name):
         self.params = params
         self.name = maya_material_name
         self.safe_name = ms_commands.legalize_name(self.name)
-        self.type = cmds.nodeType(maya_material_name)
+        self.type = params['connection_index'].get_node_type(maya_material_name)
 
         self.color = None
         self.alpha = None # translated to material alpha
@@ -992,44 +1513,55 @@ class MGenericMaterial():
 
         self.textures = []
 
-        self.export_modifiers = {}
+        self.export_modifiers = params['attribute_snapshot'].read(self.name, [attribute[0] for attribute in ms_commands.MATERIAL_EXPORT_MODIFIERS])
 
-        for attribute in ms_commands.MATERIAL_EXPORT_MODIFIERS:
-            if cmds.attributeQuery(attribute[0], n=self.name, ex=True):
-                if attribute[0] is not 'ms_secondary_surface_shader':
-                    self.export_modifiers[attribute[0]] = cmds.getAttr('{0}.{1}'.format(self.name, attribute[0]))
-                else:
-                    attribute_connections = cmds.listConnections(self.name + '.ms_secondary_surface_shader')
-                    if attribute_connections is not None:
-                        self.export_modifiers[attribute[0]] = attribute_connections[0]
+        # the secondary surface shader is a message attribute, store the connected node rather than the value
+        if 'ms_secondary_surface_shader' in self.export_modifiers:
+            attribute_connections = params['connection_index'].get_connected_nodes(self.name + '.ms_secondary_surface_shader')
+            if attribute_connections:
+                self.export_modifiers['ms_secondary_surface_shader'] = attribute_connections[0]
+            else:
+                del self.export_modifiers['ms_secondary_surface_shader']
 
         self.secondary_surface_shader = None
 
         if 'ms_secondary_surface_shader' in self.export_modifiers:
-            if cmds.nodeType(self.export_modifiers['ms_secondary_surface_shader']) == 'ms_appleseed_shading_node':
-                if cmds.getAttr(self.export_modifiers['ms_secondary_surface_shader'] + '.node_type') is not 'surface_shader':
-                    self.secondary_surface_shader = MMsShadingNode(params, self.export_modifiers['ms_secondary_surface_shader'])
-                    self.textures += self.secondary_surface_shader.textures
+            if params['connection_index'].get_node_type(self.export_modifiers['ms_secondary_surface_shader']) == 'ms_appleseed_shading_node':
+                if params['attribute_snapshot'].get(self.export_modifiers['ms_secondary_surface_shader'], 'node_type') is not 'surface_shader':
+                    self.secondary_surface_shader = get_m_shading_node(params, self.export_modifiers['ms_secondary_surface_shader'])
+                    if self.secondary_surface_shader is not None:
+                        self.textures += get_shading_network([self.secondary_surface_shader])[2]
                 else:
                     ms_commands.warning('{0} is not a surface_shader'.format(self.export_modifiers['ms_secondary_surface_shader']))
             else:
                 ms_commands.warning('{0} is not an ms_appleseed_shading_node'.format(self.export_modifiers['ms_secondary_surface_shader']))
 
+        # read all the candidate attributes at once, only the ones that exist on this material type are returned
+        attributes = params['attribute_snapshot'].read(self.name, ['color',
+                                                                   'outColor',
+                                                                   'cosinePower',
+                                                                   'reflectivity',
+                                                                   'transparency',
+                                                                   'incandescence',
+                                                                   'normalCamera',
+                                                                   'refractiveIndex',
+                                                                   'translucence'])
+
         # work out color component
-        if cmds.attributeQuery('color', node=self.name, exists=True):
+        if 'color' in attributes:
             self.color = MColorConnection(self.params, self.name + '.color')
             if self.color.connected_node is not None:
                 self.color = m_file_from_color_connection(self.params, self.color)
                 self.textures.append(self.color)
 
-        elif cmds.attributeQuery('outColor', node=self.name, exists=True):
+        elif 'outColor' in attributes:
             self.color = MColorConnection(self.params, self.name + '.outColor')
             if self.color.connected_node is not None:
                 self.color = m_file_from_color_connection(self.params, self.color)
                 self.textures.append(self.color)
 
         # work out specular components
-        if cmds.attributeQuery('cosinePower', node=self.name, exists=True):
+        if 'cosinePower' in attributes:
             self.glossiness = MColorConnection(self.params, self.name + '.cosinePower')
             self.glossiness.multiplier = self.glossiness.multiplier * 0.01
 
@@ -1039,7 +1571,7 @@ class MGenericMaterial():
             elif self.glossiness.is_black:
                 self.glossiness = None
 
-        if cmds.attributeQuery('reflectivity', node=self.name, exists=True):
+        if 'reflectivity' in attributes:
             self.reflectivity = MColorConnection(self.params, self.name + '.reflectivity')
             if self.reflectivity.connected_node is not None:
                 self.reflectivity = m_file_from_color_connection(self.params, self.reflectivity)
@@ -1048,7 +1580,7 @@ class MGenericMaterial():
                 self.reflectivity = None
 
         # work out alpha / transparrency component
-        if cmds.attributeQuery('transparency', node=self.name, exists=True):
+        if 'transparency' in attributes:
             self.transparency = MColorConnection(self.params, self.name + '.transparency')
             if self.transparency.connected_node is not None:
                 self.transparency = m_file_from_color_connection(self.params, self.transparency)
@@ -1069,9 +1601,9 @@ class MGenericMaterial():
                 emit_light = False
 
         if emit_light:
-            if cmds.attributeQuery('incandescence', node=self.name, exists=True):
+            if 'incandescence' in attributes:
                 self.incandescence = MColorConnection(self.params, self.name + '.incandescence')
-            elif cmds.attributeQuery('outColor', node=self.name, exists=True):
+            elif 'outColor' in attributes:
                 self.incandescence = MColorConnection(self.params, self.name + '.outColor')
 
             if self.incandescence.connected_node is not None:
@@ -1081,16 +1613,17 @@ class MGenericMaterial():
                 self.incandescence = None
 
         # work out bump/normal component
-        if cmds.attributeQuery('normalCamera', node=self.name, exists=True):
-            connected_bump_node = cmds.listConnections(self.name + '.normalCamera', s=True, type='bump2d')
+        if 'normalCamera' in attributes:
+            connected_bump_node = params['connection_index'].get_connected_nodes(self.name + '.normalCamera', 'bump2d')
 
-            if connected_bump_node is not None:
+            if connected_bump_node:
                 bump_node = connected_bump_node[0]
-                bump_tex_connected_node = cmds.listConnections(bump_node + '.bumpValue', s=True, type='file')
+                bump_tex_connected_node = params['connection_index'].get_connected_nodes(bump_node + '.bumpValue', 'file')
                 
-                if bump_tex_connected_node is not None:
-                    self.bump_multiplier = cmds.getAttr(bump_node + '.bumpDepth')
-                    if cmds.getAttr(bump_node + '.bumpInterp') == 0:
+                if bump_tex_connected_node:
+                    bump_attributes = params['attribute_snapshot'].read(bump_node, ['bumpDepth', 'bumpInterp'])
+                    self.bump_multiplier = bump_attributes['bumpDepth']
+                    if bump_attributes['bumpInterp'] == 0:
                         self.bump_map = MFile(params, bump_tex_connected_node[0])
                         self.textures.append(self.bump_map)
                     else:
@@ -1098,11 +1631,11 @@ class MGenericMaterial():
                         self.textures.append(self.normal_map)
 
         # work out refractive index component
-        if cmds.attributeQuery('refractiveIndex', node=self.name, exists=True):
-            self.refractive_index = cmds.getAttr(self.name + '.refractiveIndex')
+        if 'refractiveIndex' in attributes:
+            self.refractive_index = attributes['refractiveIndex']
 
         # work out translucense component
-        if cmds.attributeQuery('translucence', node=self.name, exists=True):
+        if 'translucence' in attributes:
             self.translucence = MColorConnection(self.params, self.name + '.translucence')
             if self.translucence.connected_node is not None:
                 self.translucence = m_file_from_color_connection(self.params, self.translucence)
@@ -1114,17 +1647,25 @@ class MGenericMaterial():
 # MMsShadingNode class.
 #--------------------------------------------------------------------------------------------------
 
-class MMsShadingNode():
+class MMsShadingNode(object):
+
+    """ Lightweight class representing Maya shading nodes, child_shading_nodes and textures only hold the direct connections """
 
-    """ Lightweight class representing Maya shading nodes """
+    __slots__ = ('attributes', 'child_shading_nodes', 'colors', 'model', 'name', 'params', 'safe_name', 'textures',
+                 'type')
 
     def __init__(self, params, maya_ms_shading_node_name):
         self.params = params
         self.name = maya_ms_shading_node_name
         self.safe_name = ms_commands.legalize_name(self.name)
 
-        self.type = cmds.getAttr(self.name + '.node_type')    # diffuse_component, edf etc.
-        self.model = cmds.getAttr(self.name + '.node_model')  # lambertian etc.
+        # register the node before reading its connections so networks reaching it again share it
+        params['shading_node_registry'][self.name] = self
+        params['shading_nodes_in_progress'].add(self.name)
+
+        attributes = params['attribute_snapshot'].read(self.name, ['node_type', 'node_model'])
+        self.type = attributes['node_type']    # diffuse_component, edf etc.
+        self.model = attributes['node_model']  # lambertian etc.
 
         self.child_shading_nodes = []
         self.attributes = dict()
@@ -1135,6 +1676,9 @@ class MMsShadingNode():
         for attribute_key in params['entity_defs'][self.model].attributes.keys():
             self.attributes[attribute_key] = ''
 
+        # read the values of all the entity attributes in one pass
+        attributes = params['attribute_snapshot'].read(self.name, self.attributes.keys())
+
         for attribute_key in self.attributes.keys():
             maya_attribute = self.name + '.' + attribute_key
 
@@ -1146,11 +1690,12 @@ class MMsShadingNode():
                 if color_connection.connected_node:
                     # if the node is an appleseed shading node
                     if color_connection.connected_node_type == 'ms_appleseed_shading_node':
-                        shading_node = MMsShadingNode(self.params, color_connection.connected_node)
-                        self.attributes[attribute_key] = shading_node
-                        self.child_shading_nodes += [shading_node] + shading_node.child_shading_nodes
-                        self.colors += shading_node.colors
-                        self.textures += shading_node.textures
+                        shading_node = get_m_shading_node(self.params, color_connection.connected_node)
+                        if shading_node is not None:
+                            self.attributes[attribute_key] = shading_node
+                            self.child_shading_nodes.append(shading_node)
+                        else:
+                            self.attributes[attribute_key] = color_connection
 
                     # else if it's a Maya texture node
                     elif color_connection.connected_node_type == 'file':
@@ -1164,17 +1709,81 @@ class MMsShadingNode():
 
             # the attribute is a string or an item from a drop-down list
             else:
-                self.attributes[attribute_key] = str(cmds.getAttr(maya_attribute))
+                self.attributes[attribute_key] = str(attributes[attribute_key])
+
+        params['shading_nodes_in_progress'].discard(self.name)
+
+
+#--------------------------------------------------------------------------------------------------
+# get_m_shading_node function.
+#--------------------------------------------------------------------------------------------------
+
+def get_m_shading_node(params, shading_node_name):
+
+    """ Returns the MMsShadingNode of a Maya shading node, each node is only read once per export, returns None for a connection that would close a cycle """
+
+    if shading_node_name in params['shading_nodes_in_progress']:
+        ms_commands.warning('{0} is connected to itself through its inputs, ignoring the connection'.format(shading_node_name))
+        return None
+
+    shading_node = params['shading_node_registry'].get(shading_node_name)
+
+    if shading_node is None:
+        shading_node = MMsShadingNode(params, shading_node_name)
+
+    return shading_node
+
+
+#--------------------------------------------------------------------------------------------------
+# get_shading_network function.
+#--------------------------------------------------------------------------------------------------
+
+def get_shading_network(shading_nodes):
+
+    """ Returns the shading nodes, colors and textures of the networks below a list of shading nodes, nodes shared by several paths are only visited once """
+
+    network_shading_nodes = []
+    network_colors = []
+    network_textures = []
+
+    visited = set()
+    stack = [shading_node for shading_node in reversed(shading_nodes) if shading_node is not None]
+
+    while stack:
+        shading_node = stack.pop()
+        if shading_node.name in visited:
+            continue
+        visited.add(shading_node.name)
+
+        network_shading_nodes.append(shading_node)
+        network_colors += shading_node.colors
+        network_textures += shading_node.textures
+        stack.extend(reversed(shading_node.child_shading_nodes))
+
+    return network_shading_nodes, network_colors, network_textures
+
+
+#--------------------------------------------------------------------------------------------------
+# AsEntity class.
+#--------------------------------------------------------------------------------------------------
+
+class AsEntity(object):
+
+    """ Base class for the classes representing appleseed entities, holds the xml cache of immutable entities """
+
+    __slots__ = ('immutable', 'xml_fragment', 'xml_fragment_text')
 
 
 #--------------------------------------------------------------------------------------------------
 # AsParameter class.
 #--------------------------------------------------------------------------------------------------
 
-class AsParameter():
+class AsParameter(AsEntity):
 
     """ Class representing an appleseed Parameter entity """
 
+    __slots__ = ('name', 'value')
+
     def __init__(self, name=None, value=None):
         self.name = name
         self.value = value
@@ -1193,10 +1802,12 @@ class AsParameter():
 # AsParameters class.
 #--------------------------------------------------------------------------------------------------
 
-class AsParameters():
+class AsParameters(AsEntity):
 
     """ Class representing an appleseed Parameters entity """
 
+    __slots__ = ('name', 'parameters')
+
     def __init__(self, name=None):
         self.name = name
         self.parameters = []
@@ -1218,10 +1829,12 @@ class AsParameters():
 # AsColor class.
 #--------------------------------------------------------------------------------------------------
 
-class AsColor():
+class AsColor(AsEntity):
 
     """ Class representing an appleseed Color entity """
 
+    __slots__ = ('RGB_color', 'alpha', 'color_space', 'multiplier', 'name')
+
     def __init__(self):
         self.name = None
         self.RGB_color = [0.5, 0.5, 0.5]
@@ -1249,10 +1862,12 @@ class AsColor():
 # AsTransform class.
 #--------------------------------------------------------------------------------------------------
 
-class AsTransform():
+class AsTransform(AsEntity):
 
     """ Class representing an appleseed Transform entity """
 
+    __slots__ = ('matrices', 'scaling_value', 'time')
+
     def __init__(self):
         self.time = 0.0
         self.scaling_value = 1.0
@@ -1279,10 +1894,12 @@ class AsTransform():
 # AsTexture class.
 #--------------------------------------------------------------------------------------------------
 
-class AsTexture():
+class AsTexture(AsEntity):
 
     """ Class representing an appleseed Texture entity """
 
+    __slots__ = ('color_space', 'file_name', 'instances', 'model', 'name')
+
     def __init__(self):
         self.name = None
         self.model = 'disk_texture_2d'
@@ -1306,10 +1923,12 @@ class AsTexture():
 # AsTextureInstance class.
 #--------------------------------------------------------------------------------------------------
 
-class AsTextureInstance():
+class AsTextureInstance(AsEntity):
 
     """ Class representing an appleseed Texture Instance entity """
 
+    __slots__ = ('addressing_mode', 'alpha_mode', 'filtering_mode', 'name', 'texture')
+
     def __init__(self, as_texture):
         self.name = '%s_instance_%i' % (as_texture.name, len(as_texture.instances))
         self.texture = as_texture
@@ -1329,10 +1948,12 @@ class AsTextureInstance():
 # AsObject class.
 #--------------------------------------------------------------------------------------------------
 
-class AsObject():
+class AsObject(AsEntity):
 
     """ Class representing appleseed Object entity """
 
+    __slots__ = ('file_names', 'has_deformation', 'instances', 'model', 'name', 'name_in_obj')
+
     def __init__(self):
         self.name = None
         self.name_in_obj = None
@@ -1356,10 +1977,12 @@ class AsObject():
 # AsObjectInstanceMaterialAssignment class.
 #--------------------------------------------------------------------------------------------------
 
-class AsObjectInstanceMaterialAssignment():
+class AsObjectInstanceMaterialAssignment(AsEntity):
 
     """ Class representing appleseed Object Instance Material Assignment entity """
 
+    __slots__ = ('material', 'side', 'slot')
+
     def __init__(self, slot=None, side=None, material=None):
         self.slot = slot
         self.side = side
@@ -1373,10 +1996,12 @@ class AsObjectInstanceMaterialAssignment():
 # AsObjectInstance class.
 #--------------------------------------------------------------------------------------------------
 
-class AsObjectInstance():
+class AsObjectInstance(AsEntity):
 
     """ Class representing appleseed Object Instance entity """
 
+    __slots__ = ('material_assignments', 'name', 'object', 'transforms')
+
     def __init__(self, as_object):
         self.name = self.name = '%s_instance_%i' % (as_object.name, len(as_object.instances))
         self.object = as_object
@@ -1396,10 +2021,14 @@ class AsObjectInstance():
 # AsCamera class.
 #--------------------------------------------------------------------------------------------------
 
-class AsCamera():
+class AsCamera(AsEntity):
 
     """ Class representing appleseed Camera entity """
 
+    __slots__ = ('controller_target', 'diaphragm_blades', 'diaphragm_tilt_angle', 'f_stop', 'film_dimensions',
+                 'focal_distance', 'focal_length', 'model', 'name', 'shutter_close_time', 'shutter_open_time',
+                 'transforms')
+
     def __init__(self):
         self.name = None
         self.model = None
@@ -1439,10 +2068,12 @@ class AsCamera():
 # AsEnvironment class.
 #--------------------------------------------------------------------------------------------------
 
-class AsEnvironment():
+class AsEnvironment(AsEntity):
 
     """ Class representing appleseed Environment entity """
 
+    __slots__ = ('environment_edf', 'environment_shader', 'name')
+
     def __init__(self):
         self.name = None
         self.environment_shader = None
@@ -1460,10 +2091,12 @@ class AsEnvironment():
 # AsEnvironmentShader class.
 #--------------------------------------------------------------------------------------------------
 
-class AsEnvironmentShader():
+class AsEnvironmentShader(AsEntity):
 
     """ Class representing appleseed Environment Shader entity """
 
+    __slots__ = ('edf', 'name', 'parameters')
+
     def __init__(self):
         self.name = None
         self.edf = None
@@ -1481,10 +2114,12 @@ class AsEnvironmentShader():
 # AsEnvironmentEdf class.
 #--------------------------------------------------------------------------------------------------
 
-class AsEnvironmentEdf():
+class AsEnvironmentEdf(AsEntity):
 
     """ Class representing appleseed Environment EDF entity """
 
+    __slots__ = ('model', 'name', 'parameters')
+
     def __init__(self):
         self.name = None
         self.model = None
@@ -1501,10 +2136,13 @@ class AsEnvironmentEdf():
 # AsMaterial class.
 #--------------------------------------------------------------------------------------------------
 
-class AsMaterial():
+class AsMaterial(AsEntity):
 
     """ Class representing appleseed Material entity """
 
+    __slots__ = ('alpha_map', 'bsdf', 'bump_amplitude', 'displacement_map', 'displacement_mode', 'edf', 'model',
+                 'name', 'normal_map_up', 'surface_shader')
+
     def __init__(self):
         self.name = None
         self.model = 'generic_material'
@@ -1551,10 +2189,12 @@ class AsMaterial():
 # AsBsdf class.
 #--------------------------------------------------------------------------------------------------
 
-class AsBsdf():
+class AsBsdf(AsEntity):
 
     """ Class representing appleseed BSDF entity """
 
+    __slots__ = ('model', 'name', 'parameters')
+
     def __init__(self):
         self.name = None
         self.model = None
@@ -1571,10 +2211,12 @@ class AsBsdf():
 # AsEdf class.
 #--------------------------------------------------------------------------------------------------
 
-class AsEdf():
+class AsEdf(AsEntity):
 
     """ Class representing appleseed EDF entity """
 
+    __slots__ = ('model', 'name', 'parameters')
+
     def __init__(self):
         self.name = None
         self.model = None
@@ -1591,10 +2233,12 @@ class AsEdf():
 # AsSurfaceShader class.
 #--------------------------------------------------------------------------------------------------
 
-class AsSurfaceShader():
+class AsSurfaceShader(AsEntity):
 
     """ Class representing appleseed Surface Shader entity """
 
+    __slots__ = ('model', 'name', 'parameters')
+
     def __init__(self):
         self.name = None
         self.model = None
@@ -1611,10 +2255,13 @@ class AsSurfaceShader():
 # AsLight class.
 #--------------------------------------------------------------------------------------------------
 
-class AsLight():
+class AsLight(AsEntity):
 
     """ Class representing appleseed Light entity """
 
+    __slots__ = ('exitance', 'exitance_multiplier', 'inner_angle', 'model', 'name', 'outer_angle', 'parameters',
+                 'transform')
+
     def __init__(self):
         self.name = None
         self.model = None
@@ -1640,31 +2287,76 @@ class AsLight():
         doc.end_element('light')
 
 
+#--------------------------------------------------------------------------------------------------
+# AsEntityTable class.
+#--------------------------------------------------------------------------------------------------
+
+class AsEntityTable(object):
+
+    """ Insertion ordered list of appleseed entities that can also be looked up by name """
+
+    __slots__ = ('entities', 'entities_by_name')
+
+    def __init__(self, entities=()):
+        self.entities = []
+        self.entities_by_name = {}
+        for entity in entities:
+            self.append(entity)
+
+    def __iter__(self):
+        return iter(self.entities)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __getitem__(self, index):
+        return self.entities[index]
+
+    def append(self, entity):
+        # entities must be named before they are added, the first entity added under a name is the one returned by get
+        self.entities.append(entity)
+        if entity.name not in self.entities_by_name:
+            self.entities_by_name[entity.name] = entity
+
+    def get(self, name):
+        return self.entities_by_name.get(name)
+
+    def copy(self):
+        return AsEntityTable(self.entities)
+
+
 #--------------------------------------------------------------------------------------------------
 # AsAssembly class.
 #--------------------------------------------------------------------------------------------------
 
-class AsAssembly():
+class AsAssembly(AsEntity):
 
     """ Class representing appleseed Assembly entity """
 
+    __slots__ = ('assemblies', 'assembly_instances', 'bsdfs', 'colors', 'edfs', 'instances', 'lights', 'materials',
+                 'name', 'object_instances', 'objects', 'objects_by_file_names', 'parent_assembly', 'raw_xml_files',
+                 'surface_shaders', 'texture_instances', 'textures')
+
     def __init__(self, parent_assembly):
         self.parent_assembly = parent_assembly
         self.name = None
-        self.colors = []
-        self.textures = []
-        self.texture_instances = []
-        self.materials = []
-        self.bsdfs = []
-        self.edfs = []
-        self.surface_shaders = []
+        self.colors = AsEntityTable()
+        self.textures = AsEntityTable()
+        self.texture_instances = AsEntityTable()
+        self.materials = AsEntityTable()
+        self.bsdfs = AsEntityTable()
+        self.edfs = AsEntityTable()
+        self.surface_shaders = AsEntityTable()
         self.lights = []
         self.objects = []
         self.object_instances = []
         self.assemblies = []
         self.assembly_instances = []
 
-        self.raw_xml = ''
+        # objects keyed by their tuple of file names, meshes with the same geometry are instances of one object
+        self.objects_by_file_names = dict()
+
+        self.raw_xml_files = []
 
         self.instances = []
 
@@ -1673,48 +2365,71 @@ class AsAssembly():
         self.instances.append(assembly_instance)
         return assembly_instance
 
+    def has_raw_xml(self):
+        if len(self.raw_xml_files) > 0:
+            return True
+        for assembly in self.assemblies:
+            if assembly.has_raw_xml():
+                return True
+        return False
+
+    def copy(self):
+        """ Returns a shallow copy with its own entity lists, the entities themselves are shared """
+        assembly = copy.copy(self)
+        for attribute in ['colors', 'textures', 'texture_instances', 'materials', 'bsdfs', 'edfs', 'surface_shaders']:
+            setattr(assembly, attribute, getattr(self, attribute).copy())
+        for attribute in ['lights', 'objects', 'object_instances', 'assemblies', 'assembly_instances', 'raw_xml_files']:
+            setattr(assembly, attribute, list(getattr(self, attribute)))
+        assembly.instances = []
+
+        # the objects of the original are shared and immutable, they can't take new instances
+        assembly.objects_by_file_names = dict()
+        return assembly
+
     def emit_xml(self, doc):
         doc.start_element('assembly name="%s"' % self.name)
 
         for color in self.colors:
-            color.emit_xml(doc)
+            doc.append_entity(color)
 
         for texture in self.textures:
-            texture.emit_xml(doc)
+            doc.append_entity(texture)
 
         for texture_instance in self.texture_instances:
-            texture_instance.emit_xml(doc)
+            doc.append_entity(texture_instance)
 
         for bsdf in self.bsdfs:
-            bsdf.emit_xml(doc)
+            doc.append_entity(bsdf)
 
         for edf in self.edfs:
-            edf.emit_xml(doc)
+            doc.append_entity(edf)
 
         for surface_shader in self.surface_shaders:
-            surface_shader.emit_xml(doc)
+            doc.append_entity(surface_shader)
 
         for light in self.lights:
-            light.emit_xml(doc)
+            doc.append_entity(light)
 
         for material in self.materials:
-            material.emit_xml(doc)
+            doc.append_entity(material)
 
         for object in self.objects:
-            object.emit_xml(doc)
+            doc.append_entity(object)
 
         for assembly in self.assemblies:
-            assembly.emit_xml(doc)
+            doc.append_entity(assembly)
 
         for object_instance in self.object_instances:
-            object_instance.emit_xml(doc)
+            doc.append_entity(object_instance)
 
         for assembly_instance in self.assembly_instances:
-            assembly_instance.emit_xml(doc)
+            doc.append_entity(assembly_instance)
 
-        if not self.raw_xml == '':
-            for line in self.raw_xml.split('\n'):
-                doc.append_line(line)
+        # raw xml files can be very large so they are streamed a line at a time
+        for raw_xml_file_path in self.raw_xml_files:
+            with open(raw_xml_file_path, 'r') as raw_xml_file:
+                for line in raw_xml_file:
+                    doc.append_line(line.rstrip('\r\n'))
 
         doc.end_element('assembly')
 
@@ -1723,10 +2438,12 @@ class AsAssembly():
 # AsAssemblyInstance class.
 #--------------------------------------------------------------------------------------------------
 
-class AsAssemblyInstance():
+class AsAssemblyInstance(AsEntity):
 
     """ Class representing appleseed Assembly Instance entity """
 
+    __slots__ = ('assembly', 'name', 'transforms')
+
     def __init__(self, as_assembly):
         self.name = '%s_instance_%i' % (as_assembly.name, len(as_assembly.instances))
         self.assembly = as_assembly
@@ -1743,10 +2460,12 @@ class AsAssemblyInstance():
 # AsRules class.
 #--------------------------------------------------------------------------------------------------
 
-class AsRules():
+class AsRules(AsEntity):
 
     """ Class representing appleseed Rules entity """
 
+    __slots__ = ('rules',)
+
     def __init__(self):
         self.rules = []
 
@@ -1761,10 +2480,12 @@ class AsRules():
 # AsRenderLayerAssignment class.
 #--------------------------------------------------------------------------------------------------
 
-class AsRenderLayerAssignment():
+class AsRenderLayerAssignment(AsEntity):
 
     """ Class representing appleseed RenderLayerAssignment entity """
 
+    __slots__ = ('model', 'name', 'parameters')
+
     def __init__(self, name, model):
         self.name = name
         self.model = model
@@ -1781,10 +2502,12 @@ class AsRenderLayerAssignment():
 # AsFrame class.
 #--------------------------------------------------------------------------------------------------
 
-class AsFrame():
+class AsFrame(AsEntity):
 
     """ Class representing appleseed Frame entity """
 
+    __slots__ = ('camera', 'color_space', 'name', 'premultiplied_alpha', 'resolution', 'tile_size')
+
     def __init__(self):
         self.name = 'beauty'
         self.camera = None
@@ -1807,10 +2530,12 @@ class AsFrame():
 # AsOutput class.
 #--------------------------------------------------------------------------------------------------
 
-class AsOutput():
+class AsOutput(AsEntity):
 
     """ Class representing appleseed Output entity """
 
+    __slots__ = ('frames',)
+
     def __init__(self):
         self.frames = []
 
@@ -1825,10 +2550,12 @@ class AsOutput():
 # AsConfiguration class.
 #--------------------------------------------------------------------------------------------------
 
-class AsConfiguration():
+class AsConfiguration(AsEntity):
 
     """ Class representing appleseed Configuration entity """
 
+    __slots__ = ('base', 'name', 'parameters')
+
     def  __init__(self):
         self.name = None
         self.base = None
@@ -1845,10 +2572,12 @@ class AsConfiguration():
 # AsConfigurations class.
 #--------------------------------------------------------------------------------------------------
 
-class AsConfigurations():
+class AsConfigurations(AsEntity):
 
     """ Class representing appleseed Configurations entity """
 
+    __slots__ = ('configurations',)
+
     def __init__(self):
         self.configurations = []
 
@@ -1863,10 +2592,13 @@ class AsConfigurations():
 # AsScene class.
 #--------------------------------------------------------------------------------------------------
 
-class AsScene():
+class AsScene(AsEntity):
 
     """ Class representing appleseed Scene entity """
 
+    __slots__ = ('assemblies', 'assembly_instances', 'camera', 'cameras', 'colors', 'configurations', 'environment',
+                 'environment_edfs', 'environment_shaders', 'output', 'parameters', 'texture_instances', 'textures')
+
     def __init__(self):
         self.cameras = None
         self.colors = []
@@ -1881,43 +2613,51 @@ class AsScene():
         self.assembly_instances = []
         self.parameters = []
 
+    def copy(self):
+        """ Returns a shallow copy with its own entity lists, the entities themselves are shared """
+        scene = copy.copy(self)
+        for attribute in ['colors', 'textures', 'texture_instances', 'environment_edfs', 'environment_shaders',
+                          'assemblies', 'assembly_instances', 'parameters']:
+            setattr(scene, attribute, list(getattr(self, attribute)))
+        return scene
+
     def emit_xml(self, doc):
         doc.start_element('scene')
 
         for parameter in self.parameters:
-            parameter.emit_xml(doc)
+            doc.append_entity(parameter)
 
-        self.camera.emit_xml(doc)
+        doc.append_entity(self.camera)
 
         for color in self.colors:
-            color.emit_xml(doc)
+            doc.append_entity(color)
 
         for texture in self.textures:
-            texture.emit_xml(doc)
+            doc.append_entity(texture)
 
         for texture_instance in self.texture_instances:
-            texture_instance.emit_xml(doc)
+            doc.append_entity(texture_instance)
 
         for environment_edf in self.environment_edfs:
-            environment_edf.emit_xml(doc)
+            doc.append_entity(environment_edf)
 
         for environment_shader in self.environment_shaders:
-            environment_shader.emit_xml(doc)
+            doc.append_entity(environment_shader)
 
         if self.environment is not None:
-            self.environment.emit_xml(doc)
+            doc.append_entity(self.environment)
 
         if self.output is not None:
-            self.output.emit_xml(doc)
+            doc.append_entity(self.output)
 
         if self.configurations is not None:
-            self.configurations.emit_xml(doc)
+            doc.append_entity(self.configurations)
 
         for assembly in self.assemblies:
-            assembly.emit_xml(doc)
+            doc.append_entity(assembly)
 
         for assembly_instance in self.assembly_instances:
-            assembly_instance.emit_xml(doc)
+            doc.append_entity(assembly_instance)
 
         doc.end_element('scene')
 
@@ -1926,10 +2666,12 @@ class AsScene():
 # AsProject class.
 #--------------------------------------------------------------------------------------------------
 
-class AsProject():
+class AsProject(AsEntity):
 
     """ Class representing appleseed Project entity """
 
+    __slots__ = ('configurations', 'output', 'rules', 'scene')
+
     def __init__(self):
         self.scene = None
         self.output = None
@@ -1938,10 +2680,10 @@ class AsProject():
 
     def emit_xml(self, doc):
         doc.start_element('project')
-        self.scene.emit_xml(doc)
-        self.output.emit_xml(doc)
-        self.rules.emit_xml(doc)
-        self.configurations.emit_xml(doc)
+        doc.append_entity(self.scene)
+        doc.append_entity(self.output)
+        doc.append_entity(self.rules)
+        doc.append_entity(self.configurations)
         doc.end_element('project')
 
 
@@ -2008,6 +2750,217 @@ def m_file_to_as_texture(params, m_file, postfix='', file_number=0):
     return as_texture, as_texture_instance
 
 
+#--------------------------------------------------------------------------------------------------
+# samples_are_constant function.
+#--------------------------------------------------------------------------------------------------
+
+def samples_are_constant(samples):
+
+    """ Returns True if every sample in the list is equal to the first one """
+
+    for sample in samples[1:]:
+        if sample != samples[0]:
+            return False
+
+    return True
+
+
+#--------------------------------------------------------------------------------------------------
+# m_file_is_static function.
+#--------------------------------------------------------------------------------------------------
+
+def m_file_is_static(m_file):
+
+    """ Returns True if an MFile translates to the same texture on every frame """
+
+    if m_file is None or not m_file.__class__.__name__ == 'MFile':
+        return True
+
+    # baked textures are not marked as animated but are sampled on every frame, so only the samples are compared
+    return samples_are_constant(m_file.image_file_names)
+
+
+#--------------------------------------------------------------------------------------------------
+# m_transform_is_static function.
+#--------------------------------------------------------------------------------------------------
+
+def m_transform_is_static(maya_transform):
+
+    """ Returns True if no sample of an MTransform or its descendents changes over the export """
+
+    if not samples_are_constant(maya_transform.matrices):
+        return False
+
+    if not samples_are_constant(maya_transform.visibility_states):
+        return False
+
+    for mesh in maya_transform.child_meshes:
+        if mesh.has_deformation and not samples_are_constant(mesh.mesh_file_names):
+            return False
+
+        for material in mesh.ms_materials + mesh.generic_materials:
+            for texture in material.textures:
+                if not m_file_is_static(texture):
+                    return False
+
+    for light in maya_transform.child_lights:
+        if not m_file_is_static(light.color):
+            return False
+
+    for transform in maya_transform.child_transforms:
+        if not m_transform_is_static(transform):
+            return False
+
+    return True
+
+
+#--------------------------------------------------------------------------------------------------
+# m_environment_is_static function.
+#--------------------------------------------------------------------------------------------------
+
+def m_environment_is_static(maya_environment):
+
+    """ Returns True if the environment translates to the same entities on every frame """
+
+    if maya_environment.__class__.__name__ == 'MMsPhysicalEnvironment':
+        return m_file_is_static(maya_environment.turbidity)
+
+    return m_file_is_static(maya_environment.latitude_longitude_exitance) and m_file_is_static(maya_environment.mirrorball_exitance)
+
+
+#--------------------------------------------------------------------------------------------------
+# set_immutable function.
+#--------------------------------------------------------------------------------------------------
+
+def set_immutable(entities):
+
+    """ Marks appleseed entities as unchanging for the rest of the export so WriteXml only serializes them once """
+
+    for entity in entities:
+        if entity is not None:
+            entity.immutable = True
+
+
+#--------------------------------------------------------------------------------------------------
+# get_frame_sample_numbers function.
+#--------------------------------------------------------------------------------------------------
+
+def get_frame_sample_numbers(params, frame_number):
+
+    """ Returns the motion blur sample indices and the non motion blur sample index of a frame in the cached Maya scene """
+
+    # mb_sample_number is list of indices that should be iterated over in the cached Maya scene for objects with motion blur
+    # if animation export is turned off it should be initialised to the first sample
+    mb_sample_number_list = range(params['motion_samples'])
+
+    non_mb_sample_number = None
+    if params['export_animation']:
+        non_mb_sample_number = frame_number - params['animation_start_frame']
+    else:
+        non_mb_sample_number = 0
+
+    # if animation export is turned on set the sample list according to the current frame and the sample count
+    if params['export_animation']:
+        mb_sample_number_list = range(params['motion_samples'])
+        for i in range(params['motion_samples']):
+            mb_sample_number_list[i] += (frame_number - params['animation_start_frame']) * (params['motion_samples'] - 1)
+
+    return mb_sample_number_list, non_mb_sample_number
+
+
+#--------------------------------------------------------------------------------------------------
+# translate_environment function.
+#--------------------------------------------------------------------------------------------------
+
+def translate_environment(params, maya_environment, as_scene, root_assembly, non_mb_sample_number):
+
+    """ Adds the appleseed environment entities of an environment to a scene, the physical sun light is added to the root assembly """
+
+    environment = AsEnvironment()
+    environment.name = maya_environment.safe_name
+
+    environment_edf = AsEnvironmentEdf()
+    environment_edf.name = maya_environment.safe_name + '_edf'
+    environment_edf.model = maya_environment.model
+    environment.environment_edf = AsParameter('environment_edf', environment_edf.name)
+
+    if maya_environment.__class__.__name__ == 'MMsPhysicalEnvironment':
+        environment_edf.model = maya_environment.model
+        environment_edf.parameters.append(AsParameter('ground_albedo' , maya_environment.ground_albedo))
+        environment_edf.parameters.append(AsParameter('horizon_shift' , maya_environment.horizon_shift))
+        environment_edf.parameters.append(AsParameter('luminance_multiplier' , maya_environment.luminance_multiplier))
+        environment_edf.parameters.append(AsParameter('saturation_multiplier' , maya_environment.saturation_multiplier))
+        environment_edf.parameters.append(AsParameter('luminance_gamma' , maya_environment.luminance_gamma))
+        environment_edf.parameters.append(AsParameter('sun_phi' , maya_environment.sun_phi))
+        environment_edf.parameters.append(AsParameter('sun_theta' , maya_environment.sun_theta))
+        environment_edf.parameters.append(AsParameter('turbidity_multiplier' , maya_environment.turbidity_multiplier))
+
+        if maya_environment.turbidity.__class__.__name__ == 'MFile':
+            turbidity_file, turbidity_file_instance = m_file_to_as_texture(params, maya_environment.turbidity, '_texture', non_mb_sample_number)
+            as_scene.textures.append(turbidity_file)
+            as_scene.texture_instances.append(turbidity_file_instance)
+            turbidity_param = AsParameter('exitance', turbidity_file_instance.name)
+            environment_edf.parameters.append(turbidity_param)
+        else:
+            turbidity_color = m_color_connection_to_as_color(maya_environment.turbidity, '_turbidity')
+            turbidity_param = AsParameter('turbidity', turbidity_color.name)
+            environment_edf.parameters.append(turbidity_param)
+            as_scene.colors.append(turbidity_color)
+
+        if maya_environment.create_physical_sun:
+            light = AsLight()
+            light.name = 'physical_sun_light'
+            light.model = 'sun_light'
+            light.parameters.append(AsParameter('environment_edf', environment_edf.name))
+            light.parameters.append(AsParameter('radiance_multiplier', maya_environment.physical_sun_multiplier))
+            light.parameters.append(turbidity_param)
+            root_assembly.lights.append(light)
+
+    else:
+        # environment must be generic
+        if environment_edf.model == 'constant_environment_edf':
+            constant_environment_color = m_color_connection_to_as_color(maya_environment.constant_exitance, '_constant_exitance')
+            environment_edf.parameters.append(AsParameter('exitance', constant_environment_color.name))
+            as_scene.colors.append(constant_environment_color)
+
+        elif environment_edf.model == 'gradient_environment_edf':
+            gradient_horizon_exitance = m_color_connection_to_as_color(maya_environment.gradient_horizon_exitance, '_horizon_exitance')
+            environment_edf.parameters.append(AsParameter('horizon_exitance', gradient_horizon_exitance.name))
+            as_scene.colors.append(gradient_horizon_exitance)
+
+            zenith_horizon_exitance = m_color_connection_to_as_color(maya_environment.gradient_zenith_exitance, '_zenith_exitance')
+            environment_edf.parameters.append(AsParameter('zenith_exitance', zenith_horizon_exitance.name))
+            as_scene.colors.append(zenith_horizon_exitance)
+
+        elif environment_edf.model == 'latlong_map_environment_edf':
+            lat_long_map, lat_long_map_instance = m_file_to_as_texture(params, maya_environment.latitude_longitude_exitance, '_texture', non_mb_sample_number)                
+            
+            as_scene.textures.append(lat_long_map)
+            as_scene.texture_instances.append(lat_long_map_instance)
+
+            environment_edf.parameters.append(AsParameter('exitance', lat_long_map_instance.name))
+
+        elif environment_edf.model == 'mirrorball_map_environment_edf':
+            mirror_ball_map, mirror_ball_map_instance = m_file_to_as_texture(params, maya_environment.mirrorball_exitance, '_texture', non_mb_sample_number)
+            
+            as_scene.textures.append(mirror_ball_map)
+            as_scene.texture_instances.append(mirror_ball_map_instance)
+
+            environment_edf.parameters.append(AsParameter('exitance', mirror_ball_map_instance.name))
+
+        environment_edf.parameters.append(AsParameter('exitance_multiplier', str(maya_environment.exitance_multiplier)))
+
+    if params['render_sky']:
+        environment_shader = AsEnvironmentShader()
+        environment_shader.name = maya_environment.safe_name + '_shader'
+        environment_shader.edf = AsParameter('environment_edf', environment_edf.name)
+        environment.environment_shader = AsParameter('environment_shader', environment_shader.name)
+        as_scene.environment_shaders.append(environment_shader)
+
+    as_scene.environment = environment
+    as_scene.environment_edfs.append(environment_edf)
+
+
 #--------------------------------------------------------------------------------------------------
 # traslate_maya_scene function.
 #--------------------------------------------------------------------------------------------------
@@ -2036,12 +2989,166 @@ def translate_maya_scene(params, maya_scene, maya_environment):
     base_file_name = params['file_name']
     base_file_name = params['file_name'].replace("<SceneName>", scene_basename)
 
+    # compressed project files get the gzip extension
+    if params['compress_xml']:
+        base_file_name += '.gz'
+
     # if animation export is on populate frame list with correct frame numbers
     if params['export_animation']:
         frame_list = range(params['animation_start_frame'], params['animation_end_frame'] + 1)
 
-    cmds.progressWindow(e=True, status='Translating maya scene', progress=0, max=len(frame_list))
-    cmds.refresh(cv=True)
+    ms_commands.progress_window(e=True, status='Translating maya scene', progress=0, max=len(frame_list))
+    ms_commands.refresh()
+
+    # begin construction of static entities ******************************************************
+    # entities that do not change from frame to frame are built once and shared by every frame's project
+
+    # retrieve camera from Maya scene cache
+    camera = None
+    for transform in maya_scene:
+        camera = fetch_m_camera(transform, params['output_camera'])
+        if camera is not None:
+            break
+    if camera == None:
+        ms_commands.error('Camera not found: ' +  params['output_camera'])
+
+    # create output and frame objects
+    as_output = AsOutput()
+    as_frame = AsFrame()
+    as_output.frames.append(as_frame)
+    as_frame.camera = AsParameter('camera', camera.safe_name)
+    as_frame.resolution = AsParameter('resolution', '%i %i' % (params['output_res_width'], params['output_res_height']))
+    as_frame.color_space.value = params['output_color_space']
+
+    if params['export_straight_alpha']:
+        as_frame.premultiplied_alpha.value = 'false'
+
+    as_frame.tile_size = AsParameter('tile_size', '{0} {1}'.format(params['tile_width'], params['tile_height']))
+
+    # create render layers
+    as_rules = AsRules()
+
+    for i, layer in enumerate(params['render_layers']):
+        render_layer_assignment = AsRenderLayerAssignment('{0}_{1}'.format(layer['name'], i), layer['model'])
+        render_layer_assignment.parameters.append(AsParameter('render_layer', layer['name']))
+        render_layer_assignment.parameters.append(AsParameter('entity_type', layer['type']))
+        render_layer_assignment.parameters.append(AsParameter('pattern', layer['pattern']))
+        render_layer_assignment.parameters.append(AsParameter('order', layer['order']))
+        as_rules.rules.append(render_layer_assignment)
+
+    # create configurations object
+    as_configurations = AsConfigurations()
+
+    # create interactive config
+    interactive_config = AsConfiguration()
+    as_configurations.configurations.append(interactive_config)
+    interactive_config.name = 'interactive'
+    interactive_config.base = 'base_interactive'
+
+    # create final config
+    final_config = AsConfiguration()
+    as_configurations.configurations.append(final_config)
+    final_config.name = 'final'
+    final_config.base = 'base_final'
+
+    for config in [interactive_config, final_config]:
+        enable_importance_sampling_parameters = AsParameters('light_sampler')
+        enable_importance_sampling_parameters.parameters.append(AsParameter('enable_importance_sampling', params['enable_importance_sampling']))
+        config.parameters.append(enable_importance_sampling_parameters)
+
+        config.parameters.append(AsParameter('lighting_engine', 'pt'))
+        config.parameters.append(AsParameter('pixel_renderer', params['sampler']))
+
+        adaptive_pixel_renderer_params = AsParameters('adaptive_pixel_renderer')
+        adaptive_pixel_renderer_params.parameters.append(AsParameter('min_samples', params['adaptive_min_samples']))
+        adaptive_pixel_renderer_params.parameters.append(AsParameter('max_samples', params['adaptive_max_samples']))
+        adaptive_pixel_renderer_params.parameters.append(AsParameter('quality', params['adaptive_quality']))
+        config.parameters.append(adaptive_pixel_renderer_params)
+
+        uniform_pixel_renderer_params = AsParameters('uniform_pixel_renderer')
+        uniform_pixel_renderer_params.parameters.append(AsParameter('samples', params['uniform_samples']))
+        uniform_pixel_renderer_params.parameters.append(AsParameter('decorrelate_pixels', params['uniform_decorrelate_pixels']))
+        config.parameters.append(uniform_pixel_renderer_params)
+
+        pt_params = AsParameters('pt')
+        pt_params.parameters.append(AsParameter('dl_light_samples', params['pt_light_samples']))
+        pt_params.parameters.append(AsParameter('enable_caustics', params['pt_caustics']))
+        pt_params.parameters.append(AsParameter('enable_dl', params['pt_direct_lighting']))
+        pt_params.parameters.append(AsParameter('enable_ibl', params['pt_ibl']))
+        pt_params.parameters.append(AsParameter('ibl_env_samples', params['pt_environment_samples']))
+        pt_params.parameters.append(AsParameter('max_path_length', params['pt_max_bounces']))
+        pt_params.parameters.append(AsParameter('next_event_estimation', params['pt_next_event_estimation']))
+
+        if params['pt_max_ray_intensity'] > 0:
+            pt_params.parameters.append(AsParameter('max_ray_intensity', params['pt_max_ray_intensity']))                
+
+        config.parameters.append(pt_params)
+
+    # begin static scene object
+    static_scene = AsScene()
+
+    # define static root assembly
+    static_root_assembly = AsAssembly(None)
+    static_root_assembly.name = 'root_assembly'
+
+    # create default materials
+    default_material = AsMaterial()
+    default_material.name = 'as_default_material'
+    default_material.alpha_map = AsParameter('alpha_map', '0')
+
+    # clear surface shader
+    default_clear_surface_shader = AsSurfaceShader()
+    default_clear_surface_shader.name = 'as_default_clear_surface_shader'
+    default_clear_surface_shader.model = 'constant_surface_shader'
+    default_clear_surface_shader.parameters.append(AsParameter('color', '0'))
+    default_clear_surface_shader.parameters.append(AsParameter('alpha_multiplier', '0'))
+    static_root_assembly.surface_shaders.append(default_clear_surface_shader)
+
+    # physical surface_shader
+    default_physical_surface_shader = AsSurfaceShader()
+    default_physical_surface_shader.name = 'as_default_physical_surface_shader'
+    default_physical_surface_shader.model = 'physical_surface_shader'
+    static_root_assembly.surface_shaders.append(default_physical_surface_shader)
+
+    # default material
+    default_material.surface_shader = AsParameter('surface_shader', default_clear_surface_shader.name)
+    static_root_assembly.materials.append(default_material)
+
+    # create default invisible material 
+    default_invisible_material = AsMaterial()
+    default_invisible_material.name = 'as_default_invisible_material'
+    default_invisible_material.alpha_map = AsParameter('alpha_map', '0')
+    default_invisible_material.surface_shader = AsParameter('surface_shader', default_clear_surface_shader.name)
+
+    static_root_assembly.materials.append(default_invisible_material)
+
+    # static entities are translated with the samples of the first frame, any frame would give the same result
+    first_mb_sample_number_list, first_non_mb_sample_number = get_frame_sample_numbers(params, frame_list[0])
+
+    # if present and unchanging add the environment
+    static_environment = maya_environment is None or m_environment_is_static(maya_environment)
+    if maya_environment is not None and static_environment:
+        translate_environment(params, maya_environment, static_scene, static_root_assembly, first_non_mb_sample_number)
+
+    # root transforms whose hierarchies have the same samples on every frame are translated once
+    dynamic_transforms = []
+    for transform in maya_scene:
+        if m_transform_is_static(transform):
+            construct_transform_descendents(params, static_root_assembly, static_root_assembly, None, transform, first_mb_sample_number_list, first_non_mb_sample_number, params['export_camera_blur'], params['export_transformation_blur'], params['export_deformation_blur'])
+        else:
+            dynamic_transforms.append(transform)
+
+    # the static entities are shared by every frame so their xml only needs to be generated once
+    set_immutable([as_output, as_rules, as_configurations, static_scene.environment])
+    set_immutable(static_scene.colors + static_scene.textures + static_scene.texture_instances + static_scene.environment_edfs + static_scene.environment_shaders)
+    for attribute in ['colors', 'textures', 'texture_instances', 'materials', 'bsdfs', 'edfs', 'surface_shaders',
+                      'lights', 'objects', 'object_instances', 'assembly_instances']:
+        set_immutable(getattr(static_root_assembly, attribute))
+
+    # assemblies holding referenced scenes are streamed from disk on every frame rather than cached in memory
+    set_immutable([assembly for assembly in static_root_assembly.assemblies if not assembly.has_raw_xml()])
+
+    # end construction of static entities ********************************************************
 
     for i, frame_number in enumerate(frame_list):
 
@@ -2049,217 +3156,30 @@ def translate_maya_scene(params, maya_scene, maya_environment):
 
         ms_commands.info("Exporting frame %i..." % frame_number)
 
-        # mb_sample_number is list of indices that should be iterated over in the cached Maya scene for objects with motion blur
-        # if animation export is turned off it should be initialised to the first sample
-        mb_sample_number_list = range(params['motion_samples'])
-
-        non_mb_sample_number = None
-        if params['export_animation']:
-            non_mb_sample_number = frame_number - params['animation_start_frame']
-        else:
-            non_mb_sample_number = 0
-
-        # if animation export is turned on set the sample list according to the current frame and the sample count
-        if params['export_animation']:
-            mb_sample_number_list = range(params['motion_samples'])
-            for i in range(params['motion_samples']):
-                mb_sample_number_list[i] += (frame_number - params['animation_start_frame']) * (params['motion_samples'] - 1)
+        mb_sample_number_list, non_mb_sample_number = get_frame_sample_numbers(params, frame_number)
 
         # begin construction of as object hierarchy *************************************************
 
         as_project = AsProject()
-
-        # create output and frame objects
-        as_output = AsOutput()
         as_project.output = as_output
-        as_frame = AsFrame()
-        as_output.frames.append(as_frame)
-        # note: frame camera is set when the camera is retrieved for the scene element
-        as_frame.resolution = AsParameter('resolution', '%i %i' % (params['output_res_width'], params['output_res_height']))
-        as_frame.color_space.value = params['output_color_space']
-
-        if params['export_straight_alpha']:
-            as_frame.premultiplied_alpha.value = 'false'
-
-        as_frame.tile_size = AsParameter('tile_size', '{0} {1}'.format(params['tile_width'], params['tile_height']))
-
-        # create render layers
-
-        as_rules = AsRules()
         as_project.rules = as_rules
-
-        for i, layer in enumerate(params['render_layers']):
-            render_layer_assignment = AsRenderLayerAssignment('{0}_{1}'.format(layer['name'], i), layer['model'])
-            render_layer_assignment.parameters.append(AsParameter('render_layer', layer['name']))
-            render_layer_assignment.parameters.append(AsParameter('entity_type', layer['type']))
-            render_layer_assignment.parameters.append(AsParameter('pattern', layer['pattern']))
-            render_layer_assignment.parameters.append(AsParameter('order', layer['order']))
-            as_rules.rules.append(render_layer_assignment)
-
-        # create configurations object
-        as_configurations = AsConfigurations()
         as_project.configurations = as_configurations
 
-        # create interactive config
-        interactive_config = AsConfiguration()
-        as_configurations.configurations.append(interactive_config)
-        interactive_config.name = 'interactive'
-        interactive_config.base = 'base_interactive'
-
-        # create final config
-        final_config = AsConfiguration()
-        as_configurations.configurations.append(final_config)
-        final_config.name = 'final'
-        final_config.base = 'base_final'
-
-        for config in [interactive_config, final_config]:
-            enable_importance_sampling_parameters = AsParameters('light_sampler')
-            enable_importance_sampling_parameters.parameters.append(AsParameter('enable_importance_sampling', params['enable_importance_sampling']))
-            config.parameters.append(enable_importance_sampling_parameters)
-
-            config.parameters.append(AsParameter('lighting_engine', 'pt'))
-            config.parameters.append(AsParameter('pixel_renderer', params['sampler']))
-
-            adaptive_pixel_renderer_params = AsParameters('adaptive_pixel_renderer')
-            adaptive_pixel_renderer_params.parameters.append(AsParameter('min_samples', params['adaptive_min_samples']))
-            adaptive_pixel_renderer_params.parameters.append(AsParameter('max_samples', params['adaptive_max_samples']))
-            adaptive_pixel_renderer_params.parameters.append(AsParameter('quality', params['adaptive_quality']))
-            config.parameters.append(adaptive_pixel_renderer_params)
-
-            uniform_pixel_renderer_params = AsParameters('uniform_pixel_renderer')
-            uniform_pixel_renderer_params.parameters.append(AsParameter('samples', params['uniform_samples']))
-            uniform_pixel_renderer_params.parameters.append(AsParameter('decorrelate_pixels', params['uniform_decorrelate_pixels']))
-            config.parameters.append(uniform_pixel_renderer_params)
-
-            pt_params = AsParameters('pt')
-            pt_params.parameters.append(AsParameter('dl_light_samples', params['pt_light_samples']))
-            pt_params.parameters.append(AsParameter('enable_caustics', params['pt_caustics']))
-            pt_params.parameters.append(AsParameter('enable_dl', params['pt_direct_lighting']))
-            pt_params.parameters.append(AsParameter('enable_ibl', params['pt_ibl']))
-            pt_params.parameters.append(AsParameter('ibl_env_samples', params['pt_environment_samples']))
-            pt_params.parameters.append(AsParameter('max_path_length', params['pt_max_bounces']))
-            pt_params.parameters.append(AsParameter('next_event_estimation', params['pt_next_event_estimation']))
-
-            if params['pt_max_ray_intensity'] > 0:
-                pt_params.parameters.append(AsParameter('max_ray_intensity', params['pt_max_ray_intensity']))                
-
-            config.parameters.append(pt_params)
-
-        # begin scene object
-        as_project.scene = AsScene()
-
-        # create bouding box scene parameter
-
-        bb = cmds.ls(type='mesh')
-        if len(bb) > 0:
-            bounding_box = cmds.exactWorldBoundingBox(bb)
-            bounding_box_string = str(bounding_box[0])
-            for item in bounding_box[1:]:
-                bounding_box_string += ' %.15f' % item
+        # begin scene object from the static entities
+        as_project.scene = static_scene.copy()
 
+        # create bouding box scene parameter from the bounds cached with the scene
+        bounding_box = params['bounding_boxes'][non_mb_sample_number]
+        if bounding_box is not None:
+            bounding_box_string = ' '.join(['%.15f' % item for item in bounding_box])
             as_project.scene.parameters.append(AsParameter('bounding_box', bounding_box_string))
 
-        # define root assembly
-        root_assembly = AsAssembly(None)
-
-        # if present add the environment
-        if maya_environment is not None:
-
-            environment = AsEnvironment()
-            environment.name = maya_environment.safe_name
-
-            environment_edf = AsEnvironmentEdf()
-            environment_edf.name = maya_environment.safe_name + '_edf'
-            environment_edf.model = maya_environment.model
-            environment.environment_edf = AsParameter('environment_edf', environment_edf.name)
-
-            if maya_environment.__class__.__name__ == 'MMsPhysicalEnvironment':
-                environment_edf.model = maya_environment.model
-                environment_edf.parameters.append(AsParameter('ground_albedo' , maya_environment.ground_albedo))
-                environment_edf.parameters.append(AsParameter('horizon_shift' , maya_environment.horizon_shift))
-                environment_edf.parameters.append(AsParameter('luminance_multiplier' , maya_environment.luminance_multiplier))
-                environment_edf.parameters.append(AsParameter('saturation_multiplier' , maya_environment.saturation_multiplier))
-                environment_edf.parameters.append(AsParameter('luminance_gamma' , maya_environment.luminance_gamma))
-                environment_edf.parameters.append(AsParameter('sun_phi' , maya_environment.sun_phi))
-                environment_edf.parameters.append(AsParameter('sun_theta' , maya_environment.sun_theta))
-                environment_edf.parameters.append(AsParameter('turbidity_multiplier' , maya_environment.turbidity_multiplier))
-
-                if maya_environment.turbidity.__class__.__name__ == 'MFile':
-                    turbidity_file, turbidity_file_instance = m_file_to_as_texture(params, maya_environment.turbidity, '_texture', non_mb_sample_number)
-                    as_project.scene.textures.append(turbidity_file)
-                    as_project.scene.texture_instances.append(turbidity_file_instance)
-                    turbidity_param = AsParameter('exitance', turbidity_file_instance.name)
-                    environment_edf.parameters.append(turbidity_param)
-                else:
-                    turbidity_color = m_color_connection_to_as_color(maya_environment.turbidity, '_turbidity')
-                    turbidity_param = AsParameter('turbidity', turbidity_color.name)
-                    environment_edf.parameters.append(turbidity_param)
-                    as_project.scene.colors.append(turbidity_color)
-
-                if maya_environment.create_physical_sun:
-                    light = AsLight()
-                    light.name = 'physical_sun_light'
-                    light.model = 'sun_light'
-                    light.parameters.append(AsParameter('environment_edf', environment_edf.name))
-                    light.parameters.append(AsParameter('radiance_multiplier', maya_environment.physical_sun_multiplier))
-                    light.parameters.append(turbidity_param)
-                    root_assembly.lights.append(light)
+        # define root assembly from the static entities
+        root_assembly = static_root_assembly.copy()
 
-            else:
-                # environment must be generic
-                if environment_edf.model == 'constant_environment_edf':
-                    constant_environment_color = m_color_connection_to_as_color(maya_environment.constant_exitance, '_constant_exitance')
-                    environment_edf.parameters.append(AsParameter('exitance', constant_environment_color.name))
-                    as_project.scene.colors.append(constant_environment_color)
-
-                elif environment_edf.model == 'gradient_environment_edf':
-                    gradient_horizon_exitance = m_color_connection_to_as_color(maya_environment.gradient_horizon_exitance, '_horizon_exitance')
-                    environment_edf.parameters.append(AsParameter('horizon_exitance', gradient_horizon_exitance.name))
-                    as_project.scene.colors.append(gradient_horizon_exitance)
-
-                    zenith_horizon_exitance = m_color_connection_to_as_color(maya_environment.gradient_zenith_exitance, '_zenith_exitance')
-                    environment_edf.parameters.append(AsParameter('zenith_exitance', zenith_horizon_exitance.name))
-                    as_project.scene.colors.append(zenith_horizon_exitance)
-
-                elif environment_edf.model == 'latlong_map_environment_edf':
-                    lat_long_map, lat_long_map_instance = m_file_to_as_texture(params, maya_environment.latitude_longitude_exitance, '_texture', non_mb_sample_number)                
-                    
-                    as_project.scene.textures.append(lat_long_map)
-                    as_project.scene.texture_instances.append(lat_long_map_instance)
-
-                    environment_edf.parameters.append(AsParameter('exitance', lat_long_map_instance.name))
-
-                elif environment_edf.model == 'mirrorball_map_environment_edf':
-                    mirror_ball_map, mirror_ball_map_instance = m_file_to_as_texture(params, maya_environment.mirrorball_exitance, '_texture', non_mb_sample_number)
-                    
-                    as_project.scene.textures.append(mirror_ball_map)
-                    as_project.scene.texture_instances.append(mirror_ball_map_instance)
-
-                    environment_edf.parameters.append(AsParameter('exitance', mirror_ball_map_instance.name))
-
-                environment_edf.parameters.append(AsParameter('exitance_multiplier', str(maya_environment.exitance_multiplier)))
-
-            if params['render_sky']:
-                environment_shader = AsEnvironmentShader()
-                environment_shader.name = maya_environment.safe_name + '_shader'
-                environment_shader.edf = AsParameter('environment_edf', environment_edf.name)
-                environment.environment_shader = AsParameter('environment_shader', environment_shader.name)
-                as_project.scene.environment_shaders.append(environment_shader)
-
-            as_project.scene.environment = environment
-            as_project.scene.environment_edfs.append(environment_edf)
-
-        # retrieve camera from Maya scene cache and create as camera
-        camera = None
-        for transform in maya_scene:
-            camera = fetch_m_camera(transform, params['output_camera'])
-            if camera is not None:
-                break
-        if camera == None:
-            ms_commands.error('Camera not found: ' +  params['output_camera'])
-
-        # set camera parameter in as frame
-        as_frame.camera = AsParameter('camera', camera.safe_name)
+        # add the environment if it changes from frame to frame
+        if not static_environment:
+            translate_environment(params, maya_environment, as_project.scene, root_assembly, non_mb_sample_number)
 
         # generic camera settings
         as_camera = AsCamera()
@@ -2297,47 +3217,13 @@ def translate_maya_scene(params, maya_scene, maya_environment):
         as_project.scene.camera = as_camera
 
         # construct assembly hierarchy
-        # root assembly is defined earlier to let the environment sun light have access to it
-        root_assembly.name = 'root_assembly'
         as_project.scene.assemblies.append(root_assembly)
         root_assembly_instance = root_assembly.instantiate()
         root_assembly_instance.transforms.append(AsTransform())
         as_project.scene.assembly_instances.append(root_assembly_instance)
 
-        # create default materials
-        default_material = AsMaterial()
-        default_material.name = 'as_default_material'
-        default_material.alpha_map = AsParameter('alpha_map', '0')
-
-        # clear surface shader
-        default_clear_surface_shader = AsSurfaceShader()
-        default_clear_surface_shader.name = 'as_default_clear_surface_shader'
-        default_clear_surface_shader.model = 'constant_surface_shader'
-        default_clear_surface_shader.parameters.append(AsParameter('color', '0'))
-        default_clear_surface_shader.parameters.append(AsParameter('alpha_multiplier', '0'))
-        root_assembly.surface_shaders.append(default_clear_surface_shader)
-
-        # physical surface_shader
-        default_physical_surface_shader = AsSurfaceShader()
-        default_physical_surface_shader.name = 'as_default_physical_surface_shader'
-        default_physical_surface_shader.model = 'physical_surface_shader'
-        root_assembly.surface_shaders.append(default_physical_surface_shader)
-
-        # default material
-        default_material.surface_shader = AsParameter('surface_shader', default_clear_surface_shader.name)
-        root_assembly.materials.append(default_material)
-
-        # create default invisible material 
-        default_invisible_surface_shader = AsSurfaceShader()
-        default_invisible_material = AsMaterial()
-        default_invisible_material.name = 'as_default_invisible_material'
-        default_invisible_material.alpha_map = AsParameter('alpha_map', '0')
-        default_invisible_material.surface_shader = AsParameter('surface_shader', default_clear_surface_shader.name)
-
-        root_assembly.materials.append(default_invisible_material)
-
-        for transform in maya_scene:
-            construct_transform_descendents(params, root_assembly, root_assembly, [], transform, mb_sample_number_list, non_mb_sample_number, params['export_camera_blur'], params['export_transformation_blur'], params['export_deformation_blur'])
+        for transform in dynamic_transforms:
+            construct_transform_descendents(params, root_assembly, root_assembly, None, transform, mb_sample_number_list, non_mb_sample_number, params['export_camera_blur'], params['export_transformation_blur'], params['export_deformation_blur'])
 
         # end construction of as project hierarchy ************************************************
 
@@ -2347,7 +3233,7 @@ def translate_maya_scene(params, maya_scene, maya_environment):
 
         as_object_models.append((project_file_path, as_project))
 
-        cmds.progressWindow(e=True, progress=i)
+        ms_commands.progress_window(e=True, progress=i)
 
     return as_object_models
 
@@ -2356,12 +3242,12 @@ def translate_maya_scene(params, maya_scene, maya_environment):
 # construct_transform_descendents function.
 #--------------------------------------------------------------------------------------------------
 
-def construct_transform_descendents(params, root_assembly, parent_assembly, matrix_stack, maya_transform, mb_sample_number_list, non_mb_sample_number, camera_blur, transformation_blur, object_blur):
+def construct_transform_descendents(params, root_assembly, parent_assembly, parent_matrix, maya_transform, mb_sample_number_list, non_mb_sample_number, camera_blur, transformation_blur, object_blur):
 
     """ this function recursively builds an appleseed object hierarchy from a MTransform """
 
     current_assembly = parent_assembly
-    current_matrix_stack = matrix_stack + [maya_transform.matrices[non_mb_sample_number]]
+    current_matrices = [maya_transform.assembly_matrices[non_mb_sample_number]]
 
     if maya_transform.has_children and maya_transform.visibility_states[non_mb_sample_number]:
 
@@ -2371,20 +3257,27 @@ def construct_transform_descendents(params, root_assembly, parent_assembly, matr
             parent_assembly.assemblies.append(current_assembly)
             current_assembly_instance = current_assembly.instantiate()
             parent_assembly.assembly_instances.append(current_assembly_instance)
-            current_matrix_stack = []
+            current_matrices = []
+
+            # the instance carries the motion of the transform composed with its parents up to the enclosing assembly
+            instance_matrices = [maya_transform.matrices[sample_number] for sample_number in mb_sample_number_list]
+            if parent_matrix is not None:
+                instance_matrices = ms_commands.matrix_multiply_batch(instance_matrices, [parent_matrix] * len(instance_matrices))
 
             sample_index = 0
             sample_count = len(mb_sample_number_list)
             time_increment = 1.0 / (sample_count - 1) if sample_count > 1 else 1.0
-            for sample_number in mb_sample_number_list:
+            for instance_matrix in instance_matrices:
                 new_transform = AsTransform()
                 new_transform.time = sample_index * time_increment
-                new_transform.matrices = [maya_transform.matrices[sample_number]] + matrix_stack
+                new_transform.matrices = [instance_matrix]
                 current_assembly_instance.transforms.append(new_transform)
                 sample_index += 1
 
+        current_matrix = current_matrices[0] if len(current_matrices) > 0 else None
+
         for transform in maya_transform.child_transforms:
-            construct_transform_descendents(params, root_assembly, current_assembly, current_matrix_stack, transform, mb_sample_number_list, non_mb_sample_number, camera_blur, transformation_blur, object_blur)
+            construct_transform_descendents(params, root_assembly, current_assembly, current_matrix, transform, mb_sample_number_list, non_mb_sample_number, camera_blur, transformation_blur, object_blur)
 
         for light in maya_transform.child_lights:
 
@@ -2407,8 +3300,7 @@ def construct_transform_descendents(params, root_assembly, parent_assembly, matr
                     light_mesh.file_names = AsParameter('filename', ms_commands.GEO_DIR + '/maya_area_light.obj')
 
                     light_mesh_transform = AsTransform()
-                    if current_matrix_stack is not []:
-                        light_mesh_transform.matrices = current_matrix_stack
+                    light_mesh_transform.matrices = current_matrices
 
                     light_mesh_instance = light_mesh.instantiate()
                     light_mesh_instance.transforms.append(light_mesh_transform)
@@ -2457,8 +3349,7 @@ def construct_transform_descendents(params, root_assembly, parent_assembly, matr
 
                     new_light.exitance = AsParameter('exitance', light_color.name)
                     new_light.transform = AsTransform()
-                    if current_matrix_stack is not []:
-                        new_light.transform.matrices = current_matrix_stack
+                    new_light.transform.matrices = current_matrices
 
                     if light.model == 'spotLight':
                         new_light.model = 'spot_light'
@@ -2470,30 +3361,33 @@ def construct_transform_descendents(params, root_assembly, parent_assembly, matr
                     current_assembly.lights.append(new_light)
 
         for mesh in maya_transform.child_meshes:
-            # For now we won't be supporting instantiating objects. When the time comes I will add a function call here
-            # to find if the mesh has been defined somewhere in the assembly hierarchy already and instantiate it if so.
-            new_mesh = AsObject()
-            new_mesh.name = mesh.safe_name
-            new_mesh.name_in_obj = mesh.short_name
-            new_mesh.has_deformation = mesh.has_deformation
-
-            if not object_blur or not new_mesh.has_deformation:
+            if not object_blur or not mesh.has_deformation:
                 # If the mesh has no deformation there will only be one sample so always take the first sample.
-                if new_mesh.has_deformation:
-                    new_mesh.file_names = AsParameter('filename', mesh.mesh_file_names[non_mb_sample_number])
+                if mesh.has_deformation:
+                    file_names = AsParameter('filename', mesh.mesh_file_names[non_mb_sample_number])
                 else:
-                    new_mesh.file_names = AsParameter('filename', mesh.mesh_file_names[0])
+                    file_names = AsParameter('filename', mesh.mesh_file_names[0])
+                file_names_key = (file_names.value,)
             else:
                 file_names = AsParameters('filename')
                 for i in mb_sample_number_list:
                     file_names.parameters.append(AsParameter(i - mb_sample_number_list[0], mesh.mesh_file_names[i]))
+                file_names_key = tuple(parameter.value for parameter in file_names.parameters)
+
+            # shapes instanced in Maya and meshes with identical geometry share one object, each gets its own instance
+            new_mesh = current_assembly.objects_by_file_names.get(file_names_key)
+            if new_mesh is None:
+                new_mesh = AsObject()
+                new_mesh.name = mesh.safe_name
+                new_mesh.name_in_obj = mesh.short_name
+                new_mesh.has_deformation = mesh.has_deformation
                 new_mesh.file_names = file_names
+                current_assembly.objects.append(new_mesh)
+                current_assembly.objects_by_file_names[file_names_key] = new_mesh
 
-            current_assembly.objects.append(new_mesh)
             mesh_instance = new_mesh.instantiate()
             mesh_transform = AsTransform()
-            if current_matrix_stack is not []:
-                mesh_transform.matrices = current_matrix_stack
+            mesh_transform.matrices = current_matrices
             mesh_instance.transforms.append(mesh_transform)
 
             # translate materials and assign
@@ -2548,13 +3442,12 @@ def construct_transform_descendents(params, root_assembly, parent_assembly, matr
                 if path is None:
                     ms_commands.warning('{0} does not exist, skipping archive output'.format(ms_appleseed_scene.scene_filepath))
                 else:
-                    assembly.raw_xml += ms_commands.strip_scene_xml(path, params['output_directory'])
+                    assembly.raw_xml_files.append(ms_commands.strip_scene_xml(path, params['output_directory'], params['stripped_scenes']))
 
             assembly_instance = assembly.instantiate()
 
             assembly_transform = AsTransform()
-            if current_matrix_stack is not []:
-                assembly_transform.matrices = current_matrix_stack
+            assembly_transform.matrices = current_matrices
             assembly_instance.transforms.append(assembly_transform)
 
             current_assembly.assembly_instances.append(assembly_instance)
@@ -2646,14 +3539,14 @@ def convert_maya_generic_material(params, root_assembly, generic_material, non_m
     # create front and back materials
     front_material = AsMaterial()
     front_material.name = generic_material.safe_name
+    if double_sided and not single_material:
+        front_material.name = front_material.name + '_front'
     root_assembly.materials.append(front_material)
 
     if double_sided and single_material:
         back_material = front_material
 
     elif double_sided:
-        front_material.name = front_material.name + '_front'
-
         back_material = AsMaterial()
         back_material.name = generic_material.safe_name + '_back'
         root_assembly.materials.append(back_material)
@@ -2717,8 +3610,6 @@ def convert_maya_generic_material(params, root_assembly, generic_material, non_m
 
         if secondary_surface_shader is None:
             secondary_surface_shader = build_as_shading_nodes(params, root_assembly,  generic_material.secondary_surface_shader, non_mb_sample_number)
-        else:
-            secondary_surface_shader.name += '_secondary'
 
         # secondary surface shader alpha multiplier
         if 'ms_surface_shader_visibility' in generic_material.export_modifiers:
@@ -2937,11 +3828,10 @@ def convert_maya_ms_material_network(params, root_assembly, ms_material, non_mb_
     materials = [None, None]
 
     # check if material already exists in root_assembly
-    for material in root_assembly.materials:
-        if material.name == (ms_material.safe_name + '_front') and ms_material.enable_front:
-            materials[0] = material
-        if material.name == (ms_material.safe_name + '_back') and ms_material.enable_back and ms_material.duplicate_shaders:
-            materials[1] = material
+    if ms_material.enable_front:
+        materials[0] = root_assembly.materials.get(ms_material.safe_name + '_front')
+    if ms_material.enable_back and ms_material.duplicate_shaders:
+        materials[1] = root_assembly.materials.get(ms_material.safe_name + '_back')
 
     if materials[0] is None and materials[1] is None:
         if ms_material.alpha_map is not None:
@@ -3049,6 +3939,10 @@ def get_from_list(list, name):
 
     """ searches through list of objects with a .name attribute or surface_shaders and returns the object if it exists or None if not """
 
+    # entity tables are indexed by name so there is no need to search them
+    if isinstance(list, AsEntityTable):
+        return list.get(name)
+
     for item in list:
         if item.name == name:
             return item
@@ -3070,6 +3964,7 @@ def build_as_shading_nodes(params, root_assembly, current_maya_shading_node, non
         current_shading_node = get_from_list(root_assembly.bsdfs, current_maya_shading_node.safe_name)
         if current_shading_node is None:
             current_shading_node = AsBsdf()
+            current_shading_node.name = current_maya_shading_node.safe_name
             root_assembly.bsdfs.append(current_shading_node)
         else:
             return current_shading_node
@@ -3078,6 +3973,7 @@ def build_as_shading_nodes(params, root_assembly, current_maya_shading_node, non
         current_shading_node = get_from_list(root_assembly.edfs, current_maya_shading_node.safe_name)
         if current_shading_node is None:
             current_shading_node = AsEdf()
+            current_shading_node.name = current_maya_shading_node.safe_name
             root_assembly.edfs.append(current_shading_node)
         else:
             return current_shading_node
@@ -3086,11 +3982,11 @@ def build_as_shading_nodes(params, root_assembly, current_maya_shading_node, non
         current_shading_node = get_from_list(root_assembly.surface_shaders, current_maya_shading_node.safe_name)
         if current_shading_node is None:
             current_shading_node = AsSurfaceShader()
+            current_shading_node.name = current_maya_shading_node.safe_name
             root_assembly.surface_shaders.append(current_shading_node)
         else:
             return current_shading_node
 
-    current_shading_node.name = current_maya_shading_node.safe_name
     current_shading_node.model = current_maya_shading_node.model
 
     for attrib_key in current_maya_shading_node.attributes:
@@ -3140,7 +4036,8 @@ def build_as_shading_nodes(params, root_assembly, current_maya_shading_node, non
                     if params['force_linear_color_interpretation']:
                         new_color_entity.color_space.value = 'linear_rgb'
 
-                root_assembly.colors.append(new_color_entity)
+                    root_assembly.colors.append(new_color_entity)
+
                 current_shading_node.parameters.append(AsParameter(attrib_key, new_color_entity.name))
 
         elif current_maya_shading_node.attributes[attrib_key].__class__.__name__ == 'str':
@@ -3154,69 +4051,262 @@ def build_as_shading_nodes(params, root_assembly, current_maya_shading_node, non
 # export_container function.
 #--------------------------------------------------------------------------------------------------
 
-def export_container(render_settings_node):
+def export_container(render_settings_node, start_frame=None, end_frame=None):
 
-    """ This function triggers the 3 main processes in exporting, scene caching, translation and saving """
+    """ This function triggers the 3 main processes in exporting, scene caching, translation and saving, the frame range can be overridden so export workers can each export a part of an animation """
 
     export_start_time = time.time()
 
-    cmds.progressWindow(title='Exporting ...',
-                        min=0,
-                        max=100,
-                        progress=0,
-                        status='Beginning export',
-                        isInterruptable=True)
+    ms_commands.progress_window(title='Exporting ...',
+                                min=0,
+                                max=100,
+                                progress=0,
+                                status='Beginning export',
+                                isInterruptable=True)
 
     # reset object counter so there is a higher chance of avoiding duplicate mesh exports
     MMesh.object_counter = 1
+    MMesh.exported_files = set()
+    MMesh.shape_samples = dict()
 
     # cache maya scene
     params = get_maya_params(render_settings_node)
-    maya_scene, maya_environment = get_maya_scene(params)
-    scene_cache_finish_time = time.time()
 
-    ms_commands.info('Scene cached for translation in %.2f seconds.' % (scene_cache_finish_time - export_start_time))
+    if start_frame is not None:
+        params['animation_start_frame'] = start_frame
+    if end_frame is not None:
+        params['animation_end_frame'] = end_frame
 
-    # copy area light primitives into export directory
-    current_script_path = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
-    obj_file_name = 'maya_area_light.obj'
-    obj_source_path = os.path.join(current_script_path, obj_file_name)
-    obj_dest_path = os.path.join(params['output_directory'], ms_commands.GEO_DIR, obj_file_name)
-    shutil.copy(obj_source_path, obj_dest_path)
+    # geometry files are written in the background while the scene is sampled and translated
+    if params['export_threads'] is not None:
+        params['writer_pool'] = ms_commands.WriterPool(params['export_threads'])
+    else:
+        params['writer_pool'] = None
+
+    # the writer threads are stopped however the export ends, a cancelled or failed export would otherwise leave them
+    # waiting for jobs for the rest of the Maya session
+    try:
+        maya_scene, maya_environment = get_maya_scene(params)
+
+        # copy area light primitives into export directory
+        current_script_path = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+        obj_file_name = 'maya_area_light.obj'
+        obj_source_path = os.path.join(current_script_path, obj_file_name)
+        obj_dest_path = os.path.join(params['output_directory'], ms_commands.GEO_DIR, obj_file_name)
+        shutil.copy(obj_source_path, obj_dest_path)
+
+        # animations can be exported a chunk of frames at a time, the samples and appleseed entities of
+        # a chunk are discarded once its files are written so memory use doesn't grow with the frame count
+        frame_chunks = [(params['animation_start_frame'], params['animation_end_frame'])]
+        if params['export_animation'] and params['frame_chunk_size'] > 0:
+            frame_count = params['animation_end_frame'] - params['animation_start_frame'] + 1
+            chunk_count = (frame_count + params['frame_chunk_size'] - 1) // params['frame_chunk_size']
+            frame_chunks = get_frame_chunks(params['animation_start_frame'], params['animation_end_frame'], chunk_count)
+
+        scene_cache_time = time.time() - export_start_time
+        scene_translation_time = 0.0
+
+        for chunk_start_frame, chunk_end_frame in frame_chunks:
+            chunk_start_time = time.time()
+
+            if params['export_animation']:
+                ms_commands.info('Exporting frames {0} to {1}...'.format(chunk_start_frame, chunk_end_frame))
+                params['animation_start_frame'] = chunk_start_frame
+                params['animation_end_frame'] = chunk_end_frame
+
+            # cache the samples of the chunk, the blur window past the last frame is sampled again by the next chunk
+            for transform in maya_scene:
+                clear_scene_samples(transform)
+            clear_material_samples(params['material_registry'])
+            add_maya_scene_samples(params, maya_scene)
+            chunk_cache_finish_time = time.time()
+            scene_cache_time += chunk_cache_finish_time - chunk_start_time
+
+            # translate maya scene
+            as_object_models = translate_maya_scene(params, maya_scene, maya_environment)
+            scene_translation_time += time.time() - chunk_cache_finish_time
+
+            # make sure all the geometry has been written before the scene files reference it
+            if params['writer_pool'] is not None:
+                ms_commands.progress_window(e=True, status='Waiting for geometry files to be written', progress=0, max=1)
+                ms_commands.refresh()
+                params['writer_pool'].flush()
+
+            ms_commands.progress_window(e=True, status='Writing scene files', progress=0, max=len(as_object_models))
+            ms_commands.refresh()
+
+            for i, as_object in enumerate(as_object_models):
+                ms_commands.info('Saving %s...' % as_object[0])
+                doc = WriteXml(as_object[0], params['compact_xml'], params['compress_xml'])
+                doc.append_line('<?xml version="1.0" encoding="UTF-8"?>')
+                doc.append_line('<!-- File generated by Mayaseed version {0} -->'.format(ms_commands.MAYASEED_VERSION))
+                as_object[1].emit_xml(doc)
+                doc.close()
+
+                ms_commands.progress_window(e=True, progress=i)
+                ms_commands.refresh()
+
+            as_object_models = None
+
+    except:
+        if params['writer_pool'] is not None:
+            params['writer_pool'].abort()
+        raise
+
+    if params['writer_pool'] is not None:
+        params['writer_pool'].close()
+
+    ms_commands.info('Scene cached for translation in %.2f seconds.' % scene_cache_time)
+    ms_commands.info('Scene translated in %.2f seconds.' % scene_translation_time)
 
-    # translate maya scene
-    as_object_models = translate_maya_scene(params, maya_scene, maya_environment)
-    scene_translation_finish_time = time.time()
+    export_finish_time = time.time()
 
-    ms_commands.info('Scene translated in %.2f seconds.' % (scene_translation_finish_time - scene_cache_finish_time))
+    ms_commands.progress_window(endProgress=1)
 
-    cmds.progressWindow(e=True, status='Writing scene files', progress=0, max=len(as_object_models))
-    cmds.refresh(cv=True)
+    appleseed_version_notice = 'This version of mayaseed is designed to work with {0}. Other versions of appleseed may work but have not been tested.'.format(ms_commands.RECCOMENDED_APPLESEED_VERSION)
 
-    for i, as_object in enumerate(as_object_models):
-        ms_commands.info('Saving %s...' % as_object[0])
-        doc = WriteXml(as_object[0])
-        doc.append_line('<?xml version="1.0" encoding="UTF-8"?>')
-        doc.append_line('<!-- File generated by Mayaseed version {0} -->'.format(ms_commands.MAYASEED_VERSION))
-        as_object[1].emit_xml(doc)
-        doc.close()
+    ms_commands.info(appleseed_version_notice)
 
-        cmds.progressWindow(e=True, progress=i)
-        cmds.refresh(cv=True)
+    completed_message = 'Export completed in %.2f seconds, see the script editor for details.' % (export_finish_time - export_start_time)
 
-    export_finish_time = time.time()
+    ms_commands.info(completed_message)
 
-    cmds.progressWindow(endProgress=1)
+    if not ms_commands.in_batch_mode():
+        cmds.confirmDialog(message=completed_message, button='ok')
 
-    appleseed_version_notice = 'This version of mayaseed is designed to work with {0}. Other versions of appleseed may work but have not been tested.'.format(ms_commands.RECCOMENDED_APPLESEED_VERSION)
 
-    ms_commands.info(appleseed_version_notice)
+#--------------------------------------------------------------------------------------------------
+# export_in_workers function.
+#--------------------------------------------------------------------------------------------------
 
-    completed_message = 'Export completed in %.2f seconds, see the script editor for details.' % (export_finish_time - export_start_time)
+def get_frame_chunks(start_frame, end_frame, chunk_count):
+
+    """ Splits a frame range into at most chunk_count contiguous (start, end) ranges of similar length """
+
+    frame_count = end_frame - start_frame + 1
+    chunk_count = max(1, min(chunk_count, frame_count))
+
+    chunks = []
+    chunk_start = start_frame
+    for i in range(chunk_count):
+        chunk_length = frame_count // chunk_count
+        if i < frame_count % chunk_count:
+            chunk_length += 1
+        chunks.append((chunk_start, chunk_start + chunk_length - 1))
+        chunk_start += chunk_length
+
+    return chunks
+
+
+def get_mayapy_path():
+    if sys.platform == 'win32':
+        return os.path.join(os.environ['MAYA_LOCATION'], 'bin', 'mayapy.exe')
+
+    return os.path.join(os.environ['MAYA_LOCATION'], 'bin', 'mayapy')
+
+
+def read_worker_output(worker_number, stream, output_queue):
+    for line in iter(stream.readline, ''):
+        output_queue.put((worker_number, line.rstrip()))
+
+    # signal that the worker has finished
+    output_queue.put((worker_number, None))
+
+
+def export_in_workers(render_settings_node, worker_count):
+
+    """ Splits the animation frame range into chunks and exports each chunk with its own mayapy process, the output of the workers is merged into the script editor """
+
+    scene_filepath = cmds.file(q=True, sceneName=True)
+    if not scene_filepath:
+        ms_commands.error('The scene must be saved before exporting with multiple workers.')
+
+    if cmds.file(q=True, modified=True):
+        ms_commands.warning('The scene has unsaved changes, export workers will use the saved version of {0}.'.format(scene_filepath))
+
+    export_start_time = time.time()
+
+    start_frame = cmds.getAttr(render_settings_node + '.animation_start_frame')
+    end_frame = cmds.getAttr(render_settings_node + '.animation_end_frame')
+    frame_count = end_frame - start_frame + 1
+
+    worker_script = os.path.join(ms_commands.ROOT_DIRECTORY, 'scripts', 'ms_export_worker.py')
+    worker_environment = dict(os.environ)
+    worker_environment['PYTHONUNBUFFERED'] = '1'
+
+    output_queue = Queue.Queue()
+    workers = []
+
+    for chunk_start, chunk_end in get_frame_chunks(start_frame, end_frame, worker_count):
+        worker_number = len(workers) + 1
+        ms_commands.info('Starting export worker {0} for frames {1} to {2}...'.format(worker_number, chunk_start, chunk_end))
+
+        worker = subprocess.Popen([get_mayapy_path(), worker_script, scene_filepath, render_settings_node, str(chunk_start), str(chunk_end)],
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.STDOUT,
+                                  env=worker_environment)
+
+        reader = threading.Thread(target=read_worker_output, args=(worker_number, worker.stdout, output_queue))
+        reader.daemon = True
+        reader.start()
+
+        workers.append(worker)
+
+    ms_commands.progress_window(title='Exporting ...',
+                                min=0,
+                                max=frame_count,
+                                progress=0,
+                                status='Exporting with {0} workers'.format(len(workers)),
+                                isInterruptable=True)
+
+    frames_exported = 0
+    running_workers = len(workers)
+
+    while running_workers > 0:
+        if ms_commands.progress_window(query=True, isCancelled=True):
+            for worker in workers:
+                if worker.poll() is None:
+                    worker.terminate()
+            ms_commands.progress_window(endProgress=1)
+            ms_commands.warning('Export cancelled')
+            return
+
+        try:
+            worker_number, line = output_queue.get(timeout=0.1)
+        except Queue.Empty:
+            continue
+
+        if line is None:
+            running_workers -= 1
+            continue
+
+        # the workers log through ms_commands, their messages are logged again at the same level with the worker number
+        if line.startswith('#'):
+            ms_commands.warning('[worker {0}] {1}'.format(worker_number, line.lstrip('# ')))
+        elif line.startswith('// '):
+            ms_commands.info('[worker {0}] {1}'.format(worker_number, line[3:]))
+        else:
+            ms_commands.info('[worker {0}] {1}'.format(worker_number, line))
+
+        # each worker reports every frame it translates
+        if line.startswith('// Exporting frame '):
+            frames_exported += 1
+            ms_commands.progress_window(e=True, progress=frames_exported, status='Exported {0} of {1} frames'.format(frames_exported, frame_count))
+            ms_commands.refresh()
+
+    failed_workers = [str(i + 1) for i, worker in enumerate(workers) if worker.wait() != 0]
+
+    ms_commands.progress_window(endProgress=1)
+
+    if failed_workers:
+        ms_commands.error('Export worker(s) {0} failed, see the script editor for details.'.format(', '.join(failed_workers)))
+
+    completed_message = 'Export completed in %.2f seconds using %i workers, see the script editor for details.' % (time.time() - export_start_time, len(workers))
 
     ms_commands.info(completed_message)
 
-    cmds.confirmDialog(message=completed_message, button='ok')
+    if not ms_commands.in_batch_mode():
+        cmds.confirmDialog(message=completed_message, button='ok')
 
 
 #--------------------------------------------------------------------------------------------------
@@ -3239,7 +4329,11 @@ def export(render_settings_node=None):
 
     previous_export = resolved_render_settings_node
 
-    if cmds.getAttr(resolved_render_settings_node + '.profile_export'):
+    export_workers = cmds.getAttr(resolved_render_settings_node + '.export_workers')
+
+    if (export_workers > 1) and cmds.getAttr(resolved_render_settings_node + '.export_animation'):
+        export_in_workers(resolved_render_settings_node, export_workers)
+    elif cmds.getAttr(resolved_render_settings_node + '.profile_export'):
         import cProfile
         command = 'import ms_export\nms_export.export_container("' + resolved_render_settings_node + '")'
         cProfile.run(command)
@@ -0,0 +1,282 @@
+
+#
+# Copyright (c) 2012-2014 Jonathan Topf
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import os
+import array
+import struct
+import ms_export_obj
+
+try:
+    import lz4.block
+    HAS_LZ4 = True
+except ImportError:
+    HAS_LZ4 = False
+
+# appleseed binarymesh file signature and versions
+SIGNATURE = 'BINARYMESH'
+UNCOMPRESSED_VERSION = 1
+LZ4_COMPRESSED_VERSION = 3
+
+# the LZ4 block framing has only been checked against the reader in this module, not against appleseed's
+# own loader, so files are written uncompressed until it has been validated with convertmeshfile or a render
+LZ4_OUTPUT_ENABLED = False
+
+# size of the blocks the data is split into before compression
+COMPRESSION_BLOCK_SIZE = 1024 * 1024
+
+# name of the single mesh stored in each file, object instances reference it as <object name>.0
+MESH_NAME = '0'
+
+
+#--------------------------------------------------------------------------------------------------
+# Packing functions.
+#--------------------------------------------------------------------------------------------------
+
+def pack_string(string):
+    return struct.pack('<H', len(string)) + string
+
+
+# the layout follows appleseed's BinaryMeshFileWriter:
+#   string:         uint16 length followed by the characters
+#   vertices:       uint32 count followed by count Vector3d (3 doubles)
+#   normals:        uint32 count followed by count Vector3d (3 doubles)
+#   texture coords: uint32 count followed by count Vector2d (2 doubles)
+#   material slots: uint16 count followed by count strings
+#   faces:          uint32 count followed by, for each face, a uint16 vertex count, a uint32 vertex, normal and
+#                   texture coordinate index for each vertex and a uint16 material slot index
+# all values are little endian
+
+def get_mesh_arrays(mesh_data):
+
+    """ Returns the flat arrays of a MeshData object in the order they are stored in a binarymesh file """
+
+    points = array.array('d', [c for point in mesh_data.points for c in (point.x, point.y, point.z)])
+    normals = array.array('d', [c for normal in mesh_data.normals for c in (normal.x, normal.y, normal.z)])
+
+    # texture coordinates, meshes without UVs get a single dummy coordinate so every face can reference one
+    if len(mesh_data.us) > 0:
+        uvs = array.array('d', [c for uv in zip(mesh_data.us, mesh_data.vs) for c in uv])
+    else:
+        uvs = array.array('d', [0.0, 0.0])
+
+    # material slots, faces without a material use an extra no_material slot
+    material_names = list(mesh_data.material_names)
+    face_material_indices = list(mesh_data.face_shader_indices)
+    if (len(material_names) == 0) or (-1 in face_material_indices):
+        no_material_index = len(material_names)
+        material_names.append('no_material')
+        face_material_indices = [no_material_index if index == -1 else index for index in face_material_indices]
+
+    # faces as (vertex count, [vertex, normal, texture coordinate] * vertex count, material slot) tuples
+    faces = []
+    vertex_offset = 0
+    uv_offset = 0
+
+    for face_index in range(len(mesh_data.face_vertex_counts)):
+        vertex_count = mesh_data.face_vertex_counts[face_index]
+        uv_count = mesh_data.face_uv_counts[face_index]
+
+        face_values = [vertex_count]
+        for i in range(vertex_count):
+            face_values.append(mesh_data.face_vertices[vertex_offset + i])
+            face_values.append(mesh_data.face_normals[vertex_offset + i])
+            face_values.append(mesh_data.face_uvs[uv_offset + i] if uv_count > 0 else 0)
+        face_values.append(face_material_indices[face_index] if face_index < len(face_material_indices) else 0)
+
+        faces.append(tuple(face_values))
+
+        vertex_offset += vertex_count
+        uv_offset += uv_count
+
+    return points, normals, uvs, material_names, faces
+
+
+def pack_mesh(mesh_data):
+
+    """ Returns the binarymesh representation of a MeshData object """
+
+    points, normals, uvs, material_names, faces = get_mesh_arrays(mesh_data)
+
+    chunks = [pack_string(MESH_NAME)]
+
+    for values, dimension in [(points, 3), (normals, 3), (uvs, 2)]:
+        chunks.append(struct.pack('<I', len(values) / dimension))
+        chunks.append(values.tostring())
+
+    chunks.append(struct.pack('<H', len(material_names)))
+    for material_name in material_names:
+        chunks.append(pack_string(material_name))
+
+    chunks.append(struct.pack('<I', len(faces)))
+
+    face_structs = dict()
+    for face_values in faces:
+        face_struct = face_structs.get(face_values[0])
+        if face_struct is None:
+            face_struct = struct.Struct('<H' + 'III' * face_values[0] + 'H')
+            face_structs[face_values[0]] = face_struct
+        chunks.append(face_struct.pack(*face_values))
+
+    return ''.join(chunks)
+
+
+def compress(data):
+
+    """ Splits the data into blocks and compresses each block with LZ4, each block is prefixed with its compressed and uncompressed sizes """
+
+    chunks = []
+    for block_start in range(0, len(data), COMPRESSION_BLOCK_SIZE):
+        block = data[block_start:block_start + COMPRESSION_BLOCK_SIZE]
+        compressed_block = lz4.block.compress(block, store_size=False)
+        chunks.append(struct.pack('<QQ', len(compressed_block), len(block)))
+        chunks.append(compressed_block)
+
+    return ''.join(chunks)
+
+
+#--------------------------------------------------------------------------------------------------
+# Reading functions.
+#--------------------------------------------------------------------------------------------------
+
+def decompress(data):
+
+    """ Joins the LZ4 compressed blocks written by compress """
+
+    chunks = []
+    offset = 0
+    while offset < len(data):
+        compressed_size, block_size = struct.unpack_from('<QQ', data, offset)
+        offset += 16
+        chunks.append(lz4.block.decompress(data[offset:offset + compressed_size], uncompressed_size=block_size))
+        offset += compressed_size
+
+    return ''.join(chunks)
+
+
+def unpack_mesh(data):
+
+    """ Returns the mesh name and the arrays of an uncompressed binarymesh mesh, in the order of get_mesh_arrays """
+
+    offset = [0]
+
+    def read(value_format):
+        values = struct.unpack_from('<' + value_format, data, offset[0])
+        offset[0] += struct.calcsize('<' + value_format)
+        return values
+
+    def read_string():
+        length = read('H')[0]
+        return read('%is' % length)[0]
+
+    mesh_name = read_string()
+
+    vector_arrays = []
+    for dimension in [3, 3, 2]:
+        size = read('I')[0] * dimension * 8
+        vector_arrays.append(array.array('d', data[offset[0]:offset[0] + size]))
+        offset[0] += size
+
+    material_names = [read_string() for i in range(read('H')[0])]
+
+    faces = []
+    for i in range(read('I')[0]):
+        vertex_count = read('H')[0]
+        faces.append((vertex_count,) + read('III' * vertex_count + 'H'))
+
+    if offset[0] != len(data):
+        raise RuntimeError('{0} unexpected bytes after the mesh data'.format(len(data) - offset[0]))
+
+    return [mesh_name] + vector_arrays + [material_names, faces]
+
+
+def read(file_path):
+
+    """ Reads a file written by export, returns the mesh name and the arrays of the mesh """
+
+    file_object = open(file_path, 'rb')
+    data = file_object.read()
+    file_object.close()
+
+    if data[:len(SIGNATURE)] != SIGNATURE:
+        raise RuntimeError('{0} is not a binarymesh file.'.format(file_path))
+
+    version = struct.unpack_from('<H', data, len(SIGNATURE))[0]
+    data = data[len(SIGNATURE) + 2:]
+
+    if version == LZ4_COMPRESSED_VERSION:
+        data = decompress(data)
+    elif version != UNCOMPRESSED_VERSION:
+        raise RuntimeError('{0} has unsupported binarymesh version {1}.'.format(file_path, version))
+
+    return unpack_mesh(data)
+
+
+def check_round_trip(file_path, mesh_data):
+
+    """ Reads back a file written by export and raises a RuntimeError if it doesn't hold the mesh data """
+
+    expected = [MESH_NAME] + list(get_mesh_arrays(mesh_data))
+    names = ['mesh name', 'vertices', 'normals', 'texture coordinates', 'material slots', 'faces']
+
+    for name, written, read_back in zip(names, expected, read(file_path)):
+        if written != read_back:
+            raise RuntimeError('binarymesh round trip failed for {0}: the {1} differ.'.format(file_path, name))
+
+
+#--------------------------------------------------------------------------------------------------
+# Export function.
+#--------------------------------------------------------------------------------------------------
+
+def export(object_name, file_path, overwrite=True, compress_data=True, mesh_data=None, verify=False):
+    if os.path.exists(file_path) and not overwrite:
+        return
+
+    export_dir = os.path.split(file_path)[0]
+
+    if not os.path.exists(export_dir):
+        os.makedirs(export_dir)
+
+    if mesh_data is None:
+        mesh_data = ms_export_obj.get_mesh_data(object_name)
+
+    data = pack_mesh(mesh_data)
+
+    if compress_data and HAS_LZ4 and LZ4_OUTPUT_ENABLED:
+        version = LZ4_COMPRESSED_VERSION
+        data = compress(data)
+    else:
+        version = UNCOMPRESSED_VERSION
+
+    try:
+        file_object = open(file_path, 'wb')
+    except IOError:
+        # this may run on a writer thread so raise rather than calling cmds.error
+        raise RuntimeError("IO error: failed to open {0} for writing.".format(file_path))
+
+    file_object.write(SIGNATURE)
+    file_object.write(struct.pack('<H', version))
+    file_object.write(data)
+    file_object.close()
+
+    if verify:
+        check_round_trip(file_path, mesh_data)
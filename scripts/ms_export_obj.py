@@ -21,13 +21,122 @@
 # THE SOFTWARE.
 #
 
-import maya.cmds as cmds
-import maya.OpenMaya as OpenMaya
+import maya.api.OpenMaya as OpenMaya2
 import os
+import array
+import hashlib
 
 SCRIPT_VERSION = '0.1.3'
 
-def export(object_name, file_path, overwrite=True):
+
+#--------------------------------------------------------------------------------------------------
+# MeshData class.
+#--------------------------------------------------------------------------------------------------
+
+class MeshData():
+
+    """ Bulk copy of everything that is written to a mesh file, read through the Maya Python API 2.0 """
+
+    def __init__(self, object_name):
+        selection = OpenMaya2.MSelectionList()
+        selection.add(str(object_name))
+        mesh = OpenMaya2.MFnMesh(selection.getDagPath(0))
+
+        self.points = mesh.getPoints(OpenMaya2.MSpace.kObject)
+        self.us, self.vs = mesh.getUVs()
+        self.normals = mesh.getNormals(OpenMaya2.MSpace.kObject)
+
+        self.face_vertex_counts, self.face_vertices = mesh.getVertices()
+        self.face_uv_counts, self.face_uvs = mesh.getAssignedUVs()
+        self.face_normal_counts, self.face_normals = mesh.getNormalIds()
+
+        # material names are written to the file so they are part of the mesh data
+        shaders, self.face_shader_indices = mesh.getConnectedShaders(0)
+        self.material_names = []
+        for shader in shaders:
+            materials = OpenMaya2.MFnDependencyNode(shader).findPlug('surfaceShader', False).connectedTo(True, False)
+            if len(materials) > 0:
+                self.material_names.append(OpenMaya2.MFnDependencyNode(materials[0].node()).name())
+            else:
+                self.material_names.append('no_material')
+
+    def get_hash(self):
+
+        """ Returns a hash of the mesh contents, meshes with the same points, topology, UVs, normals and materials have the same hash """
+
+        digest = hashlib.sha1()
+        digest.update(SCRIPT_VERSION)
+
+        sections = [array.array('d', [c for point in self.points for c in (point.x, point.y, point.z)]),
+                    array.array('f', self.us),
+                    array.array('f', self.vs),
+                    array.array('f', [c for normal in self.normals for c in (normal.x, normal.y, normal.z)]),
+                    array.array('i', self.face_vertex_counts),
+                    array.array('i', self.face_vertices),
+                    array.array('i', self.face_uv_counts),
+                    array.array('i', self.face_uvs),
+                    array.array('i', self.face_normal_counts),
+                    array.array('i', self.face_normals),
+                    array.array('i', self.face_shader_indices)]
+
+        # prefix each section with its length so different splits of the same bytes hash differently
+        for section in sections:
+            digest.update(str(len(section)))
+            digest.update(section.tostring())
+
+        digest.update('|'.join(self.material_names))
+
+        return digest.hexdigest()
+
+
+def get_mesh_data(object_name):
+    return MeshData(object_name)
+
+
+#--------------------------------------------------------------------------------------------------
+# Export function.
+#--------------------------------------------------------------------------------------------------
+
+# number of lines that are joined before they are written to the file
+WRITE_CHUNK_SIZE = 65536
+
+
+def format_faces(mesh_data):
+
+    """ Yields the face lines of a mesh, indices are read from the flat topology arrays rather than a polygon iterator """
+
+    has_uvs = len(mesh_data.us) > 0
+    has_normals = len(mesh_data.normals) > 0
+
+    vertex_offset = 0
+    uv_offset = 0
+
+    for face_index in range(len(mesh_data.face_vertex_counts)):
+        vertex_count = mesh_data.face_vertex_counts[face_index]
+        uv_count = mesh_data.face_uv_counts[face_index] if has_uvs else 0
+
+        tokens = ['f']
+        for i in range(vertex_count):
+            token = str(mesh_data.face_vertices[vertex_offset + i] + 1)
+
+            if has_uvs or has_normals:
+                token += '/'
+
+            if uv_count > 0:
+                token += str(mesh_data.face_uvs[uv_offset + i] + 1)
+
+            if has_normals:
+                token += '/' + str(mesh_data.face_normals[vertex_offset + i] + 1)
+
+            tokens.append(token)
+
+        yield ' '.join(tokens) + '\n'
+
+        vertex_offset += vertex_count
+        uv_offset += uv_count
+
+
+def export(object_name, file_path, overwrite=True, mesh_data=None):
     if os.path.exists(file_path) and not overwrite:
         return
 
@@ -40,64 +149,28 @@ def export(object_name, file_path, overwrite=True):
     try:
         file_object = open(file_path, 'w')
     except IOError:
-        error_msg = "IO error: failed to open {0} for writing.".format(file_path)
-        cmds.error(error_msg)
-        raise RuntimeError(error_msg)
+        # this may run on a writer thread so raise rather than calling cmds.error
+        raise RuntimeError("IO error: failed to open {0} for writing.".format(file_path))
 
     file_object.write("# File generated by ms_export_obj (Python) version {0}\n".format(SCRIPT_VERSION))
 
-    sel = OpenMaya.MSelectionList()
-    sel.add(str(object_name))
-
-    mesh_dag_path = OpenMaya.MDagPath()
-    sel.getDagPath(0, mesh_dag_path)
-    
-    mesh = OpenMaya.MFnMesh(mesh_dag_path)
-
-    # Write vertices.
-    points = OpenMaya.MPointArray() 
-    mesh.getPoints(points)
-    for i in range(points.length()):
-        file_object.write("v {0} {1} {2}\n".format(points[i].x, points[i].y, points[i].z))
-    
-    # Write UV coordinates.
-    us = OpenMaya.MFloatArray()
-    vs = OpenMaya.MFloatArray()
-    mesh.getUVs(us, vs)
-    for i in range(us.length()):
-        file_object.write("vt {0} {1}\n".format(us[i], vs[i]))
-
-    # Write normals.
-    normals = OpenMaya.MFloatVectorArray()
-    mesh.getNormals(normals, 2) # 2 = object space
-    for i in range(normals.length()):
-        file_object.write("vn {0} {1} {2}\n".format(normals[i].x, normals[i].y, normals[i].z))
-
-    # Write faces.
-    poly_it = OpenMaya.MItMeshPolygon(mesh.object())
-    while not poly_it.isDone():
-        file_object.write("f")
-
-        for i in range(poly_it.polygonVertexCount()):
-            file_object.write(" {0}".format(poly_it.vertexIndex(i) + 1))
-
-            if us.length() > 0 or normals.length() > 0:
-                file_object.write("/")
-
-            if us.length() > 0:
-                # To get uv index we need to create an int pointer because the API is just wrappers for C++.
-                util = OpenMaya.MScriptUtil()
-                util.createFromInt(0)
-                uv_pInt = util.asIntPtr()
-                uv_index = OpenMaya.MScriptUtil()
-                uv_index.createFromInt(0)
-                poly_it.getUVIndex(i, uv_pInt)
-                file_object.write("{0}".format(uv_index.getInt(uv_pInt) + 1))
-
-            if normals.length() > 0:
-                file_object.write("/{0}".format(poly_it.normalIndex(i) + 1))
-
-        file_object.write("\n")
-        poly_it.next()
+    if mesh_data is None:
+        mesh_data = get_mesh_data(object_name)
+
+    lines = []
+
+    def write_lines(line_iterator):
+        for line in line_iterator:
+            lines.append(line)
+            if len(lines) >= WRITE_CHUNK_SIZE:
+                file_object.write(''.join(lines))
+                del lines[:]
+
+    # Write vertices, UV coordinates, normals and faces.
+    write_lines('v %s %s %s\n' % (point.x, point.y, point.z) for point in mesh_data.points)
+    write_lines('vt %s %s\n' % uv for uv in zip(mesh_data.us, mesh_data.vs))
+    write_lines('vn %s %s %s\n' % (normal.x, normal.y, normal.z) for normal in mesh_data.normals)
+    write_lines(format_faces(mesh_data))
 
+    file_object.write(''.join(lines))
     file_object.close()
@@ -0,0 +1,57 @@
+
+#
+# Copyright (c) 2012-2014 Jonathan Topf
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+# Export worker, launched by ms_export.export_in_workers to export part of an animation in a separate process:
+#
+#   mayapy ms_export_worker.py <scene file> <render settings node> <start frame> <end frame>
+
+import os
+import sys
+
+
+def main(scene_filepath, render_settings_node, start_frame, end_frame):
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+
+    import maya.cmds as cmds
+    import maya.mel as mel
+
+    root_directory = os.path.split(os.path.dirname(os.path.abspath(__file__)))[0]
+    sys.path.append(os.path.join(root_directory, 'scripts'))
+
+    cmds.loadPlugin(os.path.join(root_directory, 'plug-ins', 'mayaseed.py'))
+
+    # use the native obj exporter if it is available for this version of Maya
+    try:
+        cmds.loadPlugin('ms_export_obj_' + str(int(mel.eval('getApplicationVersionAsFloat()'))), quiet=True)
+    except RuntimeError:
+        pass
+
+    cmds.file(scene_filepath, open=True, force=True)
+
+    import ms_export
+    ms_export.export_container(render_settings_node, start_frame, end_frame)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))